@@ -0,0 +1,296 @@
+"""
+CPU 密集分析的行程池執行器：全廠（所有設備 × 多天）的統計量與離群值分塊交給子行程計算，
+不佔用串流回應的 event loop，也不受 GIL 限制。
+
+  - 資料依 chunk_by（equipment：每台設備；day：每天）排序後切成單位（unit），
+    連續的單位打包成任務送進 ProcessPoolExecutor
+  - 排序後的陣列放在 multiprocessing.shared_memory，子行程以 np.ndarray 直接對應同一塊記憶體，
+    任務只傳遞 (名稱, shape, dtype) 與列範圍，不 pickle 資料本身
+  - 每個單位的結果依單位順序合併（不依完成順序）：統計量以 RunningStats.merge，
+    離群值以 (分數, 列位置) 排序取 top_k，因此結果與 worker 數、任務打包方式無關
+  - max_workers <= 1 時在同一行程內執行相同的程式碼（不建立行程池）
+
+基準線：chunk_by="equipment" 時與整段資料依設備分組相同；chunk_by="day" 時為每台設備每天各自的基準線。
+
+使用方式：
+    result = ANALYTICS.analyze(values, times, groups, chunk_by="equipment", method="zscore")
+    result = await ANALYTICS.analyze_async(...)   # 在 async 程式中使用
+
+環境變數：
+  - ANALYTICS_WORKERS        行程數（預設 CPU 數；1 表示不使用行程池）
+  - ANALYTICS_START_METHOD   multiprocessing 啟動方式（預設 POSIX 用 fork，其他平台用 spawn）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from db_stream import RunningStats
+
+CHUNK_BY = ("equipment", "day")
+_DAY_NS = 86_400 * 10**9
+
+
+@dataclass
+class FleetAnomaly:
+    equipment: str | None
+    time: np.datetime64 | None
+    value: float
+    score: float
+    center: float
+    scale: float
+
+
+@dataclass
+class FleetResult:
+    method: str
+    threshold: float
+    chunk_by: str
+    units: int
+    workers: int
+    total_rows: int
+    stats: RunningStats
+    by_equipment: dict[str, RunningStats] = field(default_factory=dict)
+    total_outliers: int = 0
+    anomalies: list[FleetAnomaly] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+
+# ----------------------------------------------------------------------
+# 子行程端
+# ----------------------------------------------------------------------
+def _run_shared(spec: dict, units: list[tuple[int, int, int]], params: dict):
+    # 子行程與父行程共用 resource tracker，只 close；unlink 由建立者（父行程）負責
+    blocks = {key: shared_memory.SharedMemory(name=shm_name) for key, (shm_name, _, _) in spec.items()}
+    try:
+        arrays = {
+            key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[key].buf)
+            for key, (_, shape, dtype) in spec.items()
+        }
+        return _run_units(arrays, units, params)
+    finally:
+        # 先釋放 ndarray 對 buffer 的參照才能 close
+        arrays = None
+        for shm in blocks.values():
+            shm.close()
+
+
+def _run_units(arrays: dict[str, np.ndarray], units: list[tuple[int, int, int]], params: dict):
+    from outlier_engine import detect_outliers
+
+    values, times, codes = arrays["values"], arrays.get("times"), arrays.get("codes")
+    window = None if params["window_ns"] is None else np.timedelta64(params["window_ns"], "ns")
+    results = []
+    for unit, start, end in units:
+        v = values[start:end]
+        t = None if times is None else times[start:end].view("datetime64[ns]")
+        c = None if codes is None else codes[start:end]
+
+        mean = float(v.mean())
+        overall = (len(v), mean, float(((v - mean) ** 2).sum()), float(v.min()), float(v.max()))
+
+        per_group = None
+        if c is not None:
+            present, local = np.unique(c, return_inverse=True)
+            count = np.bincount(local).astype(float)
+            g_mean = np.bincount(local, weights=v) / count
+            g_m2 = np.bincount(local, weights=(v - g_mean[local]) ** 2)
+            g_min = np.full(len(present), np.inf)
+            g_max = np.full(len(present), -np.inf)
+            np.minimum.at(g_min, local, v)
+            np.maximum.at(g_max, local, v)
+            per_group = (present, count, g_mean, g_m2, g_min, g_max)
+
+        found = detect_outliers(
+            v, t, c, method=params["method"], threshold=params["threshold"], window=window, top_k=params["top_k"]
+        )
+        anomalies = [(a.score, start + a.index, a.value, a.center, a.scale) for a in found.anomalies]
+        results.append((unit, overall, per_group, found.total_outliers, anomalies))
+    return results
+
+
+# ----------------------------------------------------------------------
+# 父行程端
+# ----------------------------------------------------------------------
+class AnalyticsExecutor:
+    def __init__(self, max_workers: int | None = None, start_method: str | None = None, min_rows_per_task: int = 100_000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.start_method = start_method or ("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        self.min_rows_per_task = min_rows_per_task
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AnalyticsExecutor":
+        workers = os.getenv("ANALYTICS_WORKERS")
+        return cls(
+            max_workers=int(workers) if workers else None,
+            start_method=os.getenv("ANALYTICS_START_METHOD") or None,
+        )
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._pool
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+    async def analyze_async(self, *args, **kwargs) -> FleetResult:
+        """在 thread 中等待行程池，event loop 可以繼續處理串流。"""
+        return await asyncio.to_thread(self.analyze, *args, **kwargs)
+
+    def analyze(
+        self,
+        values,
+        times=None,
+        groups=None,
+        chunk_by: str = "equipment",
+        method: str = "zscore",
+        threshold: float | None = None,
+        window_minutes: int = 0,
+        top_k: int = 20,
+    ) -> FleetResult:
+        from outlier_engine import DEFAULT_THRESHOLDS, METHODS
+
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+        if chunk_by not in CHUNK_BY:
+            raise ValueError(f"Unknown chunk_by {chunk_by!r}, expected one of {CHUNK_BY}")
+        started = time.perf_counter()
+        threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+
+        values = np.asarray(values, dtype=float)
+        finite = np.isfinite(values)
+        values = values[finite]
+        ns = None if times is None else np.asarray(times, dtype="datetime64[ns]")[finite].astype(np.int64)
+        names, codes = (None, None)
+        if groups is not None:
+            names, codes = np.unique(np.asarray(groups)[finite], return_inverse=True)
+            codes = codes.astype(np.int64)
+        if chunk_by == "day" and ns is None:
+            raise ValueError("chunk_by='day' needs times")
+
+        key = codes if chunk_by == "equipment" else ns // _DAY_NS
+        if key is None:
+            key = np.zeros(len(values), dtype=np.int64)
+        order = np.lexsort((ns, key)) if ns is not None else np.argsort(key, kind="stable")
+        sorted_key = key[order]
+        bounds = np.flatnonzero(np.diff(sorted_key)) + 1
+        starts = np.concatenate([[0], bounds]) if len(values) else np.array([], dtype=np.int64)
+        ends = np.concatenate([bounds, [len(values)]]) if len(values) else np.array([], dtype=np.int64)
+        units = [(i, int(s), int(e)) for i, (s, e) in enumerate(zip(starts, ends))]
+
+        arrays = {"values": values[order]}
+        if ns is not None:
+            arrays["times"] = ns[order]
+        if codes is not None:
+            arrays["codes"] = codes[order]
+        params = {
+            "method": method,
+            "threshold": threshold,
+            "window_ns": int(window_minutes) * 60 * 10**9 if window_minutes else None,
+            "top_k": top_k,
+        }
+        workers = min(self.max_workers, len(units)) if units else 1
+        if workers <= 1:
+            raw = _run_units(arrays, units, params)
+        else:
+            raw = self._run_pool(arrays, units, params, workers)
+
+        result = self._merge(raw, arrays, names, method, threshold, chunk_by, len(units), workers, top_k)
+        result.elapsed_s = time.perf_counter() - started
+        return result
+
+    def _run_pool(self, arrays: dict[str, np.ndarray], units, params, workers: int):
+        total = sum(e - s for _, s, e in units)
+        target = max(self.min_rows_per_task, total // (workers * 4) + 1)
+        tasks, current, rows = [], [], 0
+        for unit in units:
+            current.append(unit)
+            rows += unit[2] - unit[1]
+            if rows >= target:
+                tasks.append(current)
+                current, rows = [], 0
+        if current:
+            tasks.append(current)
+
+        blocks: list[shared_memory.SharedMemory] = []
+        try:
+            spec = {}
+            for key, array in arrays.items():
+                shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks.append(shm)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+                spec[key] = (shm.name, array.shape, array.dtype.str)
+            pool = self._get_pool()
+            futures = [pool.submit(_run_shared, spec, task, params) for task in tasks]
+            return [item for future in futures for item in future.result()]
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    @staticmethod
+    def _merge(raw, arrays, names, method, threshold, chunk_by, units, workers, top_k) -> FleetResult:
+        raw = sorted(raw, key=lambda item: item[0])
+        stats = RunningStats()
+        by_equipment: dict[str, RunningStats] = {}
+        total_outliers = 0
+        candidates = []
+        for _, overall, per_group, outliers, anomalies in raw:
+            part = RunningStats()
+            part.count, part.mean, part.m2, part.min, part.max = overall
+            stats.merge(part)
+            if per_group is not None:
+                for code, count, mean, m2, low, high in zip(*per_group):
+                    g = RunningStats()
+                    g.count, g.mean, g.m2, g.min, g.max = int(count), float(mean), float(m2), float(low), float(high)
+                    by_equipment.setdefault(str(names[code]), RunningStats()).merge(g)
+            total_outliers += outliers
+            candidates.extend(anomalies)
+
+        # 分數相同時依列位置排序，結果與完成順序無關
+        candidates.sort(key=lambda a: (-a[0], a[1]))
+        times, codes = arrays.get("times"), arrays.get("codes")
+        anomalies = [
+            FleetAnomaly(
+                equipment=None if codes is None else str(names[codes[pos]]),
+                time=None if times is None else np.datetime64(int(times[pos]), "ns"),
+                value=value,
+                score=score,
+                center=center,
+                scale=scale,
+            )
+            for score, pos, value, center, scale in candidates[:top_k]
+        ]
+        return FleetResult(
+            method=method,
+            threshold=threshold,
+            chunk_by=chunk_by,
+            units=units,
+            workers=workers,
+            total_rows=stats.count,
+            stats=stats,
+            by_equipment=by_equipment,
+            total_outliers=total_outliers,
+            anomalies=anomalies,
+        )
+
+
+ANALYTICS = AnalyticsExecutor.from_env()
@@ -0,0 +1,273 @@
+"""
+長時間範圍的近似統計：以決定性的區塊抽樣取代整段掃描，回傳估計值、信賴區間與樣本數。
+
+抽樣方式（分層區塊抽樣）：
+  - 時間範圍切成 n 個等長的層，每層內以固定種子挑一段 block_seconds 長的區塊，
+    查詢只讀這些區塊（時間欄位有索引時每個區塊是一次 index range 讀取），掃描量與樣本大小成正比
+  - 種子由日期範圍決定，同一個問題每次得到相同的樣本與答案
+  - 區塊數依延遲目標自動決定：目標列數 = target_ms × 最近觀察到的讀取速度（rows/s），
+    再除以範圍內的估計列數（EXPLAIN）得到抽樣比例；估計列數不超過目標時直接讀全部資料
+
+誤差界線：振動資料在時間上高度相關，因此以「區塊」為單位做 bootstrap（固定種子），
+平均值、標準差、|v| 百分位數與每日平均都由同一組重抽樣權重得到信賴區間；
+趨勢以區塊平均值對時間的加權迴歸斜率表示，信賴區間不含 0 時才判定為上升 / 下降。
+
+使用方式：
+    plan = SAMPLER.plan(start, end, estimated_rows)
+    ... 依 plan.blocks 查詢 ...
+    SAMPLER.observe(rows, elapsed_s)
+    result = estimate(values, times, plan)
+
+環境變數：
+  - APPROX_TARGET_MS       延遲目標（預設 300）
+  - APPROX_BLOCK_SECONDS   每個區塊的長度（預設 60）
+  - APPROX_MIN_BLOCKS      抽樣時最少區塊數（預設 30）
+  - APPROX_MAX_BLOCKS      最多區塊數（預設 2000，避免查詢字串過長）
+  - APPROX_ROWS_PER_S      尚未觀察到讀取速度時的預設值（預設 200000）
+  - APPROX_BOOTSTRAP       bootstrap 次數（預設 200）
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class SamplePlan:
+    start: datetime
+    end: datetime
+    exact: bool
+    estimated_rows: int
+    target_rows: int
+    block_seconds: int
+    seed: int
+    blocks: list[tuple[datetime, datetime]] = field(default_factory=list)
+
+    @property
+    def fraction(self) -> float:
+        """抽到的時間比例（全部讀取時為 1）。"""
+        if self.exact:
+            return 1.0
+        total = (self.end - self.start).total_seconds()
+        return min(len(self.blocks) * self.block_seconds / total, 1.0) if total > 0 else 1.0
+
+
+@dataclass
+class Estimate:
+    value: float
+    low: float | None = None
+    high: float | None = None
+
+    def format(self, spec: str = ".4g") -> str:
+        if self.low is None or self.high is None:
+            return format(self.value, spec)
+        return f"{self.value:{spec}} [{self.low:{spec}}, {self.high:{spec}}]"
+
+
+@dataclass
+class ApproxResult:
+    exact: bool
+    rows: int
+    blocks: int
+    fraction: float
+    confidence: float
+    mean: Estimate
+    std: Estimate
+    percentiles: dict[int, Estimate]
+    sample_max: float
+    slope_per_day: Estimate | None
+    buckets: list[tuple[str, Estimate, int]]
+    bucket_unit: str
+
+
+class SamplingPlanner:
+    def __init__(
+        self,
+        target_ms: float = 300,
+        block_seconds: int = 60,
+        min_blocks: int = 30,
+        max_blocks: int = 2000,
+        rows_per_s: float = 200_000,
+        alpha: float = 0.3,
+    ):
+        self.target_ms = target_ms
+        self.block_seconds = block_seconds
+        self.min_blocks = min_blocks
+        self.max_blocks = max_blocks
+        self.rows_per_s = rows_per_s
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SamplingPlanner":
+        return cls(
+            target_ms=float(os.getenv("APPROX_TARGET_MS", "300")),
+            block_seconds=int(os.getenv("APPROX_BLOCK_SECONDS", "60")),
+            min_blocks=int(os.getenv("APPROX_MIN_BLOCKS", "30")),
+            max_blocks=int(os.getenv("APPROX_MAX_BLOCKS", "2000")),
+            rows_per_s=float(os.getenv("APPROX_ROWS_PER_S", "200000")),
+        )
+
+    def observe(self, rows: int, elapsed_s: float):
+        """記錄一次讀取的速度（EWMA），下一次規劃依此決定樣本大小。"""
+        if rows < 1000 or elapsed_s <= 0:
+            return
+        with self._lock:
+            self.rows_per_s = (1 - self.alpha) * self.rows_per_s + self.alpha * rows / elapsed_s
+
+    def plan(self, start: datetime, end: datetime, estimated_rows: int, target_ms: float | None = None) -> SamplePlan:
+        """start 含、end 不含；estimated_rows 為範圍內的估計列數。"""
+        target_ms = self.target_ms if target_ms is None else target_ms
+        target_rows = max(int(target_ms / 1000 * self.rows_per_s), 1000)
+        seed = zlib.crc32(f"{start.isoformat()}|{end.isoformat()}".encode())
+        span = (end - start).total_seconds()
+        strata = min(
+            max(math.ceil(span * target_rows / max(estimated_rows, 1) / self.block_seconds), self.min_blocks),
+            self.max_blocks,
+        )
+        # 全部讀取時區塊只用來估計趨勢的不確定性，區塊數同樣不超過 max_blocks
+        exact_block = max(self.block_seconds, math.ceil(span / self.max_blocks))
+        plan = SamplePlan(start, end, True, estimated_rows, target_rows, exact_block, seed)
+        # 樣本已經涵蓋大部分時間時，直接讀全部資料比較單純也比較準
+        if estimated_rows <= target_rows or strata * self.block_seconds >= span / 2:
+            return plan
+
+        plan.exact = False
+        plan.block_seconds = self.block_seconds
+        width = span / strata
+        rng = np.random.default_rng(seed)
+        offsets = rng.uniform(0, max(width - self.block_seconds, 0), strata)
+        for i, offset in enumerate(offsets):
+            block_start = start + timedelta(seconds=int(i * width + offset))
+            plan.blocks.append((block_start, min(block_start + timedelta(seconds=self.block_seconds), end)))
+        return plan
+
+
+# ----------------------------------------------------------------------
+# 估計
+# ----------------------------------------------------------------------
+def estimate(
+    values,
+    times,
+    plan: SamplePlan,
+    confidence: float = 0.95,
+    n_boot: int | None = None,
+) -> ApproxResult:
+    """以區塊為單位的 bootstrap 估計；plan.exact 時統計量為精確值，只有趨勢斜率附信賴區間。"""
+    n_boot = int(os.getenv("APPROX_BOOTSTRAP", "200")) if n_boot is None else n_boot
+    values = np.asarray(values, dtype=float)
+    ns = np.asarray(times, dtype="datetime64[ns]").astype(np.int64)
+    # NULL 讀值（NaN）會讓區塊總和與所有 bootstrap 樣本都變成 nan，建立區塊前先排除
+    finite = np.isfinite(values)
+    if not finite.all():
+        values, ns = values[finite], ns[finite]
+    if not len(values):
+        raise ValueError("範圍內的讀值全部為 NULL")
+    start_ns = np.datetime64(plan.start, "ns").astype(np.int64)
+
+    # 每一列屬於哪個區塊（全部讀取時依 block_seconds 切成自然區塊）
+    if plan.exact:
+        raw = (ns - start_ns) // (plan.block_seconds * 10**9)
+    else:
+        starts = np.array([np.datetime64(s, "ns").astype(np.int64) for s, _ in plan.blocks])
+        raw = np.searchsorted(starts, ns, side="right") - 1
+    present, block = np.unique(raw, return_inverse=True)
+    m = len(present)
+
+    center = float(values.mean())
+    dev = values - center
+    n_i = np.bincount(block, minlength=m).astype(float)
+    s1 = np.bincount(block, weights=dev, minlength=m)
+    s2 = np.bincount(block, weights=dev * dev, minlength=m)
+    x_i = (np.bincount(block, weights=(ns - start_ns) / 86_400e9, minlength=m)) / n_i
+
+    rng = np.random.default_rng(plan.seed)
+    weights = np.vstack([np.ones(m), rng.multinomial(m, np.full(m, 1 / m), size=n_boot)])
+    tail = (1 - confidence) / 2 * 100
+
+    def interval(samples: np.ndarray, always: bool = False) -> Estimate:
+        if plan.exact and not always:
+            return Estimate(float(samples[0]))
+        finite = samples[1:][np.isfinite(samples[1:])]
+        if not len(finite):
+            return Estimate(float(samples[0]))
+        low, high = np.percentile(finite, [tail, 100 - tail])
+        return Estimate(float(samples[0]), float(low), float(high))
+
+    w_n = weights @ n_i
+    mean_dev = (weights @ s1) / w_n
+    var = np.maximum((weights @ s2) / w_n - mean_dev**2, 0.0)
+    mean = interval(center + mean_dev)
+    std = interval(np.sqrt(var))
+
+    # |v| 百分位數：排序一次，每組權重只需要一次累加
+    magnitude = np.abs(values)
+    order = np.argsort(magnitude, kind="stable")
+    sorted_mag, sorted_block = magnitude[order], block[order]
+    rows_needed = 1 if plan.exact else len(weights)
+    quantiles = np.empty((rows_needed, len(PERCENTILES)))
+    for b in range(rows_needed):
+        cum = np.cumsum(weights[b][sorted_block])
+        idx = np.searchsorted(cum, np.array(PERCENTILES) / 100 * cum[-1])
+        quantiles[b] = sorted_mag[np.minimum(idx, len(sorted_mag) - 1)]
+    percentiles = {p: interval(quantiles[:, i]) for i, p in enumerate(PERCENTILES)}
+
+    # 趨勢：區塊平均值對時間（天）的加權迴歸
+    slope = None
+    if m >= 3 and np.ptp(x_i) > 0:
+        sw, sx, sy = w_n, weights @ (n_i * x_i), weights @ s1
+        sxx, sxy = weights @ (n_i * x_i * x_i), weights @ (x_i * s1)
+        denom = sw * sxx - sx * sx
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = interval((sw * sxy - sx * sy) / denom, always=True)
+
+    # 每日（範圍超過 31 天時為每週）平均值
+    unit_days = 1 if (plan.end - plan.start).days <= 31 else 7
+    bucket_of_block = (x_i // unit_days).astype(int)
+    labels, bucket = np.unique(bucket_of_block, return_inverse=True)
+    onehot = np.zeros((m, len(labels)))
+    onehot[np.arange(m), bucket] = 1
+    b_n = weights @ (onehot * n_i[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b_mean = center + (weights @ (onehot * s1[:, None])) / b_n
+    buckets = []
+    for j, label in enumerate(labels):
+        day = (plan.start + timedelta(days=int(label) * unit_days)).date().isoformat()
+        buckets.append((day, interval(b_mean[:, j]), int(b_n[0, j])))
+
+    return ApproxResult(
+        exact=plan.exact,
+        rows=len(values),
+        blocks=m,
+        fraction=plan.fraction,
+        confidence=confidence,
+        mean=mean,
+        std=std,
+        percentiles=percentiles,
+        sample_max=float(magnitude.max()),
+        slope_per_day=slope,
+        buckets=buckets,
+        bucket_unit="日" if unit_days == 1 else "週",
+    )
+
+
+def trend_verdict(slope: Estimate | None) -> str:
+    if slope is None or slope.low is None or slope.high is None:
+        return "資料不足以判斷趨勢"
+    if slope.low > 0:
+        return "上升"
+    if slope.high < 0:
+        return "下降"
+    return "無顯著趨勢"
+
+
+SAMPLER = SamplingPlanner.from_env()
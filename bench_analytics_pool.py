@@ -0,0 +1,111 @@
+"""
+analytics_pool 擴展性基準：以合成的全廠資料（設備 × 多天）測量不同行程數的處理時間，
+確認結果與單行程完全相同，並量測計算期間 event loop 的最大延遲
+（直接在 event loop 中計算 vs. analyze_async 交給行程池）。
+
+用法：python bench_analytics_pool.py [rows] [equipments] [days] [workers ...]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+from analytics_pool import AnalyticsExecutor
+
+
+def synthetic(n_rows: int, n_equipment: int, n_days: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    step = np.timedelta64(n_days * 86_400 * 10**9 // n_rows, "ns")
+    times = np.datetime64("2025-07-01", "ns") + np.arange(n_rows) * step
+    codes = rng.integers(0, n_equipment, n_rows)
+    groups = np.array([f"M{i:03d}" for i in range(n_equipment)])[codes]
+    values = rng.normal(rng.uniform(0.02, 0.2, n_equipment)[codes], 0.01)
+    spikes = rng.choice(n_rows, size=max(n_rows // 100_000, 3), replace=False)
+    values[spikes] += 0.3
+    return values, times, groups
+
+
+def fingerprint(result) -> tuple:
+    return (
+        result.total_rows,
+        result.stats.mean,
+        result.stats.m2,
+        result.total_outliers,
+        tuple((a.equipment, int(a.time.astype(np.int64)), a.score) for a in result.anomalies),
+        tuple((name, s.count, s.mean, s.m2) for name, s in sorted(result.by_equipment.items())),
+    )
+
+
+async def loop_lag(work) -> tuple[float, float]:
+    """work 執行期間每 5ms 的 tick 最多延遲多久。"""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - before - 0.005)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    done = True
+    await task
+    return elapsed, lag
+
+
+def main(n_rows: int, n_equipment: int, n_days: int, worker_counts: list[int]):
+    values, times, groups = synthetic(n_rows, n_equipment, n_days)
+    print(f"rows={n_rows}, equipments={n_equipment}, days={n_days}, cpus={os.cpu_count()}")
+
+    for chunk_by in ("equipment", "day"):
+        baseline = None
+        print(f"\nchunk_by={chunk_by}")
+        print(f"{'workers':>7} {'seconds':>8} {'speedup':>8}  identical")
+        for workers in worker_counts:
+            executor = AnalyticsExecutor(max_workers=workers)
+            executor.analyze(values[:1000], times[:1000], groups[:1000], chunk_by=chunk_by)  # 預熱行程池
+            started = time.perf_counter()
+            result = executor.analyze(values, times, groups, chunk_by=chunk_by, method="mad", top_k=20)
+            elapsed = time.perf_counter() - started
+            executor.close()
+            if baseline is None:
+                baseline = (elapsed, fingerprint(result))
+            same = fingerprint(result) == baseline[1]
+            print(f"{workers:>7} {elapsed:>8.2f} {baseline[0] / elapsed:>7.2f}x  {same}")
+
+    async def lag_report():
+        inline = AnalyticsExecutor(max_workers=1)
+        pooled = AnalyticsExecutor(max_workers=max(worker_counts))
+
+        async def run_inline():
+            inline.analyze(values, times, groups, method="mad")
+
+        async def run_pooled():
+            await pooled.analyze_async(values, times, groups, method="mad")
+
+        print("\nevent loop lag while analysing")
+        for name, work in (("inline", run_inline), ("analyze_async", run_pooled)):
+            elapsed, lag = await loop_lag(work)
+            print(f"{name:<14} {elapsed:>6.2f}s  max tick lag {lag * 1000:>8.1f} ms")
+        pooled.close()
+
+    asyncio.run(lag_report())
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    rows = args[0] if len(args) > 0 else 4_000_000
+    equipments = args[1] if len(args) > 1 else 50
+    days = args[2] if len(args) > 2 else 30
+    workers = args[3:] or sorted({1, 2, 4, os.cpu_count() or 1})
+    main(rows, equipments, days, workers)
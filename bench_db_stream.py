@@ -0,0 +1,81 @@
+"""
+tracemalloc 記憶體基準：比較 fetchall + 全部格式化 與 fetchmany 串流 + 有上限輸出。
+
+不需要資料庫：以假的 cursor 產生一整天的高頻振動資料。
+
+用法：python bench_db_stream.py [rows ...]
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from db_stream import BoundedTextWriter, RunningStats, as_float, iter_rows
+
+
+class FakeCursor:
+    """模擬 unbuffered cursor：資料在 fetch 時才產生。"""
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+        self._i = 0
+        self._start = datetime(2025, 7, 25)
+
+    def _row(self, i: int):
+        return (self._start + timedelta(milliseconds=i * 10), 0.05 + (i % 97) * 0.001)
+
+    def fetchmany(self, size: int):
+        end = min(self._i + size, self.n_rows)
+        rows = [self._row(i) for i in range(self._i, end)]
+        self._i = end
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(self.n_rows - self._i)
+
+
+def buffered(n_rows: int) -> str:
+    """原本工具的做法：fetchall 後再建立完整的字串列表。"""
+    rows = FakeCursor(n_rows).fetchall()
+    result = [f"Time: {row[0]}, vibration: {row[1]}" for row in rows]
+    values = [row[1] for row in rows]
+    avg = sum(values) / len(values)
+    return "\n".join(result) + f"\nmean={avg}"
+
+
+def streaming(n_rows: int, batch_size: int = 5000, max_lines: int = 2000) -> str:
+    writer = BoundedTextWriter(max_lines=max_lines)
+    stats = RunningStats()
+    for row in iter_rows(FakeCursor(n_rows), batch_size):
+        stats.add(as_float(row[1]))
+        if writer.full:
+            writer.skip()
+        else:
+            writer.write_line(f"Time: {row[0]}, vibration: {row[1]}")
+    return writer.getvalue() + f"\nmean={stats.mean}"
+
+
+def measure(func, n_rows: int) -> tuple[float, float]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    func(n_rows)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+
+def main(sizes: list[int]):
+    print(f"{'rows':>10} {'buffered MiB':>13} {'stream MiB':>11} {'buffered s':>11} {'stream s':>9}")
+    for n in sizes:
+        buf_mem, buf_t = measure(buffered, n)
+        str_mem, str_t = measure(streaming, n)
+        print(f"{n:>10} {buf_mem:>13.1f} {str_mem:>11.1f} {buf_t:>11.2f} {str_t:>9.2f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 500_000]
+    main(sizes)
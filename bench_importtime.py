@@ -0,0 +1,97 @@
+"""
+啟動時間基準：以 `python -X importtime` 量測各入口模組的 import 時間，
+檢查是否超過預算，以及是否意外載入了不需要的重量級套件。
+
+agent 腳本的時間大部分是 openai / openai-agents SDK 本身（約 1.5–2 秒，隨機器負載變動數百 ms），
+因此這些入口的預算只算腳本自己增加的部分：同一次量測中扣掉 SDK 套件的 cumulative 時間。
+
+用法：
+    python bench_importtime.py            # 每個入口量測 3 次取最小值
+    python bench_importtime.py --repeat 5 --scale 1.5
+結果超過預算或載入禁止的套件時以 exit code 1 結束，可放在 CI 中使用。
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# 入口模組 -> (預算 ms, 不應在 import 時載入的套件, 不計入預算的套件)
+HEAVY = ("pandas", "matplotlib", "sqlalchemy", "numpy")
+SDK = ("openai", "agents")
+ENTRY_POINTS = {
+    "openai_agent_case1_mcp": (500, HEAVY, SDK),
+    "openai_agent_case2_vibration": (500, HEAVY, SDK),
+    "Vibration_openai_agent_case3_Multiagent": (500, HEAVY, SDK),
+    "openai_agent_expert": (500, HEAVY, SDK),
+    "openai_agent_provider": (500, HEAVY, SDK),
+    "upload_data": (100, HEAVY, ()),
+    "vibration_db": (100, HEAVY, ()),
+    "settings": (100, HEAVY, ()),
+}
+
+# 匯入 agent 腳本時必要的環境變數（只用來通過設定檢查，不會連線）
+DUMMY_ENV = {
+    "EXAMPLE_BASE_URL": "http://127.0.0.1:9/v1",
+    "EXAMPLE_API_KEY": "dummy",
+    "EXAMPLE_MODEL_NAME": "dummy",
+    "MYSQL_PORT": "3306",
+    "MYSQL_TABLE": "equipment_data",
+}
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_profile(module: str) -> dict[str, int]:
+    """回傳 {模組名稱: cumulative 微秒}；入口直接 import 的模組另外記在 "<direct>.名稱"。"""
+    env = {**DUMMY_ENV, **os.environ}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2))
+            if len(match.group(3)) == 2:
+                profile[f"<direct>.{match.group(4)}"] = int(match.group(2))
+    return profile
+
+
+def main(repeat: int, scale: float) -> int:
+    failed = False
+    print(f"{'module':<42} {'total':>8} {'sdk':>8} {'own ms':>8} {'budget':>8}  heavy imports")
+    for module, (budget_ms, forbidden, excluded) in ENTRY_POINTS.items():
+        runs = [import_profile(module) for _ in range(repeat)]
+        # 同一次 import 中 SDK 與腳本的時間受相同的負載影響，相減後比總時間穩定
+        own = [(run[module] - sum(run.get(f"<direct>.{name}", 0) for name in excluded), run) for run in runs]
+        best, profile = min(own, key=lambda item: item[0])
+        total = profile[module] / 1000
+        loaded = sorted({name.split(".")[0] for name in runs[0]} & set(forbidden))
+        budget = budget_ms * scale
+        status = "ok"
+        if best / 1000 > budget or loaded:
+            status = "FAIL"
+            failed = True
+        print(
+            f"{module:<42} {total:>8.0f} {total - best / 1000:>8.0f} {best / 1000:>8.0f} {budget:>8.0f}  "
+            f"{', '.join(loaded) or '-'}  {status}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget checks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args()
+    sys.exit(main(args.repeat, args.scale))
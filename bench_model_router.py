@@ -0,0 +1,125 @@
+"""
+model_router 尾端延遲基準：在本機啟動兩個 OpenAI 相容的替身伺服器，
+一台平常較快但偶爾忙碌（模擬 GPU 被其他工作佔用），另一台穩定但較慢，
+比較「固定用一台」、「依延遲路由」與「路由 + 對沖」的首個 token 延遲分佈。
+
+用法：python bench_model_router.py [requests]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from agents import ModelSettings, ModelTracing
+from openai.types.responses import ResponseTextDeltaEvent
+
+from model_router import Endpoint, RoutingModelProvider
+
+
+def make_handler(base_delay: float, busy_delay: float, busy_rate: float, rng: random.Random):
+    class StandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def handle(self):
+            # 對沖輸掉的請求會被客戶端中途關閉連線
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            delay = base_delay + (busy_delay if rng.random() < busy_rate else 0.0)
+            time.sleep(delay)
+            chunks = ["振動", "數值", "正常", "。"]
+            if not body.get("stream"):
+                payload = {
+                    "id": "standin", "object": "chat.completion", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "".join(chunks)}}],
+                }
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for text in chunks + [None]:
+                delta = {"role": "assistant", "content": text} if text is not None else {}
+                chunk = {
+                    "id": "standin", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None if text else "stop"}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(0.005)
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    return StandInHandler
+
+
+def start_server(base_delay: float, busy_delay: float, busy_rate: float, seed: int) -> str:
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), make_handler(base_delay, busy_delay, busy_rate, random.Random(seed))
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+async def first_token_latency(model) -> float:
+    started = time.perf_counter()
+    ttft = None
+    async for event in model.stream_response(
+        "You are a test.", "hi", ModelSettings(), [], None, [], ModelTracing.DISABLED,
+        previous_response_id=None, conversation_id=None, prompt=None,
+    ):
+        if ttft is None and isinstance(event, ResponseTextDeltaEvent):
+            ttft = time.perf_counter() - started
+    return ttft
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+async def run(name: str, provider: RoutingModelProvider, n_requests: int):
+    model = provider.get_model("bench-model")
+    samples = [await first_token_latency(model) for _ in range(n_requests)]
+    print(
+        f"{name:<22} p50={percentile(samples, 0.5) * 1000:>6.0f}ms "
+        f"p95={percentile(samples, 0.95) * 1000:>6.0f}ms max={max(samples) * 1000:>6.0f}ms"
+    )
+
+
+async def main(n_requests: int):
+    busy_url = start_server(base_delay=0.05, busy_delay=1.5, busy_rate=0.2, seed=1)
+    steady_url = start_server(base_delay=0.20, busy_delay=0.0, busy_rate=0.0, seed=2)
+
+    def endpoints():
+        return [Endpoint("busy-gpu", busy_url, "bench-model"), Endpoint("steady-gpu", steady_url, "bench-model")]
+
+    # 基準只跑幾秒，半衰期相應縮短（實際部署預設 60 秒）
+    options = {"decay_half_life_s": 1.0}
+    print(f"{n_requests} sequential streamed requests per configuration")
+    await run("single endpoint", RoutingModelProvider(endpoints()[:1]), n_requests)
+    await run("latency router", RoutingModelProvider(endpoints(), **options), n_requests)
+    await run("router + hedge 0.3s", RoutingModelProvider(endpoints(), hedge_after_s=0.3, **options), n_requests)
+    # 其中一台完全無法連線時自動換端點
+    dead = [Endpoint("dead-gpu", "http://127.0.0.1:9/v1", "bench-model")] + endpoints()[1:]
+    await run("failover (dead+steady)", RoutingModelProvider(dead, default_latency_s=0.01), n_requests)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 40))
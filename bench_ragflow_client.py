@@ -0,0 +1,145 @@
+"""
+ragflow_client 每個 chunk 的客戶端成本基準。
+
+在另一個行程啟動 RAGFlow 替身伺服器（list_chats / create_session / 原生累積串流 /
+OpenAI 相容增量串流），以 process_time 只量測客戶端行程的 CPU 時間，比較：
+  - original : 舊 ragflow_api.py 的做法（每次 list_chats + create_session，累積內容切片）
+  - sdk      : RAGFlowClient(transport="sdk")，重複使用 session，DeltaTracker 取增量
+  - openai   : RAGFlowClient(transport="openai")，伺服器直接送增量
+回答長度加倍時，累積串流的每 chunk 成本跟著變大，增量串流維持固定。
+
+用法：python bench_ragflow_client.py [chunks ...]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_ID = "bench_chat"
+PIECES = ("振動", "數值", "正常", "，", "設備", "運轉", "穩定", "。")
+
+
+class StandInRAGFlow(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _sse(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for event in events:
+            self.wfile.write(b"data:" + json.dumps(event, ensure_ascii=False).encode() + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        if self.path.startswith("/api/v1/chats"):
+            self._json({"code": 0, "data": [{"id": CHAT_ID, "name": "bench"}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/sessions"):
+            self._json({"code": 0, "data": {"id": "s1", "chat_id": CHAT_ID, "name": body.get("name")}})
+        elif self.path == f"/api/v1/chats/{CHAT_ID}/completions":
+            n = int(body["question"])
+
+            def cumulative():
+                answer = ""
+                for i in range(n):
+                    answer += PIECES[i % len(PIECES)]
+                    yield {"code": 0, "data": {"answer": answer, "reference": {}}}
+                yield {"code": 0, "data": True}
+
+            self._sse(cumulative())
+        elif self.path == f"/api/v1/chats_openai/{CHAT_ID}/chat/completions":
+            n = int(body["messages"][-1]["content"])
+            self._sse(
+                {
+                    "id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "model",
+                    "choices": [{"index": 0, "delta": {"content": PIECES[i % len(PIECES)]}, "finish_reason": None}],
+                }
+                for i in range(n)
+            )
+
+
+def serve(port_queue):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInRAGFlow)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def run_original(base_url: str, n: int) -> str:
+    from ragflow_sdk import RAGFlow
+
+    rag_object = RAGFlow(api_key="bench", base_url=base_url)
+    assistant = rag_object.list_chats(id=CHAT_ID)[0]
+    session = assistant.create_session(name="test_session1234")
+    response = ""
+    out = []
+    for ans in session.ask(str(n), stream=True):
+        out.append(ans.content[len(response):])
+        response = ans.content
+    return "".join(out)
+
+
+async def run_client(client, n: int) -> str:
+    return await client.answer(str(n))
+
+
+def measure(fn) -> float:
+    cpu = time.process_time()
+    fn()
+    return time.process_time() - cpu
+
+
+def main(sizes: list[int]):
+    from ragflow_client import RAGFlowClient
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ports,), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{ports.get()}"
+
+    loop = asyncio.new_event_loop()
+    clients = {
+        transport: RAGFlowClient("bench", base_url, CHAT_ID, transport=transport, max_turns=10**6)
+        for transport in ("sdk", "openai")
+    }
+    runners = {
+        "original": lambda n: run_original(base_url, n),
+        "sdk": lambda n: loop.run_until_complete(run_client(clients["sdk"], n)),
+        "openai": lambda n: loop.run_until_complete(run_client(clients["openai"], n)),
+    }
+    # 預熱（建立 session、連線池）並確認三種方式得到相同的回答
+    expected = "".join(PIECES[i % len(PIECES)] for i in range(64))
+    for name, runner in runners.items():
+        assert runner(64) == expected, name
+
+    print(f"{'chunks':>7} " + " ".join(f"{name + ' us/chunk':>18}" for name in runners))
+    for n in sizes:
+        row = [f"{measure(lambda: runner(n)) / n * 1e6:>18.1f}" for runner in runners.values()]
+        print(f"{n:>7} " + " ".join(row))
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2000, 4000])
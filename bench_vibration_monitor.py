@@ -0,0 +1,89 @@
+"""
+vibration_monitor 吞吐量基準：以 SQLite 模擬 equipment_data，
+每一輪插入一批合成資料後執行一次 tick，確認只處理新列並量測每秒處理列數。
+
+用法：python bench_vibration_monitor.py [rounds] [rows_per_round] [equipments]
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from vibration_monitor import AlertStore, VibrationMonitor
+
+
+class SQLiteSource:
+    """與 MySQLSource 相同介面的 SQLite 資料來源。"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def latest_time(self):
+        (latest,) = self.conn.execute("SELECT MAX(Time) FROM equipment_data").fetchone()
+        return latest
+
+    def fetch_since(self, watermark: str):
+        yield from self.conn.execute(
+            "SELECT Time, Vibration, Equipment FROM equipment_data WHERE Time >= ? ORDER BY Time",
+            (watermark,),
+        )
+
+
+def insert_rows(conn, start: datetime, n_rows: int, n_equipment: int, spike_rate: float = 0.0005):
+    rows = []
+    for i in range(n_rows):
+        value = random.gauss(0.05 + (i % n_equipment) * 0.001, 0.005)
+        if random.random() < spike_rate:
+            value += 0.2
+        ts = start + timedelta(milliseconds=20 * i)
+        rows.append((ts.strftime("%Y-%m-%d %H:%M:%S.%f"), f"M{i % n_equipment:03d}", value))
+    with conn:
+        conn.executemany("INSERT INTO equipment_data (Time, Equipment, Vibration) VALUES (?, ?, ?)", rows)
+    return start + timedelta(milliseconds=20 * n_rows)
+
+
+def main(rounds: int, rows_per_round: int, n_equipment: int):
+    random.seed(0)
+    tmp = tempfile.mkdtemp()
+    source_conn = sqlite3.connect(os.path.join(tmp, "source.db"))
+    source_conn.execute("CREATE TABLE equipment_data (Time TEXT, Equipment TEXT, Vibration REAL)")
+    source_conn.execute("CREATE INDEX idx_time ON equipment_data(Time)")
+
+    # 先放一筆資料作為起始 watermark
+    clock = insert_rows(source_conn, datetime(2025, 7, 25), 1, n_equipment)
+    store = AlertStore(os.path.join(tmp, "alerts.db"))
+    monitor = VibrationMonitor(source=SQLiteSource(source_conn), store=store, warmup=50)
+    monitor.tick()
+
+    total_rows, total_time = 0, 0.0
+    print(f"{'round':>5} {'inserted':>9} {'processed':>10} {'rows/s':>10}")
+    for r in range(1, rounds + 1):
+        clock = insert_rows(source_conn, clock, rows_per_round, n_equipment)
+        t0 = time.perf_counter()
+        processed = monitor.tick()
+        elapsed = time.perf_counter() - t0
+        assert processed == rows_per_round, f"expected {rows_per_round} new rows, processed {processed}"
+        total_rows += processed
+        total_time += elapsed
+        print(f"{r:>5} {rows_per_round:>9} {processed:>10} {processed / elapsed:>10.0f}")
+
+    # 沒有新資料時 tick 應該幾乎不花時間
+    t0 = time.perf_counter()
+    idle = monitor.tick()
+    idle_ms = (time.perf_counter() - t0) * 1000
+    alerts = len(store.recent_alerts(limit=1_000_000))
+    print(f"total {total_rows} rows in {total_time:.2f}s ({total_rows / total_time:.0f} rows/s), "
+          f"idle tick {idle} rows in {idle_ms:.1f} ms, alerts={alerts}")
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rows_per_round = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    equipments = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    main(rounds, rows_per_round, equipments)
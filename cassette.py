@@ -0,0 +1,779 @@
+"""
+錄製 / 回放真實的 agent 執行（cassette），當作效能回歸測試。
+
+錄製（record）時記錄：
+  - 每次模型呼叫的請求（instructions、input、工具名稱）與回應（串流事件及其時間點、usage）
+  - 每次 function tool 呼叫的參數、輸出、耗時，以及期間的 MySQL 查詢次數與耗時
+  - 每個 MySQL 查詢的 SQL、參數、欄位與讀出的資料列
+  - MCP server 的 list_tools 與 call_tool 結果
+回放（replay）時不需要模型服務、MySQL 或 MCP server，結果是確定的：
+  - 模型回應依序從 cassette 取出（CASSETTE_SPEED=1 時依錄製的時間點送出，預設 0 立即送出）
+  - 有查詢資料庫的工具重新執行目前版本的程式碼，查詢結果由 cassette 提供，
+    因此工具本地處理時間的回歸量得到；其他工具（天氣、搜尋、警報等）直接回放模型當時看到的輸出
+  - 結束時印出回合數、prompt token 估計與時間分解（模型 / 工具本地處理 / 資料庫 / 框架開銷）
+目前版本的請求與錄製時不同（多了模型呼叫、查詢不同的 SQL）時記為 miss 並列在報告中。
+
+使用方式（入口腳本）：
+    CASSETTE.instrument(agent)   # 包裝 agent 的 function tools，並接管 vibration_db.connect
+    result = Runner.run_streamed(agent, input=..., run_config=RunConfig(
+        model_provider=CASSETTE.provider(CUSTOM_MODEL_PROVIDER)))
+    ...
+    CASSETTE.finish()            # 錄製：寫入 cassette；回放：印出報告
+
+命令列：
+    CASSETTE_MODE=record CASSETTE_FILE=cassettes/case2.json python openai_agent_case2_vibration.py
+    CASSETTE_MODE=replay CASSETTE_FILE=cassettes/case2.json CASSETTE_REPORT=new.json python openai_agent_case2_vibration.py
+    python cassette.py show cassettes/case2.json
+    python cassette.py compare cassettes/case2.json new.json
+
+環境變數：
+  - CASSETTE_MODE    record / replay（未設定時不啟用，所有方法都不做事）
+  - CASSETTE_FILE    cassette 路徑（預設 cassette.json）
+  - CASSETTE_SPEED   回放時模型、工具與資料庫延遲的倍率（預設 0）
+  - CASSETTE_REPORT  回放報告的輸出路徑（選填，可用 compare 與 cassette 或其他報告比較）
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextvars
+import dataclasses
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, AsyncIterator
+
+from agents import FunctionTool, Model, ModelProvider, ModelResponse, Usage
+
+from output_governor import estimate_tokens
+
+MODES = ("", "record", "replay")
+VERSION = 1
+_MODEL_ARGS = ("system_instructions", "input", "model_settings", "tools", "output_schema", "handoffs", "tracing")
+
+# 目前正在執行的工具呼叫，資料庫查詢的次數與耗時記在它底下
+_CURRENT_TOOL: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar("cassette_tool", default=None)
+
+
+class CassetteMiss(LookupError):
+    """回放時找不到對應的錄製內容。"""
+
+
+# ----------------------------------------------------------------------
+# 序列化
+# ----------------------------------------------------------------------
+def _default(obj: Any):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_unset=True)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _jsonable(obj: Any) -> Any:
+    return json.loads(json.dumps(obj, ensure_ascii=False, default=_default))
+
+
+def _encode_value(value: Any) -> Any:
+    """資料列的值：保留 datetime / Decimal 等型別，回放時還原成相同的 Python 物件。"""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, timedelta):
+        return {"$timedelta": value.total_seconds()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": bytes(value).hex()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and len(value) == 1:
+        (tag, raw), = value.items()
+        if tag == "$datetime":
+            return datetime.fromisoformat(raw)
+        if tag == "$date":
+            return date.fromisoformat(raw)
+        if tag == "$decimal":
+            return Decimal(raw)
+        if tag == "$timedelta":
+            return timedelta(seconds=raw)
+        if tag == "$bytes":
+            return bytes.fromhex(raw)
+    return value
+
+
+def _query_key(sql: str, params, source: str | None = None) -> str:
+    # 多廠區查詢的 SQL 與參數相同，需以來源名稱區分；預設資料庫維持舊格式以相容既有 cassette
+    key = [sql, [_encode_value(p) for p in params or ()]]
+    if source is not None:
+        key.append(source)
+    return json.dumps(key, ensure_ascii=False, default=str)
+
+
+def _request(args: tuple, kwargs: dict[str, Any]) -> dict[str, Any]:
+    values = dict(zip(_MODEL_ARGS, args))
+    values.update(kwargs)
+    return {
+        "instructions": values.get("system_instructions"),
+        "input": _jsonable(values.get("input")),
+        "tools": [getattr(tool, "name", str(tool)) for tool in values.get("tools") or ()],
+        "handoffs": [getattr(h, "tool_name", str(h)) for h in values.get("handoffs") or ()],
+    }
+
+
+def _request_tokens(request: dict[str, Any]) -> int:
+    return estimate_tokens(json.dumps(request, ensure_ascii=False))
+
+
+def _usage(usage: Any) -> dict[str, int]:
+    if usage is None:
+        return {"input_tokens": 0, "output_tokens": 0}
+    if isinstance(usage, dict):
+        return {"input_tokens": usage.get("input_tokens") or 0, "output_tokens": usage.get("output_tokens") or 0}
+    return {"input_tokens": usage.input_tokens or 0, "output_tokens": usage.output_tokens or 0}
+
+
+def _stream_usage(events: list[dict[str, Any]]) -> dict[str, int]:
+    for item in reversed(events):
+        if item["event"].get("type") == "response.completed":
+            return _usage((item["event"].get("response") or {}).get("usage"))
+    return _usage(None)
+
+
+@functools.cache
+def _adapters():
+    from openai.types.responses import ResponseOutputItem, ResponseStreamEvent
+    from pydantic import TypeAdapter
+
+    return TypeAdapter(ResponseStreamEvent), TypeAdapter(ResponseOutputItem)
+
+
+def _model_response(recorded: dict[str, Any]) -> ModelResponse:
+    _, output_item = _adapters()
+    usage = recorded["usage"]
+    return ModelResponse(
+        output=[output_item.validate_python(item) for item in recorded["output"]],
+        usage=Usage(
+            requests=1,
+            input_tokens=usage["input_tokens"],
+            output_tokens=usage["output_tokens"],
+            total_tokens=usage["input_tokens"] + usage["output_tokens"],
+        ),
+        response_id=recorded.get("response_id"),
+    )
+
+
+# ----------------------------------------------------------------------
+# 模型
+# ----------------------------------------------------------------------
+class CassetteModel(Model):
+    def __init__(self, cassette: "Cassette", inner: Model | None):
+        self.cassette = cassette
+        self.inner = inner
+
+    async def get_response(self, *args, **kwargs):
+        cassette = self.cassette
+        request = _request(args, kwargs)
+        if cassette.replaying:
+            call = cassette.next_model_call(request)
+            waited = await cassette.sleep(call["latency_s"])
+            cassette.add_model_stats(request, call["latency_s"], None, call["usage"], waited)
+            return _model_response(call["response"])
+
+        entry = cassette.start_model_call(request, stream=False)
+        start = time.perf_counter()
+        response = await self.inner.get_response(*args, **kwargs)
+        latency = time.perf_counter() - start
+        usage = _usage(response.usage)
+        entry.update(
+            latency_s=latency,
+            usage=usage,
+            response={"output": _jsonable(response.output), "usage": usage, "response_id": response.response_id},
+        )
+        cassette.add_model_stats(request, latency, None, usage, latency)
+        return response
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+        cassette = self.cassette
+        request = _request(args, kwargs)
+        if cassette.replaying:
+            call = cassette.next_model_call(request)
+            stream_event, _ = _adapters()
+            elapsed = waited = 0.0
+            for item in call["events"]:
+                waited += await cassette.sleep(item["t"] - elapsed)
+                elapsed = item["t"]
+                yield stream_event.validate_python(item["event"])
+            cassette.add_model_stats(request, call["latency_s"], call.get("ttft_s"), call["usage"], waited)
+            return
+
+        entry = cassette.start_model_call(request, stream=True)
+        events: list[dict[str, Any]] = []
+        ttft = None
+        start = time.perf_counter()
+        try:
+            async for event in self.inner.stream_response(*args, **kwargs):
+                t = time.perf_counter() - start
+                if ttft is None and getattr(event, "type", "") == "response.output_text.delta":
+                    ttft = t
+                events.append({"t": round(t, 6), "event": _jsonable(event)})
+                yield event
+        finally:
+            latency = time.perf_counter() - start
+            usage = _stream_usage(events)
+            entry.update(latency_s=latency, ttft_s=ttft, usage=usage, events=events)
+            cassette.add_model_stats(request, latency, ttft, usage, latency)
+
+
+class CassetteModelProvider(ModelProvider):
+    def __init__(self, cassette: "Cassette", inner: ModelProvider):
+        self.cassette = cassette
+        self.inner = inner
+
+    def get_model(self, model_name: str | None) -> Model:
+        if self.cassette.replaying:
+            return CassetteModel(self.cassette, None)
+        return CassetteModel(self.cassette, self.inner.get_model(model_name))
+
+
+# ----------------------------------------------------------------------
+# 資料庫（取代 vibration_db.connect）
+# ----------------------------------------------------------------------
+def _source_name(source) -> str | None:
+    """multi_source.DBSource 以 name 區分廠區；None 代表預設資料庫。"""
+    if source is None:
+        return None
+    return str(getattr(source, "name", source))
+
+
+class _RecordingCursor:
+    def __init__(self, cassette: "Cassette", inner, source: str | None = None):
+        self._cassette = cassette
+        self._inner = inner
+        self._source = source
+        self._entry: dict[str, Any] | None = None
+
+    @property
+    def column_names(self):
+        return self._inner.column_names
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self._entry is not None:
+                self._entry["duration_s"] += elapsed
+            self._cassette.add_db_time(elapsed)
+
+    def execute(self, query, params=None):
+        self._entry = self._cassette.start_query(query, params, self._source)
+        self._cassette.add_db_time(0.0, queries=1)
+        result = self._timed(self._inner.execute, query, params)
+        try:
+            self._entry["columns"] = list(self._inner.column_names or ())
+        except Exception:
+            pass
+        return result
+
+    def _keep(self, rows):
+        if self._entry is not None and rows:
+            self._entry["rows"].extend([_encode_value(v) for v in row] for row in rows)
+        return rows
+
+    def fetchone(self):
+        row = self._timed(self._inner.fetchone)
+        if row is not None:
+            self._keep([row])
+        return row
+
+    def fetchmany(self, size=1):
+        return self._keep(self._timed(self._inner.fetchmany, size))
+
+    def fetchall(self):
+        return self._keep(self._timed(self._inner.fetchall))
+
+    def close(self):
+        self._inner.close()
+
+
+class _RecordingConnection:
+    def __init__(self, cassette: "Cassette", inner, source: str | None = None):
+        self._cassette = cassette
+        self._inner = inner
+        self._source = source
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._cassette, self._inner.cursor(*args, **kwargs), self._source)
+
+    def close(self):
+        self._inner.close()
+
+
+class _ReplayCursor:
+    def __init__(self, cassette: "Cassette", source: str | None = None):
+        self._cassette = cassette
+        self._source = source
+        self._rows: deque = deque()
+        self.column_names: tuple[str, ...] = ()
+
+    def execute(self, query, params=None):
+        entry = self._cassette.take_query(query, params, self._source)
+        self.column_names = tuple(entry.get("columns") or ())
+        self._rows = deque(tuple(_decode_value(v) for v in row) for row in entry["rows"])
+        self._cassette.add_db_time(entry["duration_s"], queries=1, replayed=True)
+
+    def fetchone(self):
+        return self._rows.popleft() if self._rows else None
+
+    def fetchmany(self, size=1):
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def fetchall(self):
+        rows, self._rows = list(self._rows), deque()
+        return rows
+
+    def close(self):
+        self._rows.clear()
+
+
+class _ReplayConnection:
+    def __init__(self, cassette: "Cassette", source: str | None = None):
+        self._cassette = cassette
+        self._source = source
+
+    def cursor(self, *args, **kwargs):
+        return _ReplayCursor(self._cassette, self._source)
+
+    def close(self):
+        pass
+
+
+# ----------------------------------------------------------------------
+# Cassette
+# ----------------------------------------------------------------------
+class Cassette:
+    def __init__(self, mode: str = "", path: str = "cassette.json", speed: float = 0.0, report_path: str | None = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {MODES[1:]}")
+        self.mode = mode
+        self.path = path
+        self.speed = speed
+        self.report_path = report_path
+        self.data: dict[str, Any] = {
+            "version": VERSION,
+            "recorded_on": date.today().isoformat(),
+            "model_calls": [],
+            "tool_calls": [],
+            "db_queries": [],
+            "mcp": {},
+        }
+        self.misses: list[str] = []
+        # 回放時重新執行、但輸出與錄製時不同的工具
+        self.changed_outputs: list[str] = []
+        self._lock = threading.Lock()
+        self._model_stats: list[dict[str, Any]] = []
+        self._tool_stats: dict[str, dict[str, float]] = {}
+        self._db = {"queries": 0, "duration_s": 0.0}
+        self._model_cursor = 0
+        self._tool_queues: dict[tuple[str, str], deque] = defaultdict(deque)
+        self._query_queues: dict[str, deque] = defaultdict(deque)
+        self._db_patched = False
+        self._started = time.perf_counter()
+        if mode == "replay":
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "Cassette":
+        return cls(
+            mode=os.getenv("CASSETTE_MODE", ""),
+            path=os.getenv("CASSETTE_FILE", "cassette.json"),
+            speed=float(os.getenv("CASSETTE_SPEED", "0")),
+            report_path=os.getenv("CASSETTE_REPORT") or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            self.data = json.load(f)
+        for call in self.data["tool_calls"]:
+            self._tool_queues[(call["name"], call["input"])].append(call)
+        for query in self.data["db_queries"]:
+            self._query_queues[query["key"]].append(query)
+        # 相對日期（昨天、最近 N 天）依錄製當天解析
+        import date_parser
+
+        date_parser.FIXED_TODAY = date.fromisoformat(self.data["recorded_on"])
+
+    async def sleep(self, seconds: float) -> float:
+        delay = max(seconds, 0.0) * self.speed
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    # ------------------------------------------------------------------
+    # 接線
+    # ------------------------------------------------------------------
+    def provider(self, inner: ModelProvider) -> ModelProvider:
+        return CassetteModelProvider(self, inner) if self.enabled else inner
+
+    def instrument(self, *agents) -> None:
+        """包裝各 agent 的 function tools，接管 vibration_db.connect，並從這裡開始計時。"""
+        if not self.enabled:
+            return
+        self._patch_db()
+        for agent in agents:
+            for tool in agent.tools:
+                if isinstance(tool, FunctionTool) and not getattr(tool.on_invoke_tool, "_cassette", False):
+                    tool.on_invoke_tool = self._wrap_tool(tool.name, tool.on_invoke_tool)
+        self._started = time.perf_counter()
+
+    def _patch_db(self):
+        if self._db_patched:
+            return
+        import vibration_db
+
+        connect = vibration_db.connect
+        if self.replaying:
+            vibration_db.connect = lambda source=None: _ReplayConnection(self, _source_name(source))
+        else:
+            vibration_db.connect = lambda source=None: _RecordingConnection(
+                self, connect(source), _source_name(source)
+            )
+        self._db_patched = True
+
+    def _wrap_tool(self, name: str, invoke):
+        async def cassette_invoke(ctx, input_json: str):
+            if self.replaying:
+                recorded = self._take(self._tool_queues, (name, input_json))
+                if recorded is None:
+                    return self._miss(f"tool {name}({input_json})")
+                if not recorded["db_queries"]:
+                    waited = await self.sleep(recorded["duration_s"])
+                    self.add_tool_stats(name, waited, recorded["duration_s"] - recorded["db_s"], 0, recorded["db_s"])
+                    return recorded["output"]
+
+            stats = {"db_queries": 0, "db_s": 0.0, "waited_s": 0.0}
+            token = _CURRENT_TOOL.set(stats)
+            start = time.perf_counter()
+            try:
+                output = await invoke(ctx, input_json)
+            finally:
+                _CURRENT_TOOL.reset(token)
+            duration = time.perf_counter() - start
+            if self.recording:
+                local = duration - stats["db_s"]
+                with self._lock:
+                    self.data["tool_calls"].append(
+                        {
+                            "name": name,
+                            "input": input_json,
+                            "output": _jsonable(output),
+                            "duration_s": duration,
+                            "db_queries": stats["db_queries"],
+                            "db_s": stats["db_s"],
+                        }
+                    )
+            else:
+                local = duration - stats["waited_s"]
+                if _jsonable(output) != recorded["output"]:
+                    with self._lock:
+                        self.changed_outputs.append(name)
+            self.add_tool_stats(name, duration, local, stats["db_queries"], stats["db_s"])
+            return output
+
+        cassette_invoke._cassette = True
+        return cassette_invoke
+
+    def wrap_mcp_server(self, server):
+        """錄製時記錄 MCP server 的工具清單與呼叫結果（放在 GOVERNOR.wrap_mcp_server 之內）。"""
+        if not self.recording:
+            return server
+        entry = self.data["mcp"].setdefault(server.name, {"tools": [], "calls": []})
+        list_tools, call_tool = server.list_tools, server.call_tool
+
+        async def recording_list_tools(*args, **kwargs):
+            tools = await list_tools(*args, **kwargs)
+            entry["tools"] = _jsonable(tools)
+            return tools
+
+        async def recording_call_tool(tool_name: str, arguments: dict[str, Any] | None, *args, **kwargs):
+            start = time.perf_counter()
+            result = await call_tool(tool_name, arguments, *args, **kwargs)
+            duration = time.perf_counter() - start
+            entry["calls"].append(
+                {"name": tool_name, "arguments": _jsonable(arguments), "result": _jsonable(result), "duration_s": duration}
+            )
+            self.add_tool_stats(f"mcp:{server.name}:{tool_name}", duration, duration, 0, 0.0)
+            return result
+
+        server.list_tools = recording_list_tools
+        server.call_tool = recording_call_tool
+        return server
+
+    def mcp_server(self, name: str):
+        """回放用的 MCP server：工具清單與呼叫結果都來自 cassette，不需要連線。"""
+        from agents.mcp import MCPServer
+        from mcp.types import CallToolResult, ListPromptsResult, Tool
+
+        cassette = self
+        recorded = self.data["mcp"].get(name, {"tools": [], "calls": []})
+        queues: dict[tuple[str, str], deque] = defaultdict(deque)
+        for call in recorded["calls"]:
+            queues[(call["name"], json.dumps(call["arguments"], sort_keys=True))].append(call)
+
+        class ReplayMCPServer(MCPServer):
+            @property
+            def name(self) -> str:
+                return name
+
+            async def connect(self):
+                pass
+
+            async def cleanup(self):
+                pass
+
+            async def list_tools(self, run_context=None, agent=None):
+                return [Tool.model_validate(tool) for tool in recorded["tools"]]
+
+            async def call_tool(self, tool_name, arguments, meta=None):
+                call = cassette._take(queues, (tool_name, json.dumps(_jsonable(arguments), sort_keys=True)))
+                if call is None:
+                    message = cassette._miss(f"mcp {name}:{tool_name}({arguments})")
+                    return CallToolResult(content=[{"type": "text", "text": message}], isError=True)
+                waited = await cassette.sleep(call["duration_s"])
+                cassette.add_tool_stats(f"mcp:{name}:{tool_name}", waited, call["duration_s"], 0, 0.0)
+                return CallToolResult.model_validate(call["result"])
+
+            async def list_prompts(self):
+                return ListPromptsResult(prompts=[])
+
+            async def get_prompt(self, prompt_name, arguments=None):
+                raise CassetteMiss(f"prompt {prompt_name} was not recorded")
+
+        return ReplayMCPServer()
+
+    # ------------------------------------------------------------------
+    # 錄製 / 取出
+    # ------------------------------------------------------------------
+    def _take(self, queues: dict, key):
+        with self._lock:
+            queue = queues.get(key)
+            return queue.popleft() if queue else None
+
+    def _miss(self, what: str) -> str:
+        with self._lock:
+            self.misses.append(what)
+        print(f"[debug] cassette miss: {what}")
+        return f"[cassette] 沒有錄製到這個呼叫：{what}"
+
+    def start_model_call(self, request: dict[str, Any], stream: bool) -> dict[str, Any]:
+        entry = {"stream": stream, "request": request, "request_tokens": _request_tokens(request)}
+        with self._lock:
+            self.data["model_calls"].append(entry)
+        return entry
+
+    def next_model_call(self, request: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            index = self._model_cursor
+            self._model_cursor += 1
+        calls = self.data["model_calls"]
+        if index >= len(calls):
+            self._miss(f"model call #{index + 1}（錄製時只有 {len(calls)} 次）")
+            raise CassetteMiss("cassette 的模型回應已用完：目前版本多了模型呼叫")
+        call = calls[index]
+        if call["request"]["tools"] != request["tools"]:
+            self._miss(f"model call #{index + 1} 的工具清單與錄製時不同")
+        return call
+
+    def add_model_stats(self, request, latency_s, ttft_s, usage, waited_s):
+        with self._lock:
+            self._model_stats.append(
+                {
+                    "request_tokens": _request_tokens(request),
+                    "latency_s": latency_s,
+                    "ttft_s": ttft_s,
+                    "waited_s": waited_s,
+                    **usage,
+                }
+            )
+
+    def add_tool_stats(self, name: str, wall_s: float, local_s: float, db_queries: int, db_s: float):
+        with self._lock:
+            stats = self._tool_stats.setdefault(name, {"calls": 0, "wall_s": 0.0, "local_s": 0.0, "db_queries": 0, "db_s": 0.0})
+            stats["calls"] += 1
+            stats["wall_s"] += wall_s
+            stats["local_s"] += max(local_s, 0.0)
+            stats["db_queries"] += db_queries
+            stats["db_s"] += db_s
+
+    def start_query(self, query: str, params, source: str | None = None) -> dict[str, Any]:
+        entry = {"key": _query_key(query, params, source), "columns": [], "rows": [], "duration_s": 0.0}
+        with self._lock:
+            self.data["db_queries"].append(entry)
+        return entry
+
+    def take_query(self, query: str, params, source: str | None = None) -> dict[str, Any]:
+        entry = self._take(self._query_queues, _query_key(query, params, source))
+        if entry is None:
+            where = f"[{source}] " if source is not None else ""
+            self._miss(f"{where}query {' '.join(str(query).split())[:120]} {list(params or ())}")
+            raise CassetteMiss("這個查詢沒有錄製在 cassette 中")
+        return entry
+
+    def add_db_time(self, seconds: float, queries: int = 0, replayed: bool = False):
+        waited = seconds * self.speed if replayed else 0.0
+        if waited > 0:
+            time.sleep(waited)
+        stats = _CURRENT_TOOL.get()
+        if stats is not None:
+            stats["db_queries"] += queries
+            stats["db_s"] += seconds
+            stats["waited_s"] += waited
+        with self._lock:
+            self._db["queries"] += queries
+            self._db["duration_s"] += seconds
+
+    # ------------------------------------------------------------------
+    # 報表
+    # ------------------------------------------------------------------
+    def summary(self) -> dict[str, Any]:
+        wall = time.perf_counter() - self._started
+        with self._lock:
+            models = list(self._model_stats)
+            tools = {name: dict(stats) for name, stats in self._tool_stats.items()}
+            db = dict(self._db)
+            misses = list(self.misses)
+            changed = list(self.changed_outputs)
+        ttfts = [m["ttft_s"] for m in models if m["ttft_s"] is not None]
+        waited = sum(m["waited_s"] for m in models) + sum(t["wall_s"] for t in tools.values())
+        return {
+            "turns": len(models),
+            "request_tokens": sum(m["request_tokens"] for m in models),
+            "input_tokens": sum(m["input_tokens"] for m in models),
+            "output_tokens": sum(m["output_tokens"] for m in models),
+            "model_s": sum(m["latency_s"] for m in models),
+            "ttft_s": sum(ttfts) / len(ttfts) if ttfts else None,
+            "tool_local_s": sum(t["local_s"] for t in tools.values()),
+            "db_queries": db["queries"],
+            "db_s": db["duration_s"],
+            "overhead_s": max(wall - waited, 0.0),
+            "wall_s": wall,
+            "tools": tools,
+            "misses": misses,
+            "changed_outputs": changed,
+        }
+
+    def finish(self) -> dict[str, Any] | None:
+        """錄製時寫入 cassette；回放時印出報告（並可寫入 CASSETTE_REPORT）。"""
+        if not self.enabled:
+            return None
+        summary = self.summary()
+        if self.recording:
+            self.data["summary"] = summary
+            _write_json(self.path, self.data)
+        elif self.report_path:
+            _write_json(self.report_path, {"cassette": self.path, "summary": summary})
+        print(format_summary(summary, f"{self.mode} {self.path}"))
+        return summary
+
+
+def _write_json(path: str, payload: dict[str, Any]):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+
+
+def format_summary(summary: dict[str, Any], title: str) -> str:
+    s = summary
+    ttft = f", ttft {s['ttft_s']:.3f}s" if s.get("ttft_s") is not None else ""
+    lines = [
+        f"[cassette] {title}: {s['turns']} turns, prompt ~{s['request_tokens']} tokens, "
+        f"usage in/out {s['input_tokens']}/{s['output_tokens']}",
+        f"[cassette] model {s['model_s']:.3f}s{ttft}, tools local {s['tool_local_s']:.3f}s, "
+        f"db {s['db_s']:.3f}s ({s['db_queries']} queries), overhead {s['overhead_s']:.3f}s, wall {s['wall_s']:.3f}s",
+    ]
+    for name, t in s["tools"].items():
+        lines.append(
+            f"[cassette]   {name}: {t['calls']} calls, local {t['local_s']:.3f}s, "
+            f"db {t['db_s']:.3f}s ({t['db_queries']} queries)"
+        )
+    if s.get("changed_outputs"):
+        lines.append(f"[cassette] 輸出與錄製時不同的工具：{', '.join(s['changed_outputs'])}")
+    if s["misses"]:
+        lines.append(f"[cassette] {len(s['misses'])} misses（目前版本與錄製時的行為不同）：")
+        lines.extend(f"[cassette]   {miss}" for miss in s["misses"])
+    return "\n".join(lines)
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> str:
+    """比較兩份摘要（cassette 的錄製結果或回放報告）。"""
+
+    def pct(old, new) -> str:
+        return f"{(new - old) / old * 100:+.0f}" if old else "-"
+
+    lines = [f"{'metric':<48} {'baseline':>10} {'current':>10} {'Δ%':>6}"]
+    rows = [
+        (key, baseline.get(key), current.get(key))
+        for key in ("turns", "request_tokens", "input_tokens", "output_tokens", "tool_local_s", "db_queries", "overhead_s")
+    ]
+    for name in sorted(set(baseline["tools"]) | set(current["tools"])):
+        old, new = baseline["tools"].get(name), current["tools"].get(name)
+        for key in ("calls", "local_s"):
+            rows.append((f"{name}.{key}", old and old[key], new and new[key]))
+    for key, old, new in rows:
+        if old is None or new is None:
+            lines.append(f"{key:<48} {'-' if old is None else f'{old:.4g}':>10} {'-' if new is None else f'{new:.4g}':>10}")
+            continue
+        lines.append(f"{key:<48} {old:>10.4g} {new:>10.4g} {pct(old, new):>6}")
+    if current.get("misses"):
+        lines.append(f"current has {len(current['misses'])} misses")
+    return "\n".join(lines)
+
+
+def load_summary(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["summary"]
+
+
+CASSETTE = Cassette.from_env()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or compare recorded / replayed agent runs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show")
+    show.add_argument("path")
+    cmp_parser = sub.add_parser("compare")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    args = parser.parse_args()
+    if args.command == "show":
+        print(format_summary(load_summary(args.path), args.path))
+    else:
+        print(compare(load_summary(args.baseline), load_summary(args.current)))
@@ -9,14 +9,26 @@
   - MYSQL_PASSWORD (預設於 upload_data.py)
   - MYSQL_DB (預設 phm)
   - MYSQL_TABLE (預設 equipment_data)
+
+大表請用快速模式（見 table_profile.py）：列數與欄位取自 information_schema、
+有索引的時間欄位只讀索引兩端取得 MIN/MAX、各查詢同時送出，結果快取供 agent 與日期檢查使用。
+    python check_db_preview.py --profile              # 快取未過期時直接顯示快取
+    python check_db_preview.py --profile --refresh    # 重新查詢
+    python check_db_preview.py --profile --full-scan  # 沒有索引的時間欄位也做全表 MIN/MAX
 """
 
+import argparse
+from datetime import date, timedelta
+
 import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 
 # 重用既有的連線參數與方法
-from upload_data import get_engine, MYSQL_DB, MYSQL_TABLE
+from settings import MYSQL_DB, MYSQL_TABLE
+from upload_data import get_engine
+from date_parser import TABLE_EXTENTS_CACHE, save_table_extents
+from table_profile import TABLE_PROFILE_CACHE, get_table_profile, profile_table
 
 
 def main():
@@ -75,6 +87,10 @@ def main():
                 ))
                 min_time, max_time = res.fetchone()
                 print(f"Column `{col}`: min = {min_time}, max = {max_time}")
+                # 第一個時間欄位的範圍寫入快取，供查詢工具在送出 SQL 前檢查日期
+                if col == time_columns[0] and min_time is not None:
+                    save_table_extents(min_time, max_time)
+                    print(f"Saved time extents to {TABLE_EXTENTS_CACHE}")
 
         # 查詢 2025-07-18 當天 vibration 最大值及其時間點
         date_str = "2025-07-18"
@@ -90,12 +106,13 @@ def main():
                 f"""
                 SELECT `{time_col}`, `{vibration_col}`
                 FROM `{MYSQL_TABLE}`
-                WHERE DATE(`{time_col}`) = :date
+                WHERE `{time_col}` >= :date AND `{time_col}` < :next_day
                 ORDER BY `{vibration_col}` DESC
                 LIMIT 1
                 """
             )
-            res = conn.execute(query, {"date": date_str})
+            next_day = (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+            res = conn.execute(query, {"date": date_str, "next_day": next_day})
             row = res.fetchone()
             if row:
                 print(f"On {date_str}, max `{vibration_col}`: {row[1]}, at `{time_col}`: {row[0]}")
@@ -103,5 +120,20 @@ def main():
                 print(f"No data found for {date_str}.")
         
 
+def fast_profile(refresh: bool = False, full_scan: bool = False):
+    profile = profile_table(full_scan=full_scan) if refresh or full_scan else get_table_profile()
+    print(profile.format())
+    if profile.exists:
+        print(f"Profile cache: {TABLE_PROFILE_CACHE}")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="確認資料表是否存在並預覽資料")
+    parser.add_argument("--profile", action="store_true", help="快速模式：information_schema + 索引 MIN/MAX，同時查詢並快取")
+    parser.add_argument("--refresh", action="store_true", help="忽略快取重新查詢（搭配 --profile）")
+    parser.add_argument("--full-scan", action="store_true", help="沒有索引的時間欄位也做全表 MIN/MAX（搭配 --profile）")
+    args = parser.parse_args()
+    if args.profile:
+        fast_profile(refresh=args.refresh, full_scan=args.full_scan)
+    else:
+        main()
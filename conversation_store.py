@@ -0,0 +1,227 @@
+"""
+本地 SQLite 對話記憶（agents SDK 的 Session），用於多輪的維修診斷對話。
+
+  - 每個項目以緊湊 JSON（不轉義中文、無空白）存放，並記錄估計 token 數
+  - 新增項目後壓縮舊的工具輸出：保留最新 keep_recent_tool_outputs 筆完整內容，
+    其餘超過 tool_output_budget 的部分改成摘要（summary）或直接省略（drop）；
+    function_call 與對應的 output 都保留，只替換 output 文字，不會破壞配對
+  - 讀取時只取最近 history_budget tokens 內的項目，並往回延伸到最近的 user 訊息開始；
+    單筆工具輸出就超過預算時，只在讀取時把它壓縮成摘要，確保每輪送給模型的 prompt 大小有上限
+
+使用方式：
+    session = CompactSQLiteSession("line3-maintenance")
+    result = Runner.run_streamed(agent, input=question, session=session)
+
+環境變數：
+  - CONVERSATION_DB          SQLite 檔案（預設 conversations.db）
+  - CONVERSATION_SESSION_ID  入口腳本設定時啟用對話記憶（session_from_env）
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from typing import Any
+
+from agents.memory import SessionABC
+
+from output_governor import estimate_tokens, summarize_text
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB", "conversations.db")
+STRATEGIES = ("summary", "drop")
+
+
+def _dumps(item: Any) -> str:
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class CompactSQLiteSession(SessionABC):
+    def __init__(
+        self,
+        session_id: str,
+        path: str = CONVERSATION_DB_PATH,
+        tool_output_budget: int = 3000,
+        keep_recent_tool_outputs: int = 1,
+        summary_budget: int = 150,
+        history_budget: int | None = 12000,
+        strategy: str = "summary",
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.session_id = session_id
+        self.session_settings = None
+        self.path = path
+        self.tool_output_budget = tool_output_budget
+        self.keep_recent_tool_outputs = keep_recent_tool_outputs
+        self.summary_budget = summary_budget
+        self.history_budget = history_budget
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS session_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                kind TEXT,
+                tokens INTEGER NOT NULL,
+                original_tokens INTEGER NOT NULL,
+                compacted INTEGER NOT NULL DEFAULT 0,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_items ON session_items(session_id, id);
+            """
+        )
+
+    # ------------------------------------------------------------------
+    # Session 介面
+    # ------------------------------------------------------------------
+    async def get_items(self, limit: int | None = None) -> list:
+        return await asyncio.to_thread(self._get_items, limit)
+
+    async def add_items(self, items: list) -> None:
+        if items:
+            await asyncio.to_thread(self._add_items, items)
+
+    async def pop_item(self):
+        return await asyncio.to_thread(self._pop_item)
+
+    async def clear_session(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_items WHERE session_id = ?", (self.session_id,))
+
+    # ------------------------------------------------------------------
+    # 實作
+    # ------------------------------------------------------------------
+    def _get_items(self, limit: int | None) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tokens, data FROM session_items WHERE session_id = ? ORDER BY id DESC",
+                (self.session_id,),
+            ).fetchall()
+        # 由新到舊只解析需要的項目（長對話不必每次解析全部歷史）
+        items: list = []
+
+        def item(i: int) -> dict:
+            while len(items) <= i:
+                items.append(json.loads(rows[len(items)][1]))
+            return items[i]
+
+        cut = len(rows) if limit is None else min(limit, len(rows))
+        if self.history_budget is not None:
+            used = 0
+            for i, (tokens, _) in enumerate(rows[:cut]):
+                used += tokens
+                # 至少保留最新的一筆
+                if used > self.history_budget and i > 0:
+                    cut = i
+                    break
+        if cut < len(rows):
+            # 截斷後要從 user 訊息開始，避免以孤立的工具輸出開頭：
+            # 視窗內有 user 時從最早的一筆開始，沒有時往回延伸到最近的 user（即使超過 limit / 預算）
+            inside = [i for i in range(cut) if item(i).get("role") == "user"]
+            if inside:
+                cut = inside[-1] + 1
+            else:
+                cut = next((i + 1 for i in range(cut, len(rows)) if item(i).get("role") == "user"), len(rows))
+        window = [item(i) for i in range(cut)][::-1]
+        if self.history_budget is not None:
+            window = self._fit_budget(window, sum(tokens for tokens, _ in rows[:cut]))
+        return window
+
+    def _fit_budget(self, items: list, used: int) -> list:
+        """延伸到 user 訊息後仍超過 history_budget 時（單筆工具輸出就超過預算），只在這次讀取時壓縮最大的工具輸出。"""
+        outputs = sorted(
+            (i for i, item in enumerate(items) if item.get("type") == "function_call_output"),
+            key=lambda i: -estimate_tokens(_dumps(items[i])),
+        )
+        for i in outputs:
+            if used <= self.history_budget:
+                break
+            item = dict(items[i])
+            before = estimate_tokens(_dumps(item))
+            output = item.get("output")
+            text = output if isinstance(output, str) else _dumps(output)
+            item["output"] = summarize_text(text, self.summary_budget, "工具輸出超過對話記憶預算，已壓縮")
+            used -= before - estimate_tokens(_dumps(item))
+            items[i] = item
+        return items
+
+    def _add_items(self, items: list):
+        rows = []
+        for item in items:
+            data = _dumps(item)
+            tokens = estimate_tokens(data)
+            rows.append((self.session_id, item.get("type") or item.get("role"), tokens, tokens, data))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO session_items (session_id, kind, tokens, original_tokens, data) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._compact()
+
+    def _compact(self):
+        """由新到舊累計工具輸出 token，超過預算（且不在最新幾筆內）的改寫成摘要。"""
+        rows = self._conn.execute(
+            "SELECT id, tokens, data FROM session_items "
+            "WHERE session_id = ? AND kind = 'function_call_output' AND compacted = 0 ORDER BY id DESC",
+            (self.session_id,),
+        ).fetchall()
+        used = 0
+        updates = []
+        for index, (item_id, tokens, data) in enumerate(rows):
+            used += tokens
+            if index < self.keep_recent_tool_outputs or used <= self.tool_output_budget:
+                continue
+            item = json.loads(data)
+            output = item.get("output")
+            text = output if isinstance(output, str) else _dumps(output)
+            if self.strategy == "summary":
+                item["output"] = summarize_text(text, self.summary_budget, "較早的工具輸出已壓縮")
+            else:
+                item["output"] = f"[較早的工具輸出已省略，約 {estimate_tokens(text)} tokens]"
+            compact = _dumps(item)
+            updates.append((estimate_tokens(compact), compact, item_id))
+        if updates:
+            self._conn.executemany(
+                "UPDATE session_items SET tokens = ?, data = ?, compacted = 1 WHERE id = ?", updates
+            )
+
+    def _pop_item(self):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT id, data FROM session_items WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (self.session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM session_items WHERE id = ?", (row[0],))
+        return json.loads(row[1])
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            items, tokens, original, compacted = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tokens), 0), COALESCE(SUM(original_tokens), 0), "
+                "COALESCE(SUM(compacted), 0) FROM session_items WHERE session_id = ?",
+                (self.session_id,),
+            ).fetchone()
+        return {"items": items, "tokens": tokens, "tokens_saved": original - tokens, "compacted": compacted}
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (
+            f"[session] {self.session_id}: {s['items']} items, ~{s['tokens']} tokens stored, "
+            f"{s['compacted']} tool outputs compacted ({s['tokens_saved']} tokens saved)"
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+def session_from_env() -> CompactSQLiteSession | None:
+    session_id = os.getenv("CONVERSATION_SESSION_ID")
+    return CompactSQLiteSession(session_id) if session_id else None
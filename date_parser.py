@@ -0,0 +1,297 @@
+"""
+日期 / 日期範圍解析與資料範圍檢查，在查詢 MySQL 之前先擋下注定沒有資料的請求。
+
+支援的寫法：
+  - 20250725、2025-07-25、2025/7/30、2025.7.30、2025年7月30日、7/30（今年）
+  - 今天、昨天、前天、大前天
+  - 最近 7 天、過去3天、近 N 天、本週、上週、本月、上個月
+  - 範圍：兩個日期之間用 ~、到、至、- 等連接，例如 2025/7/25~7/30、7/25-7/30、20250725-20250730
+    省略年份的結束日期早於開始日期時視為跨年（2025/12/31~1/2 → 2025-12-31 ~ 2026-01-02）
+    結束日期只寫日時沿用開始日期的年月：2025/7/25~30、2025-7-25~30、7/25~30、2025年7月25日到30日
+    （早於開始日時視為下個月，7/30~2 → 07-30 ~ 08-02）；~ 之後無法解析時拋出 ValueError
+
+資料表的時間範圍（MIN/MAX）快取在記憶體與 TABLE_EXTENTS_CACHE 檔案中，
+check_db_preview.py 與 table_profile.py 執行時也會更新這個檔案；要求的日期超出快取範圍時會先重新查詢一次再判斷
+（每 TABLE_EXTENTS_REFRESH_S 秒最多一次，避免使用者反覆詢問未來日期時每次都查 MIN/MAX）。
+
+使用方式：
+    @with_valid_date
+    def get_vibration_max_on_date(date_str: str): ...   # date_str 會被正規化成 YYYY-MM-DD
+
+環境變數：
+  - TABLE_EXTENTS_CACHE  快取檔案（預設 .table_extents.json）
+  - TABLE_EXTENTS_TTL    快取有效秒數（預設 300）
+  - TABLE_EXTENTS_REFRESH_S  日期超出快取範圍時，重新查詢的最短間隔秒數（預設 60）
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+TABLE_EXTENTS_CACHE = os.getenv("TABLE_EXTENTS_CACHE", ".table_extents.json")
+TABLE_EXTENTS_TTL = float(os.getenv("TABLE_EXTENTS_TTL", "300"))
+TABLE_EXTENTS_REFRESH_S = float(os.getenv("TABLE_EXTENTS_REFRESH_S", "60"))
+
+_DATE_RE = re.compile(
+    r"(?P<compact>(?<!\d)(?P<cy>\d{4})(?P<cm>\d{2})(?P<cd>\d{2})(?!\d))"
+    r"|(?P<full>(?<!\d)(?P<fy>\d{4})\s*[-/.年]\s*(?P<fm>\d{1,2})\s*[-/.月]\s*(?P<fd>\d{1,2})(?!\d)\s*[日號]?)"
+    r"|(?P<short>(?<![\d/.])(?P<sm>\d{1,2})\s*[/月]\s*(?P<sd>\d{1,2})(?![\d/])\s*[日號]?)"
+    r"|(?P<word>大前天|前天|昨天|昨日|今天|今日)"
+)
+# 範圍結束只寫日（7/25~30 的「~30」），緊接在日期之後比對
+_BARE_END_DAY_RE = re.compile(r"\s*(?:~|～|-|到|至)\s*(?P<day>\d{1,2})(?![\d/.月])\s*[日號]?")
+_OPEN_RANGE_RE = re.compile(r"\s*[~～]\s*(?P<rest>\S.*)?$")
+_RELATIVE_DAYS = {"今天": 0, "今日": 0, "昨天": 1, "昨日": 1, "前天": 2, "大前天": 3}
+_LAST_N_DAYS_RE = re.compile(r"(?:最近|過去|近)\s*(\d+)\s*(?:天|日)")
+
+# 回放錄製的執行時固定「今天」，讓「昨天」等相對日期得到相同的查詢（見 cassette.py）
+FIXED_TODAY: date | None = None
+
+
+def current_date() -> date:
+    return FIXED_TODAY or date.today()
+
+
+@dataclass(frozen=True)
+class DateRange:
+    start: date
+    end: date
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def __str__(self) -> str:
+        if self.start == self.end:
+            return self.start.isoformat()
+        return f"{self.start.isoformat()} ~ {self.end.isoformat()}"
+
+
+def _to_date(match: re.Match, today: date, year: int | None = None) -> date:
+    if match.group("compact"):
+        parts = (match.group("cy"), match.group("cm"), match.group("cd"))
+    elif match.group("full"):
+        parts = (match.group("fy"), match.group("fm"), match.group("fd"))
+    elif match.group("short"):
+        parts = (year or today.year, match.group("sm"), match.group("sd"))
+    else:
+        return today - timedelta(days=_RELATIVE_DAYS[match.group("word")])
+    try:
+        return date(*(int(p) for p in parts))
+    except ValueError:
+        raise ValueError(f"日期不存在：{match.group(0).strip()}") from None
+
+
+def _same_month_day(start: date, day: int, text: str) -> date:
+    """7/25~30 的結束日：沿用開始日期的年月，早於開始日時視為下個月。"""
+    year, month = start.year, start.month
+    if day < start.day:
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    try:
+        return date(year, month, day)
+    except ValueError:
+        raise ValueError(f"日期不存在：{text}") from None
+
+
+def parse_date_range(text: str, today: date | None = None) -> DateRange:
+    """把使用者的日期寫法轉成 DateRange；無法解析時拋出 ValueError（訊息可直接回給模型）。"""
+    today = today or current_date()
+    text = (text or "").strip()
+
+    found: list[date] = []
+    for m in _DATE_RE.finditer(text):
+        # 範圍中省略年份的日期（2025/7/25~7/30）沿用前一個日期的年份，早於前一個日期時視為跨年
+        value = _to_date(m, today, found[-1].year if found else None)
+        if m.group("short") and found and value < found[-1]:
+            value = _to_date(m, today, found[-1].year + 1)
+        found.append(value)
+        bare = _BARE_END_DAY_RE.match(text, m.end())
+        if bare:
+            found.append(_same_month_day(value, int(bare.group("day")), text[m.start():bare.end()].strip()))
+    if len(found) == 1:
+        dangling = _OPEN_RANGE_RE.match(text, m.end())
+        if dangling:
+            raise ValueError(f"無法解析範圍的結束日期：{(dangling.group('rest') or '').strip()!r}（例如 2025/7/25~7/30、7/25~30）")
+    if found:
+        start, end = found[0], found[-1] if len(found) > 1 else found[0]
+        return DateRange(min(start, end), max(start, end))
+
+    last_n = _LAST_N_DAYS_RE.search(text)
+    if last_n:
+        n = max(int(last_n.group(1)), 1)
+        return DateRange(today - timedelta(days=n - 1), today)
+    if any(word in text for word in ("本週", "這週", "本周", "這周", "這星期")):
+        return DateRange(today - timedelta(days=today.weekday()), today)
+    if any(word in text for word in ("上週", "上周", "上星期")):
+        monday = today - timedelta(days=today.weekday() + 7)
+        return DateRange(monday, monday + timedelta(days=6))
+    if any(word in text for word in ("本月", "這個月", "這月")):
+        return DateRange(today.replace(day=1), today)
+    if any(word in text for word in ("上個月", "上月")):
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return DateRange(last_day.replace(day=1), last_day)
+    raise ValueError(f"無法解析日期：{text!r}（可用 2025-07-25、20250725、2025/7/30、昨天 等寫法）")
+
+
+# ----------------------------------------------------------------------
+# 資料表時間範圍
+# ----------------------------------------------------------------------
+@dataclass
+class TableExtents:
+    min_time: datetime
+    max_time: datetime
+    checked_at: float
+
+    def as_range(self) -> DateRange:
+        return DateRange(self.min_time.date(), self.max_time.date())
+
+
+_extents: TableExtents | None = None
+_last_refresh = 0.0
+
+
+def save_table_extents(min_time, max_time, path: str = TABLE_EXTENTS_CACHE) -> TableExtents:
+    """寫入快取（check_db_preview.py 與 vibration_db 查到 MIN/MAX 後呼叫）。"""
+    global _extents
+    _extents = TableExtents(_as_datetime(min_time), _as_datetime(max_time), time.time())
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "min_time": _extents.min_time.isoformat(),
+                    "max_time": _extents.max_time.isoformat(),
+                    "checked_at": _extents.checked_at,
+                },
+                f,
+            )
+    except OSError:
+        pass
+    return _extents
+
+
+def _as_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
+
+
+def _load_cached(path: str) -> TableExtents | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return TableExtents(
+            datetime.fromisoformat(data["min_time"]), datetime.fromisoformat(data["max_time"]), data["checked_at"]
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _query_extents() -> TableExtents | None:
+    import vibration_db
+
+    conn = cursor = None
+    try:
+        conn = vibration_db.connect()
+        cursor = conn.cursor()
+        _, _, time_columns = vibration_db.detect_columns(cursor)
+        if not time_columns:
+            return None
+        cursor.execute(f"SELECT MIN(`{time_columns[0]}`), MAX(`{time_columns[0]}`) FROM `{vibration_db.MYSQL_TABLE}`")
+        min_time, max_time = cursor.fetchone()
+        if min_time is None:
+            return None
+        return save_table_extents(min_time, max_time)
+    except Exception as e:
+        print(f"[debug] could not read table extents: {e}")
+        return None
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+def get_table_extents(max_age_s: float = TABLE_EXTENTS_TTL, refresh: bool = False) -> TableExtents | None:
+    """記憶體 → 快取檔案 → MySQL；無法取得時回傳 None（此時只做格式檢查）。"""
+    global _extents
+    if not refresh:
+        for candidate in (_extents, _load_cached(TABLE_EXTENTS_CACHE)):
+            if candidate is not None and time.time() - candidate.checked_at <= max_age_s:
+                _extents = candidate
+                return candidate
+    return _query_extents()
+
+
+def _refresh_extents() -> TableExtents | None:
+    """強制重新查詢 MIN/MAX，但每 TABLE_EXTENTS_REFRESH_S 秒最多一次；間隔內回傳 None（沿用快取）。"""
+    global _last_refresh
+    now = time.time()
+    if now - _last_refresh < TABLE_EXTENTS_REFRESH_S:
+        return None
+    _last_refresh = now
+    return get_table_extents(refresh=True)
+
+
+# ----------------------------------------------------------------------
+# 檢查
+# ----------------------------------------------------------------------
+def validate_date_range(text: str, today: date | None = None) -> tuple[DateRange | None, str | None]:
+    """
+    回傳 (修正後的範圍, 訊息)。
+    完全超出資料範圍時範圍為 None、訊息說明可查詢的範圍；部分重疊時裁切並在訊息中說明。
+    """
+    try:
+        requested = parse_date_range(text, today)
+    except ValueError as e:
+        return None, str(e)
+    extents = get_table_extents()
+    if extents is not None and requested.end > extents.max_time.date():
+        # 可能是快取之後才寫入的新資料，重新查詢一次再判斷（限制頻率）
+        extents = _refresh_extents() or extents
+    if extents is None:
+        return requested, None
+
+    available = extents.as_range()
+    start, end = max(requested.start, available.start), min(requested.end, available.end)
+    if start > end:
+        return None, f"{requested} 沒有資料：資料表時間範圍為 {available}。"
+    corrected = DateRange(start, end)
+    if corrected != requested:
+        return corrected, f"要求的 {requested} 超出資料範圍 {available}，已改為 {corrected}。"
+    return corrected, None
+
+
+def resolve_date_str(text: str, today: date | None = None) -> tuple[str | None, str | None]:
+    """單日查詢用：回傳 (YYYY-MM-DD, None) 或 (None, 錯誤訊息)。"""
+    requested, message = validate_date_range(text, today)
+    if requested is None:
+        return None, message
+    if requested.days > 1:
+        return None, f"這個工具一次只查詢一天，請從 {requested} 中指定單一日期。" + (f"（{message}）" if message else "")
+    return requested.start.isoformat(), None
+
+
+def with_valid_date(func):
+    """裝飾查詢函式：第一個參數 date_str 先正規化並檢查資料範圍，不合格時直接回傳說明文字。"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        date_str, error = resolve_date_str(str(bound.arguments["date_str"]))
+        if error:
+            print(f"[debug] rejected date {bound.arguments['date_str']!r}: {error}")
+            return error
+        bound.arguments["date_str"] = date_str
+        return func(*bound.args, **bound.kwargs)
+
+    return wrapper
@@ -0,0 +1,134 @@
+"""
+資料庫結果的串流處理工具：以固定大小的批次讀取 unbuffered cursor，
+單次走訪（one-pass）計算統計量，並以有上限的方式逐行格式化輸出。
+
+不論當天有多少筆資料，記憶體用量只與 batch_size 和輸出上限有關。
+"""
+
+from __future__ import annotations
+
+import io
+import math
+import os
+
+DEFAULT_BATCH_SIZE = int(os.getenv("DB_STREAM_BATCH_SIZE", "5000"))
+DEFAULT_MAX_LINES = int(os.getenv("DB_STREAM_MAX_LINES", "2000"))
+
+
+class RunningStats:
+    """Welford 線上演算法：一次走訪得到 count / mean / variance / min / max。"""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """合併另一組統計量（Chan et al. 平行公式）。"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    def as_dict(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class BoundedTextWriter:
+    """逐行寫入，超過 max_lines 或 max_chars 之後只計數不再保留內容。"""
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES, max_chars: int | None = None):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self.lines = 0
+        self.omitted = 0
+        self._chars = 0
+        self._buf = io.StringIO()
+
+    @property
+    def full(self) -> bool:
+        return self.lines >= self.max_lines or (
+            self.max_chars is not None and self._chars >= self.max_chars
+        )
+
+    def write_line(self, line: str) -> bool:
+        if self.full:
+            self.omitted += 1
+            return False
+        if self.lines:
+            self._buf.write("\n")
+        self._buf.write(line)
+        self._chars += len(line) + 1
+        self.lines += 1
+        return True
+
+    def skip(self):
+        """已滿時呼叫，只記錄省略筆數而不必先格式化該行。"""
+        self.omitted += 1
+
+    def getvalue(self) -> str:
+        return self._buf.getvalue()
+
+
+def iter_batches(cursor, batch_size: int = DEFAULT_BATCH_SIZE):
+    """以 fetchmany 分批取出尚未讀取的列。"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_rows(cursor, batch_size: int = DEFAULT_BATCH_SIZE):
+    for batch in iter_batches(cursor, batch_size):
+        yield from batch
+
+
+def as_float(value) -> float | None:
+    """將 int / float / Decimal 轉成 float，其餘（None、字串）回傳 None。"""
+    if value is None or isinstance(value, (str, bytes, bool)):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
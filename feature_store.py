@@ -0,0 +1,354 @@
+"""
+振動特徵庫：寫入資料時（或事後 backfill）依設備、每個固定長度的時間窗預先計算狀態監測特徵，
+存進精簡的特徵表，健康狀態的問題直接查這張表，不必每次重新讀取原始振動資料。
+
+每個時間窗（FEATURE_WINDOW_S 秒，預設 60）的特徵：
+  - n、sample_hz（時間窗內的平均取樣頻率）、mean
+  - rms：均方根，整體振動能量
+  - peak：最大絕對值；crest：peak / rms（波峰因數，尖峰 / 衝擊的指標）
+  - kurtosis：峭度（常態分布為 3，軸承或齒輪損傷造成的衝擊會使它明顯變大）
+  - band_1 ~ band_N：FFT 頻帶能量比例（0 到 Nyquist 平均分成 FEATURE_BANDS 段，總和為 1）
+
+寫入方式：以「天」為單位重新計算（先刪除當天的特徵再寫入），重複執行結果相同；
+upload_data.upload_dataframe 上傳後會自動重算受影響的日期（FEATURE_ON_UPLOAD=0 可關閉）。
+
+使用方式：
+    python feature_store.py backfill 2025/7/18~7/25      # 重算這段期間的特徵
+    print(get_vibration_health("最近7天"))               # agent 工具
+
+環境變數：
+  - FEATURE_TABLE            特徵表名稱（預設 vibration_features）
+  - FEATURE_WINDOW_S         時間窗秒數，需整除一天（預設 60）
+  - FEATURE_BANDS            頻帶數（預設 4；建表後變更需要改用新的 FEATURE_TABLE）
+  - FEATURE_ON_UPLOAD        上傳後自動重算（預設 1）
+  - FEATURE_BACKFILL_TIMEOUT 每天重算的查詢期限秒數（預設 300）
+  - FEATURE_KURTOSIS_ALERT   峭度警示門檻（預設 4）
+  - FEATURE_CREST_ALERT      波峰因數警示門檻（預設 6）
+  - FEATURE_RMS_TREND_ALERT  RMS 首日到末日上升比例的警示門檻（預設 0.25）
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from query_guard import QUERY_GUARD
+
+FEATURE_TABLE = os.getenv("FEATURE_TABLE", "vibration_features")
+FEATURE_WINDOW_S = int(os.getenv("FEATURE_WINDOW_S", "60"))
+FEATURE_BANDS = int(os.getenv("FEATURE_BANDS", "4"))
+FEATURE_ON_UPLOAD = os.getenv("FEATURE_ON_UPLOAD", "1") == "1"
+FEATURE_BACKFILL_TIMEOUT = float(os.getenv("FEATURE_BACKFILL_TIMEOUT", "300"))
+KURTOSIS_ALERT = float(os.getenv("FEATURE_KURTOSIS_ALERT", "4"))
+CREST_ALERT = float(os.getenv("FEATURE_CREST_ALERT", "6"))
+RMS_TREND_ALERT = float(os.getenv("FEATURE_RMS_TREND_ALERT", "0.25"))
+_EPOCH = datetime(1970, 1, 1)
+MIN_SAMPLES = 8  # 少於這個筆數的時間窗不計算峭度與頻帶能量
+
+FEATURE_COLUMNS = ("n", "sample_hz", "mean", "rms", "peak", "crest", "kurtosis") + tuple(
+    f"band_{i + 1}" for i in range(FEATURE_BANDS)
+)
+
+
+# ----------------------------------------------------------------------
+# 計算
+# ----------------------------------------------------------------------
+def compute_features(times, values, groups=None, window_s: int = FEATURE_WINDOW_S, bands: int = FEATURE_BANDS) -> list[tuple]:
+    """
+    回傳 (equipment, window_start, *FEATURE_COLUMNS) 的列表，依設備、時間窗排序。
+    統計量以 reduceat 一次算完；頻帶能量需要每個時間窗各做一次 rfft。
+    """
+    import numpy as np
+
+    values = np.asarray(values, dtype=float)
+    micros = np.asarray(times, dtype="datetime64[us]").astype(np.int64)
+    groups = np.full(len(values), "", dtype=object) if groups is None else np.asarray(groups)
+    valid = np.isfinite(values)
+    values, micros, groups = values[valid], micros[valid], groups[valid]
+    if not len(values):
+        return []
+
+    labels, codes = np.unique(groups, return_inverse=True)
+    windows = micros // (window_s * 10**6)
+    order = np.lexsort((micros, windows, codes))
+    values, micros, windows, codes = values[order], micros[order], windows[order], codes[order]
+    starts = np.flatnonzero(np.r_[True, (np.diff(codes) != 0) | (np.diff(windows) != 0)])
+    ends = np.r_[starts[1:], len(values)]
+    n = ends - starts
+
+    mean = np.add.reduceat(values, starts) / n
+    centered = values - np.repeat(mean, n)
+    m2 = np.add.reduceat(centered**2, starts) / n
+    m4 = np.add.reduceat(centered**4, starts) / n
+    rms = np.sqrt(np.add.reduceat(values**2, starts) / n)
+    peak = np.maximum.reduceat(np.abs(values), starts)
+    duration = (micros[ends - 1] - micros[starts]) / 1e6
+    with np.errstate(divide="ignore", invalid="ignore"):
+        crest = np.where(rms > 0, peak / rms, np.nan)
+        kurtosis = np.where((m2 > 0) & (n >= MIN_SAMPLES), m4 / m2**2, np.nan)
+        sample_hz = np.where(duration > 0, (n - 1) / duration, np.nan)
+
+    band_energy = np.full((len(starts), bands), np.nan)
+    for i in np.flatnonzero(n >= MIN_SAMPLES):
+        spectrum = np.abs(np.fft.rfft(centered[starts[i]:ends[i]])[1:]) ** 2
+        total = spectrum.sum()
+        if total > 0 and len(spectrum) >= bands:
+            band_energy[i] = [part.sum() / total for part in np.array_split(spectrum, bands)]
+
+    rows = []
+    for i in range(len(starts)):
+        window_start = _EPOCH + timedelta(seconds=int(windows[starts[i]]) * window_s)
+        features = (int(n[i]), sample_hz[i], mean[i], rms[i], peak[i], crest[i], kurtosis[i], *band_energy[i])
+        rows.append((str(labels[codes[starts[i]]]), window_start) + tuple(_sql_value(v) for v in features))
+    return rows
+
+
+def _sql_value(value):
+    if isinstance(value, int):
+        return value
+    value = float(value)
+    return value if value == value else None  # NaN → NULL
+
+
+# ----------------------------------------------------------------------
+# 特徵表
+# ----------------------------------------------------------------------
+def ensure_feature_table(cursor):
+    bands = ", ".join(f"`band_{i + 1}` DOUBLE NULL" for i in range(FEATURE_BANDS))
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS `{FEATURE_TABLE}` ("
+        "`equipment` VARCHAR(64) NOT NULL, "
+        "`window_s` INT NOT NULL, "
+        "`window_start` DATETIME NOT NULL, "
+        "`n` INT NOT NULL, "
+        "`sample_hz` DOUBLE NULL, "
+        "`mean` DOUBLE NULL, "
+        "`rms` DOUBLE NULL, "
+        "`peak` DOUBLE NULL, "
+        "`crest` DOUBLE NULL, "
+        "`kurtosis` DOUBLE NULL, "
+        f"{bands}, "
+        "`computed_at` TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "PRIMARY KEY (`equipment`, `window_s`, `window_start`), "
+        "KEY `idx_window` (`window_s`, `window_start`)"
+        ")"
+    )
+
+
+def _write_day(conn, day: date, window_s: int, rows: list[tuple], chunk: int = 1000):
+    """同一個交易內刪除當天的特徵並寫入新的結果。"""
+    cursor = conn.cursor()
+    try:
+        ensure_feature_table(cursor)
+        cursor.execute(
+            f"DELETE FROM `{FEATURE_TABLE}` WHERE `window_s` = %s AND `window_start` >= %s AND `window_start` < %s",
+            (window_s, day.isoformat(), (day + timedelta(days=1)).isoformat()),
+        )
+        columns = ("equipment", "window_s", "window_start") + FEATURE_COLUMNS
+        sql = (
+            f"INSERT INTO `{FEATURE_TABLE}` ({', '.join(f'`{c}`' for c in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        for i in range(0, len(rows), chunk):
+            cursor.executemany(sql, [(row[0], window_s) + row[1:] for row in rows[i:i + chunk]])
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def backfill(start: date, end: date, window_s: int = FEATURE_WINDOW_S, batch_size: int | None = None) -> str:
+    """逐日重算 [start, end] 的特徵（每天一條連線、一個期限），回傳每天的筆數摘要。"""
+    import vibration_db
+    from db_stream import DEFAULT_BATCH_SIZE
+
+    if 86400 % window_s:
+        raise ValueError(f"FEATURE_WINDOW_S={window_s} 需要整除一天（86400 秒）")
+    lines = []
+    day = start
+    while day <= end:
+        started = time.perf_counter()
+        with QUERY_GUARD.scoped(f"feature backfill {day}", FEATURE_BACKFILL_TIMEOUT):
+            conn = None
+            try:
+                conn = vibration_db.connect()
+                fetched = vibration_db._fetch_arrays(conn, day.isoformat(), batch_size or DEFAULT_BATCH_SIZE)
+                if isinstance(fetched, str) and not fetched.endswith("沒有資料。"):
+                    raise RuntimeError(fetched)
+                rows = [] if isinstance(fetched, str) else compute_features(
+                    fetched[3], fetched[4], fetched[5], window_s
+                )
+                _write_day(conn, day, window_s, rows)
+                lines.append(f"{day}: {len(rows)} 個時間窗（{time.perf_counter() - started:.2f}s）")
+            except Exception as e:
+                lines.append(f"{day}: {QUERY_GUARD.describe(e) or f'{type(e).__name__}: {e}'}")
+            finally:
+                if conn is not None:
+                    conn.close()
+        day += timedelta(days=1)
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# agent 工具
+# ----------------------------------------------------------------------
+@QUERY_GUARD.limit()
+def get_vibration_health(
+    date_range: str,
+    equipment_ids: list[str] | None = None,
+    equipment_top: int = 10,
+    window_s: int = FEATURE_WINDOW_S,
+) -> str:
+    """
+    從特徵表彙總各設備的健康指標（RMS、峰值、波峰因數、峭度、頻帶能量、RMS 趨勢），
+    不讀原始振動資料；依警示數量與峭度排序，回傳前 equipment_top 台。
+    """
+    import vibration_db
+    from date_parser import validate_date_range
+
+    requested, message = validate_date_range(date_range)
+    if requested is None:
+        return message
+    start, end = requested.start.isoformat(), (requested.end + timedelta(days=1)).isoformat()
+    where = "`window_s` = %s AND `window_start` >= %s AND `window_start` < %s"
+    params: tuple = (window_s, start, end)
+    if equipment_ids:
+        where += f" AND `equipment` IN ({', '.join(['%s'] * len(equipment_ids))})"
+        params += tuple(equipment_ids)
+    bands = ", ".join(f"AVG(`band_{i + 1}`)" for i in range(FEATURE_BANDS))
+    conn = cursor = None
+    try:
+        conn = vibration_db.connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT `equipment`, COUNT(*), SUM(`n`), AVG(`rms`), MAX(`rms`), MAX(`peak`), MAX(`crest`), "
+            f"AVG(`kurtosis`), MAX(`kurtosis`), MAX(`window_start`), {bands} "
+            f"FROM `{FEATURE_TABLE}` WHERE {where} GROUP BY `equipment`",
+            params,
+        )
+        summary = cursor.fetchall()
+        if not summary:
+            return f"{requested} 沒有特徵資料，請先執行 python feature_store.py backfill {requested}"
+        cursor.execute(
+            f"SELECT `equipment`, DATE(`window_start`) AS d, AVG(`rms`) FROM `{FEATURE_TABLE}` "
+            f"WHERE {where} GROUP BY `equipment`, d ORDER BY `equipment`, d",
+            params,
+        )
+        daily: dict[str, list[float]] = {}
+        for equipment, _, rms in cursor.fetchall():
+            if rms is not None:
+                daily.setdefault(equipment, []).append(float(rms))
+    except Exception as e:
+        return QUERY_GUARD.describe(e) or f"Error reading vibration features: {e}"
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+    report = health_report(str(requested), window_s, summary, daily, equipment_top)
+    return report if message is None else f"{message}\n{report}"
+
+
+@dataclass
+class EquipmentHealth:
+    equipment: str
+    windows: int
+    avg_rms: float
+    max_rms: float
+    max_peak: float
+    max_crest: float | None
+    avg_kurtosis: float | None
+    max_kurtosis: float | None
+    latest: datetime | None
+    bands: list[float]
+    rms_change: float | None = None  # 首日到末日的 RMS 變化比例
+    flags: list[str] = field(default_factory=list)
+
+    @property
+    def dominant_band(self) -> int | None:
+        return max(range(len(self.bands)), key=self.bands.__getitem__) if any(self.bands) else None
+
+
+def _float(value) -> float | None:
+    return None if value is None else float(value)
+
+
+def _fmt(value: float | None) -> str:
+    """時間窗筆數不足時峭度為 NULL。"""
+    return "-" if value is None else f"{value:.2f}"
+
+
+def assess(row: tuple, daily_rms: list[float]) -> EquipmentHealth:
+    """特徵表的彙總列 → 健康指標與警示。"""
+    equipment, windows, _, avg_rms, max_rms, max_peak, max_crest, avg_kurt, max_kurt, latest, *bands = row
+    health = EquipmentHealth(
+        equipment=str(equipment),
+        windows=int(windows),
+        avg_rms=float(avg_rms or 0),
+        max_rms=float(max_rms or 0),
+        max_peak=float(max_peak or 0),
+        max_crest=_float(max_crest),
+        avg_kurtosis=_float(avg_kurt),
+        max_kurtosis=_float(max_kurt),
+        latest=latest,
+        bands=[float(b or 0) for b in bands],
+    )
+    if len(daily_rms) >= 2 and daily_rms[0] > 0:
+        health.rms_change = (daily_rms[-1] - daily_rms[0]) / daily_rms[0]
+    if health.avg_kurtosis is not None and health.avg_kurtosis > KURTOSIS_ALERT:
+        health.flags.append(f"峭度偏高 {health.avg_kurtosis:.2f}（衝擊性振動，可能為軸承 / 齒輪損傷）")
+    if health.max_crest is not None and health.max_crest > CREST_ALERT:
+        health.flags.append(f"波峰因數 {health.max_crest:.2f}（出現尖峰）")
+    if health.rms_change is not None and health.rms_change > RMS_TREND_ALERT:
+        health.flags.append(f"RMS 上升 {health.rms_change:.0%}")
+    return health
+
+
+def health_report(label: str, window_s: int, summary: list[tuple], daily: dict[str, list[float]], equipment_top: int = 10) -> str:
+    """get_vibration_health 的報告格式：有警示的設備在前，其次依峭度排序。"""
+    entries = [assess(row, daily.get(row[0], [])) for row in summary]
+    entries.sort(key=lambda h: (-len(h.flags), -(h.avg_kurtosis or 0), h.equipment))
+    lines = [
+        f"[{label} 設備健康狀態] 特徵表 {FEATURE_TABLE}，{len(entries)} 台設備、"
+        f"{sum(h.windows for h in entries)} 個 {window_s} 秒時間窗",
+        f"警示門檻：峭度 > {KURTOSIS_ALERT:g}、波峰因數 > {CREST_ALERT:g}、RMS 上升 > {RMS_TREND_ALERT:.0%}",
+    ]
+    for h in entries[:equipment_top]:
+        band = h.dominant_band
+        band_text = f"，主要能量在第 {band + 1}/{len(h.bands)} 頻帶（{h.bands[band]:.0%}）" if band is not None else ""
+        trend_text = f"，RMS 變化 {h.rms_change:+.0%}" if h.rms_change is not None else ""
+        lines.append(
+            f"- {h.equipment or '(全部)'}: RMS 平均={h.avg_rms:.4g} 最大={h.max_rms:.4g}, 峰值={h.max_peak:.4g}, "
+            f"峭度 平均={_fmt(h.avg_kurtosis)} 最大={_fmt(h.max_kurtosis)}{band_text}{trend_text}，"
+            f"最新時間窗 {h.latest}"
+        )
+        lines.extend(f"    ⚠ {flag}" for flag in h.flags)
+    if len(entries) > equipment_top:
+        lines.append(f"...（另有 {len(entries) - equipment_top} 台設備未列出）")
+    flagged = [h.equipment for h in entries if h.flags]
+    lines.append(
+        f"重點：{', '.join(flagged[:5])} 有警示，建議優先檢查。" if flagged else "重點：所有設備的特徵都在正常範圍內。"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="振動特徵庫")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="重算一段期間的特徵")
+    fill.add_argument("date_range", help="例如 2025/7/18~7/25、最近7天")
+    fill.add_argument("--window", type=int, default=FEATURE_WINDOW_S, help="時間窗秒數")
+    show = sub.add_parser("show", help="顯示設備健康狀態")
+    show.add_argument("date_range")
+    args = parser.parse_args()
+
+    from date_parser import parse_date_range
+
+    if args.command == "backfill":
+        requested = parse_date_range(args.date_range)
+        print(backfill(requested.start, requested.end, args.window))
+    else:
+        print(get_vibration_health(args.date_range))
@@ -0,0 +1,147 @@
+"""
+Handoff 輸入過濾：triage 交給子 agent 時，只傳遞相關的使用者意圖與必要的上下文。
+
+預設情況下子 agent 會收到完整的對話（包含 triage 的推理、handoff 呼叫與其他工具輸出），
+每一輪子 agent 的 prompt 都要重新處理這些 token。TrimmingFilter 會：
+  - 只保留最近 keep_user_turns 個使用者訊息開始的歷史
+  - 可選擇是否保留之前的 assistant 回答（keep_assistant_text）
+  - 之前的工具輸出改成摘要（summary）或移除（drop，連同對應的 function_call）
+  - 移除 reasoning、handoff 呼叫與輸出
+完整的 new_items 仍保留給 session 記錄，只有送給下一個 agent 的輸入（input_items）被精簡。
+
+使用方式：
+    handoff(Vib_agent, input_filter=HANDOFF_TRIMMER.filter("Vib_agent", keep_user_turns=3))
+    print(HANDOFF_TRIMMER.format_report())   # 每個 handoff 節省的 prompt token
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any
+
+from agents import HandoffInputData
+from agents.items import MessageOutputItem, RunItem
+
+from output_governor import estimate_tokens, summarize_text
+
+TOOL_OUTPUT_MODES = ("summary", "drop")
+_TOOL_CALL_TYPES = ("function_call", "mcp_call", "custom_tool_call")
+_TOOL_OUTPUT_TYPES = ("function_call_output", "custom_tool_call_output")
+
+
+def _tokens(items) -> int:
+    if isinstance(items, str):
+        return estimate_tokens(items)
+    return sum(estimate_tokens(json.dumps(item, ensure_ascii=False, default=str)) for item in items)
+
+
+def _as_input(items: tuple[RunItem, ...]) -> list[dict[str, Any]]:
+    return [item.to_input_item() for item in items]
+
+
+@dataclass
+class HandoffUsage:
+    handoffs: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+@dataclass
+class TrimmingFilter:
+    trimmer: "HandoffTrimmer"
+    target: str
+    keep_user_turns: int = 1
+    keep_assistant_text: bool = False
+    tool_outputs: str = "drop"
+    summary_budget: int = 150
+
+    def __post_init__(self):
+        if self.tool_outputs not in TOOL_OUTPUT_MODES:
+            raise ValueError(f"Unknown tool_outputs {self.tool_outputs!r}, expected one of {TOOL_OUTPUT_MODES}")
+
+    def __call__(self, data: HandoffInputData) -> HandoffInputData:
+        history = data.input_history
+        generated = data.input_items if data.input_items is not None else data.new_items
+        tokens_in = _tokens(history) + _tokens(_as_input(data.pre_handoff_items)) + _tokens(_as_input(generated))
+
+        if not isinstance(history, str):
+            history = tuple(self.trim_history(list(history)))
+        pre_items = self.trim_run_items(data.pre_handoff_items)
+        input_items = self.trim_run_items(generated)
+
+        tokens_out = _tokens(history) + _tokens(_as_input(pre_items)) + _tokens(_as_input(input_items))
+        self.trimmer.record(self.target, tokens_in, tokens_out)
+        return data.clone(input_history=history, pre_handoff_items=pre_items, input_items=input_items)
+
+    def trim_history(self, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """保留最近 keep_user_turns 個使用者訊息開始的項目，再依設定處理 assistant 文字與工具輸出。"""
+        user_indices = [i for i, item in enumerate(items) if item.get("role") == "user"]
+        if len(user_indices) > self.keep_user_turns:
+            items = items[user_indices[-self.keep_user_turns]:]
+
+        kept = []
+        for item in items:
+            kind = item.get("type")
+            role = item.get("role")
+            if kind == "reasoning":
+                continue
+            if role == "assistant" and not self.keep_assistant_text:
+                continue
+            if kind in _TOOL_CALL_TYPES or kind in _TOOL_OUTPUT_TYPES:
+                if self.tool_outputs == "drop":
+                    continue
+                if kind in _TOOL_OUTPUT_TYPES:
+                    output = item.get("output")
+                    text = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False, default=str)
+                    item = {**item, "output": summarize_text(text, self.summary_budget, "handoff 前的工具輸出")}
+            kept.append(item)
+        return kept
+
+    def trim_run_items(self, items: tuple[RunItem, ...]) -> tuple[RunItem, ...]:
+        """本次 run 中產生的項目只保留 assistant 文字（若設定保留）；工具、handoff、推理都不傳。"""
+        if not self.keep_assistant_text:
+            return ()
+        return tuple(item for item in items if isinstance(item, MessageOutputItem))
+
+
+class HandoffTrimmer:
+    def __init__(self):
+        self.usage: dict[str, HandoffUsage] = {}
+
+    def filter(
+        self,
+        target: str,
+        keep_user_turns: int = 1,
+        keep_assistant_text: bool = False,
+        tool_outputs: str = "drop",
+        summary_budget: int = 150,
+    ) -> TrimmingFilter:
+        return TrimmingFilter(self, target, keep_user_turns, keep_assistant_text, tool_outputs, summary_budget)
+
+    def record(self, target: str, tokens_in: int, tokens_out: int):
+        usage = self.usage.setdefault(target, HandoffUsage())
+        usage.handoffs += 1
+        usage.tokens_in += tokens_in
+        usage.tokens_out += tokens_out
+
+    def reset_run(self):
+        self.usage.clear()
+
+    def format_report(self) -> str:
+        if not self.usage:
+            return "[handoff] no handoffs"
+        lines = []
+        for target, u in self.usage.items():
+            lines.append(
+                f"[handoff] {target}: {u.handoffs} handoffs, prompt ~{u.tokens_in} -> {u.tokens_out} tokens "
+                f"(saved {u.tokens_saved})"
+            )
+        return "\n".join(lines)
+
+
+HANDOFF_TRIMMER = HandoffTrimmer()
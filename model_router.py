@@ -0,0 +1,342 @@
+"""
+依延遲路由的 ModelProvider：在多個 OpenAI 相容端點（不同 GPU 主機 / 模型）之間選擇。
+
+  - 路由：以各端點的 EWMA 延遲 ×（1 + 本程序送出中尚未完成的請求數）估計等待時間，選最小者；
+    一段時間沒有新樣本的端點估計值按半衰期遞減，讓暫時忙碌過的主機之後會被重新嘗試
+  - 容錯：逾時、連線錯誤、429 / 5xx / 404（模型不存在）時自動換下一個端點，失敗的端點冷卻一段時間
+  - 對沖（hedge）：串流請求在 hedge_after_s 內還沒收到第一個事件，就同時向第二個端點送出，
+    先回應者勝出，另一個取消；非串流請求要等整個回應完成，正常情況就會超過首個事件的門檻，
+    因此另用 response_hedge_after_s（預設不對沖），設定時應大於一般的完整回應時間
+
+使用方式：
+    router = RoutingModelProvider([
+        Endpoint("gpu-a", "http://host-a:11434/v1", "gpt-oss:20b"),
+        Endpoint("gpu-b", "http://host-b:11434/v1", "gpt-oss:20b"),
+    ], hedge_after_s=1.5)
+    agent = Agent(..., model=router.get_model("gpt-oss:20b"))
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+import openai
+from openai import AsyncOpenAI
+
+from agents import Model, ModelProvider, OpenAIChatCompletionsModel
+
+
+class EmptyStreamError(Exception):
+    pass
+
+
+# 換端點重試的錯誤；其他錯誤（例如 400 參數錯誤）換端點也不會成功，直接拋出
+FAILOVER_ERRORS = (
+    asyncio.TimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.NotFoundError,
+    EmptyStreamError,
+)
+
+
+@dataclass
+class Endpoint:
+    name: str
+    base_url: str
+    model: str
+    api_key: str = "ollama"
+    # 測試或特殊用途可直接提供 Model 建構函式，否則使用 OpenAIChatCompletionsModel
+    model_factory: Callable[[], Model] | None = None
+    latency_ewma: float | None = None
+    ttft_ewma: float | None = None
+    sampled_at: float = 0.0
+    in_flight: int = 0
+    failures: int = 0
+    cooldown_until: float = 0.0
+    _model: Model | None = field(default=None, repr=False)
+
+    def get_model(self) -> Model:
+        if self._model is None:
+            if self.model_factory is not None:
+                self._model = self.model_factory()
+            else:
+                client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key)
+                self._model = OpenAIChatCompletionsModel(model=self.model, openai_client=client)
+        return self._model
+
+
+class RoutingModelProvider(ModelProvider):
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        timeout_s: float = 120.0,
+        first_token_timeout_s: float = 30.0,
+        hedge_after_s: float | None = None,
+        response_hedge_after_s: float | None = None,
+        default_latency_s: float = 1.0,
+        alpha: float = 0.3,
+        cooldown_s: float = 30.0,
+        decay_half_life_s: float | None = 60.0,
+    ):
+        if not endpoints:
+            raise ValueError("RoutingModelProvider needs at least one endpoint.")
+        self.endpoints = endpoints
+        self.timeout_s = timeout_s
+        self.first_token_timeout_s = first_token_timeout_s
+        self.hedge_after_s = hedge_after_s
+        self.response_hedge_after_s = response_hedge_after_s
+        self.default_latency_s = default_latency_s
+        self.alpha = alpha
+        self.cooldown_s = cooldown_s
+        self.decay_half_life_s = decay_half_life_s
+
+    def get_model(self, model_name: str | None) -> Model:
+        """model_name 可以是模型名稱或端點名稱；找不到時使用整個端點池。"""
+        candidates = [ep for ep in self.endpoints if model_name in (ep.model, ep.name)]
+        return RoutedModel(self, candidates or list(self.endpoints))
+
+    # ------------------------------------------------------------------
+    # 延遲與佇列估計
+    # ------------------------------------------------------------------
+    def expected_wait(self, ep: Endpoint, streaming: bool) -> float:
+        latency = ep.ttft_ewma if streaming else ep.latency_ewma
+        if latency is None:
+            latency = ep.latency_ewma if streaming else ep.ttft_ewma
+        if latency is None:
+            latency = self.default_latency_s
+        elif self.decay_half_life_s:
+            age = time.monotonic() - ep.sampled_at
+            latency *= 0.5 ** (age / self.decay_half_life_s)
+        return latency * (1 + ep.in_flight)
+
+    def rank(self, candidates: list[Endpoint], streaming: bool) -> list[Endpoint]:
+        now = time.monotonic()
+        healthy = [ep for ep in candidates if ep.cooldown_until <= now]
+        cooling = sorted((ep for ep in candidates if ep.cooldown_until > now), key=lambda ep: ep.cooldown_until)
+        return sorted(healthy, key=lambda ep: self.expected_wait(ep, streaming)) + cooling
+
+    def _ewma(self, old: float | None, sample: float) -> float:
+        return sample if old is None else (1 - self.alpha) * old + self.alpha * sample
+
+    def record_success(self, ep: Endpoint, latency: float | None = None, ttft: float | None = None):
+        ep.failures = 0
+        ep.cooldown_until = 0.0
+        ep.sampled_at = time.monotonic()
+        if latency is not None:
+            ep.latency_ewma = self._ewma(ep.latency_ewma, latency)
+        if ttft is not None:
+            ep.ttft_ewma = self._ewma(ep.ttft_ewma, ttft)
+
+    def record_failure(self, ep: Endpoint, error: BaseException):
+        ep.failures += 1
+        # 連續失敗時冷卻時間加倍（上限 10 倍）
+        ep.cooldown_until = time.monotonic() + self.cooldown_s * min(2 ** (ep.failures - 1), 10)
+        print(f"[router] {ep.name} failed ({type(error).__name__}: {error}); cooling down")
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": ep.name,
+                "model": ep.model,
+                "latency_ewma": ep.latency_ewma,
+                "ttft_ewma": ep.ttft_ewma,
+                "in_flight": ep.in_flight,
+                "failures": ep.failures,
+            }
+            for ep in self.endpoints
+        ]
+
+
+class RoutedModel(Model):
+    def __init__(self, router: RoutingModelProvider, candidates: list[Endpoint]):
+        self.router = router
+        self.candidates = candidates
+        # 最近一次請求實際使用的端點名稱（供串流指標標示模型）
+        self.last_endpoint: str | None = None
+
+    async def get_response(self, *args, **kwargs):
+        router = self.router
+        order = router.rank(self.candidates, streaming=False)
+        last_error: BaseException | None = None
+        while order:
+            primary = order[0]
+            backup = order[1] if router.response_hedge_after_s is not None and len(order) > 1 else None
+            try:
+                ep, response = await self._hedge(
+                    primary, backup, lambda ep: self._timed_response(ep, args, kwargs),
+                    after_s=router.response_hedge_after_s,
+                )
+                self.last_endpoint = ep.name
+                return response
+            except FAILOVER_ERRORS as e:
+                last_error = e
+                order = _remaining(order, primary, backup)
+        raise last_error or RuntimeError("No model endpoint available.")
+
+    async def stream_response(self, *args, **kwargs) -> AsyncIterator[Any]:
+        router = self.router
+        order = router.rank(self.candidates, streaming=True)
+        last_error: BaseException | None = None
+        while order:
+            primary = order[0]
+            backup = order[1] if router.hedge_after_s is not None and len(order) > 1 else None
+            try:
+                ep, (stream, first, ttft) = await self._hedge(
+                    primary, backup, lambda ep: self._open_stream(ep, args, kwargs),
+                    after_s=router.hedge_after_s, discard=_close_stream,
+                )
+            except FAILOVER_ERRORS as e:
+                last_error = e
+                order = _remaining(order, primary, backup)
+                continue
+
+            # 已經送出第一個事件之後就不能再換端點，錯誤直接往上拋
+            self.last_endpoint = ep.name
+            started = time.perf_counter()
+            ep.in_flight += 1
+            try:
+                yield first
+                async for event in stream:
+                    yield event
+            finally:
+                ep.in_flight -= 1
+                await stream.aclose()
+            router.record_success(ep, latency=ttft + time.perf_counter() - started)
+            return
+        raise last_error or RuntimeError("No model endpoint available.")
+
+    async def _timed_response(self, ep: Endpoint, args, kwargs):
+        router = self.router
+        ep.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(ep.get_model().get_response(*args, **kwargs), router.timeout_s)
+        except FAILOVER_ERRORS as e:
+            router.record_failure(ep, e)
+            raise
+        finally:
+            ep.in_flight -= 1
+        router.record_success(ep, latency=time.perf_counter() - started)
+        return response
+
+    async def _open_stream(self, ep: Endpoint, args, kwargs):
+        """開始串流並等待第一個事件，回傳 (串流, 第一個事件, 首個事件延遲)。"""
+        router = self.router
+        stream = _StreamPump(ep.get_model().stream_response(*args, **kwargs))
+        ep.in_flight += 1
+        started = time.perf_counter()
+        try:
+            first = await asyncio.wait_for(stream.__anext__(), router.first_token_timeout_s)
+        except StopAsyncIteration:
+            error = EmptyStreamError(f"{ep.name} returned an empty stream")
+            router.record_failure(ep, error)
+            raise error
+        except FAILOVER_ERRORS as e:
+            router.record_failure(ep, e)
+            await stream.aclose()
+            raise
+        except BaseException:
+            await stream.aclose()
+            raise
+        finally:
+            ep.in_flight -= 1
+        ttft = time.perf_counter() - started
+        router.record_success(ep, ttft=ttft)
+        return stream, first, ttft
+
+    async def _hedge(self, primary: Endpoint, backup: Endpoint | None, start, after_s: float | None, discard=None):
+        """
+        先向 primary 送出；after_s 秒內未完成且有 backup 時，同時向 backup 送出。
+        回傳 (勝出端點, 結果)；都失敗時拋出最後的錯誤。
+        """
+        tasks = {asyncio.create_task(start(primary)): primary}
+        if backup is not None:
+            done, _ = await asyncio.wait(set(tasks), timeout=after_s)
+            if not done:
+                print(f"[router] hedging {primary.name} -> {backup.name}")
+                tasks[asyncio.create_task(start(backup))] = backup
+
+        pending = set(tasks)
+        winner: asyncio.Task | None = None
+        error: BaseException | None = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard is not None:
+                        discard(task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+                if discard is not None:
+                    task.add_done_callback(lambda t: _discard_done(t, discard))
+        if winner is None:
+            raise error
+        return tasks[winner], winner.result()
+
+
+class _StreamPump:
+    """
+    在獨立的 task 中迭代整個串流，事件經由 Queue 轉交給呼叫端。
+    SDK 的串流在 generator 內開啟 tracing span（contextvars），
+    若第一個事件在對沖 task 中取得、其餘事件在呼叫端取得，關閉 span 時會因 context 不同而失敗。
+    """
+
+    _END = object()
+
+    def __init__(self, stream):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(stream))
+
+    async def _run(self, stream):
+        try:
+            async for event in stream:
+                self.queue.put_nowait((event, None))
+        except Exception as e:
+            self.queue.put_nowait((self._END, e))
+        else:
+            self.queue.put_nowait((self._END, None))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event, error = await self.queue.get()
+        if error is not None:
+            raise error
+        if event is self._END:
+            raise StopAsyncIteration
+        return event
+
+    async def aclose(self):
+        if not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+def _remaining(order: list[Endpoint], primary: Endpoint, backup: Endpoint | None) -> list[Endpoint]:
+    """移除剛失敗的端點（primary，以及有被對沖送出且失敗的 backup）。"""
+    return [ep for ep in order if ep is not primary and not (ep is backup and ep.cooldown_until)]
+
+
+def _close_stream(result):
+    stream, _, _ = result
+    asyncio.ensure_future(stream.aclose())
+
+
+def _discard_done(task: asyncio.Task, discard):
+    """對沖輸掉的一方若在取消前已經完成，釋放它的結果（例如關閉串流連線）。"""
+    if not task.cancelled() and task.exception() is None:
+        discard(task.result())
@@ -0,0 +1,269 @@
+"""
+本機模型伺服器（Ollama 類）的預熱與保活。
+
+閒置一段時間後 Ollama 會把模型從 GPU 卸載，下一個請求要先花數秒載入；
+handoff 到另一個 agent（另一個模型）時最容易遇到。這個模組在啟動時：
+  1. 查詢 /api/ps 確認模型是否已載入
+  2. 送出 max_tokens=1 的串流請求量測首個 token 延遲（未載入時即為冷啟動延遲）
+  3. 以 /api/generate + keep_alive 讓模型常駐
+  4. 再量測一次，得到熱機延遲
+之後每 interval_s 秒送一次 keep_alive ping；伺服器不支援 Ollama 原生 API 時改用 1 token 的請求保活。
+
+使用方式：
+    warmup = WarmupManager.for_agents(ROUTER, entrance_agent)
+    print(warmup.format_report(await warmup.warm_up()))
+    warmup.start()
+    ...
+    await warmup.stop()
+
+命令列：python model_warmup.py http://host:11434/v1=gpt-oss:20b [...] [--watch]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+
+import requests
+from openai import AsyncOpenAI
+
+DEFAULT_KEEP_ALIVE = "30m"
+# Ollama 預設 5 分鐘卸載，ping 間隔需小於 keep_alive
+DEFAULT_INTERVAL_S = 240.0
+
+
+@dataclass
+class WarmupTarget:
+    base_url: str
+    model: str
+    api_key: str = "ollama"
+    # 由 RoutingModelProvider 建立時，預熱量到的延遲同時作為路由的初始估計
+    endpoint: object | None = None
+
+    @property
+    def server_root(self) -> str:
+        """OpenAI 相容路徑（.../v1）對應的 Ollama 原生 API 根路徑。"""
+        root = self.base_url.rstrip("/")
+        return root[:-3] if root.endswith("/v1") else root
+
+    @property
+    def label(self) -> str:
+        return f"{self.model} @ {self.server_root}"
+
+
+@dataclass
+class WarmupReport:
+    target: WarmupTarget
+    was_loaded: bool | None
+    first_ttft_s: float | None
+    warm_ttft_s: float | None
+    pinned: bool
+    error: str | None = None
+
+    @property
+    def cold(self) -> bool:
+        return self.was_loaded is False
+
+
+def _handoff_target(item):
+    """handoffs 清單中的項目 → 目標 Agent；Handoff 物件只保留目標的弱參考（SDK 沒有提供時回傳 None）。"""
+    if hasattr(item, "handoffs"):
+        return item
+    target = getattr(item, "agent", None)
+    if target is None:
+        ref = getattr(item, "_agent_ref", None)
+        target = ref() if callable(ref) else None
+    return target if hasattr(target, "handoffs") else None
+
+
+class WarmupManager:
+    def __init__(
+        self,
+        targets: list[WarmupTarget],
+        keep_alive: str = DEFAULT_KEEP_ALIVE,
+        interval_s: float = DEFAULT_INTERVAL_S,
+        timeout_s: float = 300.0,
+        router=None,
+    ):
+        self.targets = targets
+        self.keep_alive = keep_alive
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.router = router
+        self._clients: dict[tuple[str, str], AsyncOpenAI] = {}
+        self._native: dict[str, bool] = {}
+        self._task: asyncio.Task | None = None
+
+    @classmethod
+    def for_agents(cls, router, *agents, **kwargs) -> "WarmupManager":
+        """
+        收集 agent 圖（含 handoff 的 agent）中所有經由 router 使用到的端點。
+        handoffs 可以是 Agent 或 handoff() 建立的 Handoff；追蹤不到目標時，把目標 agent 一併傳入即可。
+        """
+        seen: set[int] = set()
+        targets: list[WarmupTarget] = []
+        pending = list(agents)
+        while pending:
+            agent = pending.pop(0)
+            if id(agent) in seen:
+                continue
+            seen.add(id(agent))
+            for ep in getattr(agent.model, "candidates", []):
+                if all(t.endpoint is not ep for t in targets):
+                    targets.append(WarmupTarget(ep.base_url, ep.model, ep.api_key, endpoint=ep))
+            pending.extend(t for t in map(_handoff_target, agent.handoffs) if t is not None)
+        return cls(targets, router=router, **kwargs)
+
+    # ------------------------------------------------------------------
+    # 單一端點的操作
+    # ------------------------------------------------------------------
+    def _client(self, target: WarmupTarget) -> AsyncOpenAI:
+        key = (target.base_url, target.api_key)
+        if key not in self._clients:
+            self._clients[key] = AsyncOpenAI(
+                base_url=target.base_url, api_key=target.api_key, timeout=self.timeout_s, max_retries=0
+            )
+        return self._clients[key]
+
+    async def loaded_models(self, target: WarmupTarget) -> set[str] | None:
+        """目前常駐的模型；伺服器沒有 /api/ps 時回傳 None。"""
+        try:
+            resp = await asyncio.to_thread(requests.get, f"{target.server_root}/api/ps", timeout=10.0)
+            resp.raise_for_status()
+        except requests.RequestException:
+            self._native[target.server_root] = False
+            return None
+        self._native[target.server_root] = True
+        models = resp.json().get("models", [])
+        return {m.get("name") for m in models} | {m.get("model") for m in models}
+
+    async def measure_ttft(self, target: WarmupTarget) -> float:
+        """送出 1 token 的串流請求，回傳收到第一個 chunk 的秒數。"""
+        started = time.perf_counter()
+        stream = await self._client(target).chat.completions.create(
+            model=target.model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+            stream=True,
+        )
+        try:
+            async for _ in stream:
+                return time.perf_counter() - started
+        finally:
+            await stream.close()
+        return time.perf_counter() - started
+
+    async def pin(self, target: WarmupTarget) -> bool:
+        """以 Ollama 原生 API 載入模型並延長常駐時間（不產生 token）。"""
+        if self._native.get(target.server_root) is False:
+            return False
+        try:
+            resp = await asyncio.to_thread(
+                requests.post,
+                f"{target.server_root}/api/generate",
+                json={"model": target.model, "keep_alive": self.keep_alive},
+                timeout=self.timeout_s,
+            )
+            resp.raise_for_status()
+        except requests.RequestException:
+            self._native[target.server_root] = False
+            return False
+        self._native[target.server_root] = True
+        return True
+
+    async def warm_target(self, target: WarmupTarget) -> WarmupReport:
+        loaded = await self.loaded_models(target)
+        # 沒有標籤的模型在 /api/ps 中會顯示為 name:latest
+        was_loaded = None if loaded is None else bool({target.model, f"{target.model}:latest"} & loaded)
+        try:
+            first = await self.measure_ttft(target)
+            pinned = await self.pin(target)
+            warm = await self.measure_ttft(target)
+        except Exception as e:
+            # 無法預熱的端點先進入冷卻，路由時（包括 handoff）優先使用其他主機
+            if self.router is not None and target.endpoint is not None:
+                self.router.record_failure(target.endpoint, e)
+            return WarmupReport(target, was_loaded, None, None, False, error=f"{type(e).__name__}: {e}")
+        if self.router is not None and target.endpoint is not None:
+            self.router.record_success(target.endpoint, ttft=warm)
+        return WarmupReport(target, was_loaded, first, warm, pinned)
+
+    # ------------------------------------------------------------------
+    # 全部端點
+    # ------------------------------------------------------------------
+    async def warm_up(self) -> list[WarmupReport]:
+        """同時預熱所有端點（不同主機互不等待）。"""
+        return list(await asyncio.gather(*(self.warm_target(t) for t in self.targets)))
+
+    async def ping_all(self):
+        async def ping(target: WarmupTarget):
+            try:
+                if not await self.pin(target):
+                    await self.measure_ttft(target)
+            except Exception as e:
+                print(f"[warmup] keep-alive failed for {target.label}: {type(e).__name__}: {e}")
+
+        await asyncio.gather(*(ping(t) for t in self.targets))
+
+    async def _keep_alive_loop(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            await self.ping_all()
+
+    def start(self):
+        """在目前的 event loop 背景執行 keep-alive。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._keep_alive_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @staticmethod
+    def format_report(reports: list[WarmupReport]) -> str:
+        def ms(value: float | None) -> str:
+            return "-" if value is None else f"{value * 1000:.0f}"
+
+        lines = [f"{'model @ server':<52} {'state':<8} {'first ms':>9} {'warm ms':>8}  pinned"]
+        for r in reports:
+            state = {True: "warm", False: "cold", None: "unknown"}[r.was_loaded]
+            if r.error:
+                lines.append(f"{r.target.label:<52} {state:<8} {'-':>9} {'-':>8}  error: {r.error}")
+                continue
+            lines.append(
+                f"{r.target.label:<52} {state:<8} {ms(r.first_ttft_s):>9} {ms(r.warm_ttft_s):>8}  "
+                f"{'yes' if r.pinned else 'no (1-token pings)'}"
+            )
+        return "\n".join(lines)
+
+
+async def _main(args):
+    targets = []
+    for spec in args.targets:
+        base_url, _, model = spec.partition("=")
+        targets.append(WarmupTarget(base_url, model, args.api_key))
+    manager = WarmupManager(targets, keep_alive=args.keep_alive, interval_s=args.interval)
+    print(manager.format_report(await manager.warm_up()))
+    if args.watch:
+        print(f"[warmup] keep-alive every {args.interval:.0f}s, Ctrl+C to stop")
+        await manager._keep_alive_loop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preload and keep local models resident")
+    parser.add_argument("targets", nargs="+", help="BASE_URL=MODEL, e.g. http://host:11434/v1=gpt-oss:20b")
+    parser.add_argument("--api-key", default="ollama")
+    parser.add_argument("--keep-alive", default=DEFAULT_KEEP_ALIVE)
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL_S)
+    parser.add_argument("--watch", action="store_true", help="keep pinging until interrupted")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
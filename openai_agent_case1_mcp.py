@@ -7,18 +7,13 @@ import subprocess
 import time
 from typing import Any
 
-from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
-from openai.types.responses import ResponseTextDeltaEvent
 from agents import Agent, Runner
 from agents.mcp import MCPServer, MCPServerSse
 from agents.model_settings import ModelSettings
 
 
-# 載入 .env 檔案
-load_dotenv()
-
 from agents import (
     Agent,
     Model,
@@ -30,15 +25,13 @@ from agents import (
     set_tracing_disabled,
 )
 
-BASE_URL = os.getenv("EXAMPLE_BASE_URL") or ""
-print(BASE_URL)
-API_KEY = os.getenv("EXAMPLE_API_KEY") or ""
-MODEL_NAME = os.getenv("EXAMPLE_MODEL_NAME") or ""
+from cassette import CASSETTE
+from output_governor import GOVERNOR
+from stream_metrics import consume_stream
+from settings import API_KEY, BASE_URL, MODEL_NAME, require_model_settings
 
-if not BASE_URL or not API_KEY or not MODEL_NAME:
-    raise ValueError(
-        "Please set EXAMPLE_BASE_URL, EXAMPLE_API_KEY, EXAMPLE_MODEL_NAME via env var or code."
-    )
+print(BASE_URL)
+require_model_settings()
 
 
 """This example uses a custom provider for some calls to Runner.run(), and direct calls to OpenAI for
@@ -69,24 +62,32 @@ CUSTOM_MODEL_PROVIDER = CustomModelProvider()
 
 
 @function_tool
+@GOVERNOR.wrap()
 def get_weather(city: str):
     print(f"[debug] getting weather tool for {city}")
     return f"The weather in {city} is sunny."
 
 @function_tool
+@GOVERNOR.wrap()
 def google_search(query: str):
     print(f"[debug] performing Google search for: {query}")
     return f"Search results for '{query}' are not available in this example."
 
+fetch_tool_output = GOVERNOR.fetch_tool()
+
 
 async def mcp_open():
+    # 回放 cassette 時不需要 MCP server，工具清單與結果都來自錄製內容
+    if CASSETTE.replaying:
+        await main_agent(GOVERNOR.wrap_mcp_server(CASSETTE.mcp_server("RAGflow Server")))
+        return
     async with MCPServerSse(
         name="RAGflow Server",
         params={
             "url": "http://localhost:7056/sse",
         },
     ) as server:
-        await main_agent(server)
+        await main_agent(GOVERNOR.wrap_mcp_server(CASSETTE.wrap_mcp_server(server)))
 
 
 async def main_agent(mcp_server: MCPServer):
@@ -99,7 +100,7 @@ async def main_agent(mcp_server: MCPServer):
 
 """, 
                   mcp_servers=[mcp_server],
-                  tools=[get_weather, google_search])
+                  tools=[get_weather, google_search, fetch_tool_output])
 
     # This will use the custom model provider
     # result = await Runner.run(
@@ -108,13 +109,17 @@ async def main_agent(mcp_server: MCPServer):
     #     run_config=RunConfig(model_provider=CUSTOM_MODEL_PROVIDER),
     # )
     # print(result.final_output)
+    CASSETTE.instrument(agent)
+    GOVERNOR.reset_run()
     result = Runner.run_streamed(agent, 
                                 input="請問冷氣的型號？ 也介紹詳細",
-                                run_config=RunConfig(model_provider=CUSTOM_MODEL_PROVIDER))
+                                run_config=RunConfig(model_provider=CASSETTE.provider(CUSTOM_MODEL_PROVIDER)))
     
-    async for event in result.stream_events():
-        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            print(event.data.delta, end="", flush=True)
+    run_metrics = await consume_stream(result, default_model=MODEL_NAME)
+
+    print("\n" + GOVERNOR.format_report())
+    print(run_metrics.format())
+    CASSETTE.finish()
 
     # If you uncomment this, it will use OpenAI directly, not the custom provider
     # result = await Runner.run(
@@ -125,6 +130,11 @@ async def main_agent(mcp_server: MCPServer):
 
 
 if __name__ == "__main__":
+    if CASSETTE.replaying:
+        # 離線回放：不啟動 MCP server
+        asyncio.run(mcp_open())
+        exit(0)
+
     process: subprocess.Popen[Any] | None = None
     try:
         this_dir = os.path.dirname(os.path.abspath(__file__))
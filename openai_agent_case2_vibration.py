@@ -3,25 +3,11 @@
 from __future__ import annotations
 
 import asyncio
-import os
 
-from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
-from openai.types.responses import ResponseTextDeltaEvent
-from agents import Agent, Runner
 from datetime import datetime
 
-import pandas as pd
-from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError, OperationalError
-
-# 重用既有的連線參數與方法
-from upload_data import get_engine, MYSQL_DB, MYSQL_TABLE
-
-# 載入 .env 檔案
-load_dotenv()
-
 from agents import (
     Agent,
     Model,
@@ -33,23 +19,16 @@ from agents import (
     set_tracing_disabled,
 )
 
-BASE_URL = os.getenv("EXAMPLE_BASE_URL") or ""
+from cassette import CASSETTE
+from conversation_store import session_from_env
+from output_governor import GOVERNOR
+from query_guard import QUERY_GUARD
+from stream_metrics import consume_stream
+from settings import API_KEY, BASE_URL, MODEL_NAME, require_model_settings
+import vibration_db
+
 print(BASE_URL)
-API_KEY = os.getenv("EXAMPLE_API_KEY") or ""
-MODEL_NAME = os.getenv("EXAMPLE_MODEL_NAME") or ""
-
-#SQL connectation inf
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_PORT = int(os.getenv('MYSQL_PORT'))
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_DB = os.getenv('MYSQL_DB')
-MYSQL_TABLE = os.getenv('MYSQL_TABLE')
-
-if not BASE_URL or not API_KEY or not MODEL_NAME:
-    raise ValueError(
-        "Please set EXAMPLE_BASE_URL, EXAMPLE_API_KEY, EXAMPLE_MODEL_NAME via env var or code."
-    )
+require_model_settings()
 
 
 """This example uses a custom provider for some calls to Runner.run(), and direct calls to OpenAI for
@@ -76,126 +55,60 @@ CUSTOM_MODEL_PROVIDER = CustomModelProvider()
 # 已註冊的 FUNCTION TOOLS:
 # 1. get_weather(city: str)
 # 2. get_vibration_all_on_date(date_str: str)
-# 3. find_vibration_outliers_on_date(date_str: str, threshold: float = 3.0)
+# 3. find_vibration_outliers_on_date(date_str: str, threshold: float = 3.0, top_k: int = 20, columns: list[str] | None = None)
 # 4. analyze_vibration_list(values: list[float]) -> dict
 # 5. get_vibration_max_on_date(date_str: str)
 # 6. calculate_sum(values: list[float]) -> float
 # 7. get_current_time()
+# 8. fetch_tool_output(handle: str, offset: int = 0, limit: int = 50)  (output_governor)
+# 9. rank_vibration_anomalies_on_date(date_str: str, method: str = "mad", ...)
+# 10. get_recent_vibration_alerts(equipment: str | None = None, since_minutes: int = 1440, limit: int = 20)
+# 11. get_vibration_stats_by_equipment(date_str: str, equipment_ids: list[str] | None = None)
+# 12. get_vibration_max_by_equipment(date_str: str, equipment_ids: list[str] | None = None)
+# 13. find_vibration_outliers_by_equipment(date_str: str, threshold: float = 3.0, ...)
+# 14. analyze_vibration_on_date(date_str: str, method: str = "zscore", ...)
+# 15. analyze_vibration_fleet(date_range: str, chunk_by: str = "equipment", ...)
+# 16. estimate_vibration_stats(date_range: str, equipment_ids: list[str] | None = None)
+# 17. get_vibration_stats_across_sites(date_range: str, sites: list[str] | None = None)
+# 18. find_vibration_outliers_across_sites(date_range: str, threshold: float = 3.0, ...)
+# 19. describe_vibration_table(refresh: bool = False)
+# 20. get_vibration_health(date_range: str, equipment_ids: list[str] | None = None)
 
 @function_tool
+@GOVERNOR.wrap()
 def get_weather(city: str):
     print(f"[debug] getting weather tool for {city}")
     return f"The weather in {city} is sunny."
 
 @function_tool
+@GOVERNOR.wrap()
 def get_vibration_all_on_date(date_str: str):
     print(f"[debug] getting all vibration data for date: {date_str}")
-    import mysql.connector
-
-    try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        cursor = conn.cursor()
-        # Get column names
-        cursor.execute(f"SHOW COLUMNS FROM {MYSQL_TABLE}")
-        columns = [row[0] for row in cursor.fetchall()]
-        vibration_col = next((col for col in columns if 'vibration' in col.lower()), None)
-        time_columns = [col for col in columns if 'time' in col.lower() or 'date' in col.lower()]
-        if not vibration_col:
-            return "No vibration column found."
-        if not time_columns:
-            return "No time/date columns found for filtering."
-        time_col = time_columns[0]
-        query = (
-            f"SELECT `{time_col}`, `{vibration_col}` "
-            f"FROM `{MYSQL_TABLE}` "
-            f"WHERE DATE(`{time_col}`) = %s "
-            f"ORDER BY `{time_col}` ASC"
-        )
-        cursor.execute(query, (date_str,))
-        rows = cursor.fetchall()
-        if rows:
-            result = [f"{time_col}: {row[0]}, {vibration_col}: {row[1]}" for row in rows]
-            return "\n".join(result)
-        else:
-            return f"{date_str} 沒有資料。"
-    except Exception as e:
-        return f"Error retrieving vibration data: {e}"
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+    return vibration_db.get_vibration_all_on_date(date_str)
 
 @function_tool
-def find_vibration_outliers_on_date(date_str: str, threshold: float = 3.0):
+@GOVERNOR.wrap()
+def find_vibration_outliers_on_date(
+    date_str: str,
+    threshold: float = 3.0,
+    top_k: int = 20,
+    columns: list[str] | None = None,
+):
     """
-    取得指定日期的VIBRATION資料，找出離群值，並回傳該離群值的設備、對應時間點及其他欄位數據。
+    取得指定日期的VIBRATION資料，找出離群值，回傳離群總數與偏離最大的 top_k 筆（精簡 JSON，含 score）。
     threshold: 標準差倍數，預設3.0
+    top_k: 回傳幾筆，預設 20
+    columns: 只回傳這些欄位，None 表示時間、振動值與設備欄位
+    超出輸出預算時只保留偏離最大的前幾筆，捨棄筆數記在 "truncated"
     """
     print(f"[debug] finding vibration outliers for date: {date_str} with threshold {threshold}")
-    import mysql.connector
-
-    try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        cursor = conn.cursor(dictionary=True)
-        # Get column names
-        cursor.execute(f"SHOW COLUMNS FROM {MYSQL_TABLE}")
-        columns = [row["Field"] for row in cursor.fetchall()]
-        vibration_col = next((col for col in columns if 'vibration' in col.lower()), None)
-        time_columns = [col for col in columns if 'time' in col.lower() or 'date' in col.lower()]
-        if not vibration_col:
-            return "No vibration column found."
-        if not time_columns:
-            return "No time/date columns found for filtering."
-        time_col = time_columns[0]
-        # 取得所有資料
-        query = (
-            f"SELECT * FROM `{MYSQL_TABLE}` "
-            f"WHERE DATE(`{time_col}`) = %s"
-        )
-        cursor.execute(query, (date_str,))
-        rows = cursor.fetchall()
-        if not rows:
-            return f"{date_str} 沒有資料。"
-        values = [row[vibration_col] for row in rows if isinstance(row[vibration_col], (int, float))]
-        if not values:
-            return "No valid vibration data found."
-        avg = sum(values) / len(values)
-        std = (sum((x - avg) ** 2 for x in values) / len(values)) ** 0.5
-        outliers = []
-        for row in rows:
-            val = row[vibration_col]
-            if isinstance(val, (int, float)) and std > 0 and abs(val - avg) > threshold * std:
-                outlier_info = {col: row[col] for col in columns}
-                outliers.append(outlier_info)
-        if not outliers:
-            return f"{date_str} 沒有發現離群值。"
-        result = "離群值資料如下：\n"
-        for idx, outlier in enumerate(outliers, 1):
-            info = ", ".join(f"{k}: {v}" for k, v in outlier.items())
-            result += f"{idx}. {info}\n"
-        return result.strip()
-    except Exception as e:
-        return f"Error finding vibration outliers: {e}"
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+    return vibration_db.find_vibration_outliers_on_date(
+        date_str, threshold, columns=columns, top_k=top_k, output="json",
+        max_tokens=GOVERNOR.budget_for("find_vibration_outliers_on_date"),
+    )
 
 @function_tool
+@GOVERNOR.wrap()
 def analyze_vibration_list(values: list[float]) -> dict:
     print(f"[debug] analyzing vibration list: {values}")
     if not values:
@@ -213,57 +126,198 @@ def analyze_vibration_list(values: list[float]) -> dict:
     }
 
 @function_tool
+@GOVERNOR.wrap()
 def get_vibration_max_on_date(date_str: str):
     print(f"[debug] getting max vibration data for date: {date_str}")
-    import mysql.connector
+    return vibration_db.get_vibration_max_on_date(date_str)
 
-    try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
-        cursor = conn.cursor()
-        # Get column names
-        cursor.execute(f"SHOW COLUMNS FROM {MYSQL_TABLE}")
-        columns = [row[0] for row in cursor.fetchall()]
-        vibration_col = next((col for col in columns if 'vibration' in col.lower()), None)
-        # Find possible time/date columns
-        time_columns = [col for col in columns if 'time' in col.lower() or 'date' in col.lower()]
-        if not vibration_col:
-            return "No vibration column found."
-        if not time_columns:
-            return "No time/date columns found for filtering."
-        time_col = time_columns[0]
-        query = (
-            f"SELECT `{time_col}`, `{vibration_col}` "
-            f"FROM `{MYSQL_TABLE}` "
-            f"WHERE DATE(`{time_col}`) = %s "
-            f"ORDER BY `{vibration_col}` DESC "
-            f"LIMIT 1"
-        )
-        cursor.execute(query, (date_str,))
-        row = cursor.fetchone()
-        if row:
-            return f"在 {date_str}，最大 {vibration_col} 為 {row[1]}，發生於 {time_col}: {row[0]}"
-        else:
-            return f"{date_str} 沒有資料。"
-    except Exception as e:
-        return f"Error retrieving vibration data: {e}"
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+@function_tool
+@GOVERNOR.wrap()
+def rank_vibration_anomalies_on_date(
+    date_str: str,
+    method: str = "mad",
+    threshold: float | None = None,
+    window_minutes: int = 60,
+    top_k: int = 20,
+):
+    """
+    依每台設備、每個時間窗的基準線找出指定日期的振動異常，回傳分數最高的 top_k 筆。
+    method: mad（中位數/MAD，預設）、iqr、rolling（與前 60 筆比較的滾動 z-score）、zscore
+    threshold: 分數門檻，未指定時依方法使用預設值
+    window_minutes: 基準線的時間窗（分鐘），0 表示整天一組
+    """
+    print(f"[debug] ranking vibration anomalies for date: {date_str} with method {method}")
+    return vibration_db.rank_vibration_anomalies_on_date(
+        date_str, method=method, threshold=threshold, window_minutes=window_minutes, top_k=top_k
+    )
+
+@function_tool
+@GOVERNOR.wrap()
+def analyze_vibration_on_date(
+    date_str: str,
+    method: str = "zscore",
+    threshold: float | None = None,
+    top_k: int = 10,
+):
+    """
+    一次完成指定日期的振動分析：讀取資料、計算統計量（平均、變異數、最大/最小、百分位數）、
+    每小時趨勢、各設備摘要與離群值，回傳精簡報告。一般的分析需求只需要呼叫這個工具一次。
+    method: zscore（預設）、mad、iqr、rolling
+    threshold: 離群值分數門檻，未指定時依方法使用預設值
+    """
+    print(f"[debug] analyzing vibration data for date: {date_str} with method {method}")
+    return vibration_db.analyze_vibration_on_date(date_str, method=method, threshold=threshold, top_k=top_k)
+
+@function_tool
+@GOVERNOR.wrap()
+def analyze_vibration_fleet(
+    date_range: str,
+    chunk_by: str = "equipment",
+    method: str = "zscore",
+    top_k: int = 10,
+):
+    """
+    全廠（所有設備 × 多天）的振動分析：統計量、各設備摘要與分數最高的離群值，
+    計算在背景行程池中進行。跨多天或全部設備的分析請使用這個工具。
+    date_range: 日期範圍，例如 "2025/7/20~7/30"、"最近7天"
+    chunk_by: equipment（每台設備一組基準線，預設）或 day（每台設備每天一組基準線）
+    method: zscore（預設）、mad、iqr、rolling
+    """
+    print(f"[debug] analyzing fleet vibration data for range: {date_range} by {chunk_by} with method {method}")
+    return vibration_db.analyze_vibration_fleet(date_range, chunk_by=chunk_by, method=method, top_k=top_k)
+
+@function_tool
+@GOVERNOR.wrap()
+def estimate_vibration_stats(date_range: str, equipment_ids: list[str] | None = None):
+    """
+    長時間範圍（數週到數月）的快速近似統計：自動抽樣部分時間區塊，回傳平均值、標準差、百分位數、
+    每日 / 每週平均與趨勢（上升 / 下降 / 無顯著趨勢），附信賴區間與樣本數，通常在一秒內完成。
+    探索性問題（例如「這兩個月振動是否有上升趨勢」）優先使用；需要精確的離群值時改用 analyze_vibration_fleet。
+    date_range: 日期範圍，例如 "2025/6/1~7/30"、"上個月"
+    equipment_ids: 只估計這些設備，None 表示全部設備
+    """
+    print(f"[debug] estimating vibration stats for range: {date_range}")
+    return vibration_db.estimate_vibration_stats(date_range, equipment_ids)
+
+@function_tool
+@GOVERNOR.wrap()
+def get_vibration_stats_across_sites(date_range: str, sites: list[str] | None = None):
+    """
+    同時查詢所有廠區（DB_SOURCES）的資料庫，回傳各廠區與全廠合併的振動統計量及最大振動值。
+    date_range: 日期範圍，例如 "2025/7/20~7/30"
+    sites: 只查詢這些廠區，None 表示全部廠區
+    """
+    print(f"[debug] getting vibration stats across sites for range: {date_range}")
+    import multi_source
+
+    return multi_source.get_vibration_stats_across_sites(date_range, sites)
+
+@function_tool
+@GOVERNOR.wrap()
+def find_vibration_outliers_across_sites(
+    date_range: str,
+    threshold: float = 3.0,
+    top_k: int = 10,
+    baseline: str = "site",
+    sites: list[str] | None = None,
+):
+    """
+    同時在所有廠區找出振動離群值，回傳各廠區的基準線、離群總數與分數最高的 top_k 筆。
+    baseline: site（每個廠區自己的基準線，預設）或 fleet（全廠合併的基準線）
+    sites: 只查詢這些廠區，None 表示全部廠區
+    """
+    print(f"[debug] finding vibration outliers across sites for range: {date_range} with baseline {baseline}")
+    import multi_source
+
+    return multi_source.find_vibration_outliers_across_sites(date_range, threshold, top_k, baseline, sites)
+
+@function_tool
+@GOVERNOR.wrap()
+def get_vibration_health(date_range: str, equipment_ids: list[str] | None = None):
+    """
+    從預先計算的特徵表回傳各設備的健康指標（RMS、峰值、波峰因數、峭度、FFT 頻帶能量、RMS 趨勢）與警示，
+    不讀原始振動資料，適合「設備狀況如何」「哪台需要保養」這類問題。
+    date_range: 日期範圍，例如 "2025/7/20~7/30"、"最近7天"
+    equipment_ids: 只查這些設備，None 表示全部設備
+    """
+    print(f"[debug] getting vibration health for range: {date_range}")
+    import feature_store
+
+    return feature_store.get_vibration_health(date_range, equipment_ids)
+
+@function_tool
+@GOVERNOR.wrap()
+def describe_vibration_table(refresh: bool = False):
+    """
+    回傳振動資料表的欄位、索引、估計列數與各時間欄位的資料範圍（讀取快取，幾乎不花時間）。
+    refresh: True 時重新查詢資料庫（一般不需要）
+    """
+    print(f"[debug] describing vibration table (refresh={refresh})")
+    import table_profile
+
+    return table_profile.describe_table(refresh)
 
 @function_tool
+@GOVERNOR.wrap()
+def get_recent_vibration_alerts(equipment: str | None = None, since_minutes: int = 1440, limit: int = 20):
+    """
+    讀取背景監控程式（vibration_monitor.py）預先算好的振動警報與各設備目前的基準線，不需掃描資料庫。
+    equipment: 只看指定設備，None 表示全部
+    since_minutes: 最新資料時間往前幾分鐘內的警報，預設 1440（一天）
+    """
+    print(f"[debug] reading recent vibration alerts for equipment: {equipment}")
+    from vibration_monitor import recent_alerts_text
+
+    return recent_alerts_text(equipment, since_minutes, limit)
+
+@function_tool
+@GOVERNOR.wrap()
+def get_vibration_stats_by_equipment(date_str: str, equipment_ids: list[str] | None = None):
+    """
+    一次取得指定日期每台設備的振動筆數、最小值、最大值、平均值與標準差。
+    equipment_ids: 只查詢這些設備，None 表示全部設備
+    """
+    print(f"[debug] getting vibration stats by equipment for date: {date_str}")
+    return vibration_db.get_vibration_stats_by_equipment(date_str, equipment_ids)
+
+@function_tool
+@GOVERNOR.wrap()
+def get_vibration_max_by_equipment(date_str: str, equipment_ids: list[str] | None = None):
+    """
+    一次取得指定日期每台設備的最大振動值及發生時間（由大到小）。
+    equipment_ids: 只查詢這些設備，None 表示全部設備
+    """
+    print(f"[debug] getting max vibration by equipment for date: {date_str}")
+    return vibration_db.get_vibration_max_by_equipment(date_str, equipment_ids)
+
+@function_tool
+@GOVERNOR.wrap(strategy="truncate")
+def find_vibration_outliers_by_equipment(
+    date_str: str,
+    threshold: float = 3.0,
+    equipment_ids: list[str] | None = None,
+    per_equipment_limit: int = 5,
+):
+    """
+    以每台設備自己的平均值與標準差找出指定日期的離群值，每台設備回傳偏離最大的幾筆與離群總數。
+    threshold: 標準差倍數，預設3.0
+    equipment_ids: 只查詢這些設備，None 表示全部設備
+    """
+    print(f"[debug] finding vibration outliers by equipment for date: {date_str} with threshold {threshold}")
+    return vibration_db.find_vibration_outliers_by_equipment(
+        date_str, threshold, equipment_ids, per_equipment_limit
+    )
+
+fetch_tool_output = GOVERNOR.fetch_tool()
+
+@function_tool
+@GOVERNOR.wrap()
 def calculate_sum(values: list[float]) -> float:
     print(f"[debug] calculating sum for: {values}")
     return sum(values)
 
 @function_tool
+@GOVERNOR.wrap()
 def get_current_time():
     print("[debug] getting current time")
     return f"The current time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
@@ -273,11 +327,24 @@ def get_current_time():
 # 已註冊的 FUNCTION TOOLS:
 # 1. get_weather(city: str)
 # 2. get_vibration_all_on_date(date_str: str)
-# 3. find_vibration_outliers_on_date(date_str: str, threshold: float = 3.0)
+# 3. find_vibration_outliers_on_date(date_str: str, threshold: float = 3.0, top_k: int = 20, columns: list[str] | None = None)
 # 4. analyze_vibration_list(values: list[float]) -> dict
 # 5. get_vibration_max_on_date(date_str: str)
 # 6. calculate_sum(values: list[float]) -> float
 # 7. get_current_time()
+# 8. fetch_tool_output(handle: str, offset: int = 0, limit: int = 50)  (output_governor)
+# 9. rank_vibration_anomalies_on_date(date_str: str, method: str = "mad", ...)
+# 10. get_recent_vibration_alerts(equipment: str | None = None, since_minutes: int = 1440, limit: int = 20)
+# 11. get_vibration_stats_by_equipment(date_str: str, equipment_ids: list[str] | None = None)
+# 12. get_vibration_max_by_equipment(date_str: str, equipment_ids: list[str] | None = None)
+# 13. find_vibration_outliers_by_equipment(date_str: str, threshold: float = 3.0, ...)
+# 14. analyze_vibration_on_date(date_str: str, method: str = "zscore", ...)
+# 15. analyze_vibration_fleet(date_range: str, chunk_by: str = "equipment", ...)
+# 16. estimate_vibration_stats(date_range: str, equipment_ids: list[str] | None = None)
+# 17. get_vibration_stats_across_sites(date_range: str, sites: list[str] | None = None)
+# 18. find_vibration_outliers_across_sites(date_range: str, threshold: float = 3.0, ...)
+# 19. describe_vibration_table(refresh: bool = False)
+# 20. get_vibration_health(date_range: str, equipment_ids: list[str] | None = None)
 
 async def main():
     
@@ -285,26 +352,68 @@ async def main():
                   instructions="""You only respond in 繁體中文. 
                   你是一個設備維護工程師，可以用對應的tools來查SQL資料庫(得出的資料要取abs)，
                   並提供設備的振動數據分析與維護建議和故障排除步驟。
-                  大致流程為: [取得資料]->[分析資料]->[解析資料]
-                  根據使用者的目的來挑選，那目前可選用的為:
-
+                  一般的分析需求（例如「幫我分析某天的振動資料」）請直接呼叫一次 analyze_vibration_on_date，
+                  它會一次完成 [取得資料]->[分析資料]->[解析資料] 並回傳精簡報告，不需要再把數值傳給其他工具。
+                  date_str 直接填使用者的日期寫法即可（例如 20250725、2025/7/30、昨天），工具會自行轉換並檢查資料範圍；
+                  若工具回傳該日期沒有資料及可查詢的範圍，請直接告知使用者，不要換格式重試。
+                  只有在需要原始資料或特定查詢時，才依下列流程挑選工具:
+
+                  [一次完成分析]: analyze_vibration_on_date（優先使用）
+                  [健康狀態]: get_vibration_health（設備狀況、保養優先順序；讀預先算好的特徵，最快，可跨多天）
+                  [全廠多天分析]: analyze_vibration_fleet（跨多天或全部設備時使用，date_range 例如 2025/7/20~7/30）
+                  [快速估計]: estimate_vibration_stats（數週到數月的探索性問題，例如趨勢是否上升，附信賴區間）
+                  [跨廠區]: get_vibration_stats_across_sites, find_vibration_outliers_across_sites（比較或彙總多個廠區時使用，一次查詢所有廠區）
                   [取得資料]: get_vibration_all_on_date, get_vibration_max_on_date
+                  [依設備]: get_vibration_stats_by_equipment, get_vibration_max_by_equipment, find_vibration_outliers_by_equipment
+                  （詢問多台或每台設備時，請用一次[依設備]工具查詢，不要逐台呼叫）
                   [分析資料]: analyze_vibration_list, calculate_sum
-                  [解析資料]: find_vibration_outliers_on_date
+                  [解析資料]: find_vibration_outliers_on_date, rank_vibration_anomalies_on_date
+                  [即時警報]: get_recent_vibration_alerts（背景監控已算好的警報，最快）
+                  [資料表概況]: describe_vibration_table（有哪些欄位、資料涵蓋的日期範圍、資料量）
                   """, 
-                  tools=[get_vibration_all_on_date, 
+                  tools=[analyze_vibration_on_date,
+                            analyze_vibration_fleet,
+                            estimate_vibration_stats,
+                            get_vibration_stats_across_sites,
+                            find_vibration_outliers_across_sites,
+                            get_vibration_all_on_date, 
                             get_vibration_max_on_date, 
                             analyze_vibration_list, 
                             calculate_sum, 
-                            find_vibration_outliers_on_date])
-
+                            find_vibration_outliers_on_date,
+                            rank_vibration_anomalies_on_date,
+                            get_recent_vibration_alerts,
+                            get_vibration_stats_by_equipment,
+                            get_vibration_max_by_equipment,
+                            find_vibration_outliers_by_equipment,
+                            get_vibration_health,
+                            describe_vibration_table,
+                            fetch_tool_output])
+
+    # 設定 CONVERSATION_SESSION_ID 時延續同一段對話（舊的工具輸出會被壓縮）
+    session = session_from_env()
+
+    # CASSETTE_MODE=record / replay 時錄製或離線回放這次執行（見 cassette.py）
+    CASSETTE.instrument(agent)
+    GOVERNOR.reset_run()
     result = Runner.run_streamed(agent, 
                                 input="20250725 振動最大值有超過0.1嗎" ,#"台中天氣如何? 請幫我查詢電影時刻，我想看電影",
-                                run_config=RunConfig(model_provider=CUSTOM_MODEL_PROVIDER))
+                                session=session,
+                                run_config=RunConfig(model_provider=CASSETTE.provider(CUSTOM_MODEL_PROVIDER)))
     
-    async for event in result.stream_events():
-        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            print(event.data.delta, end="", flush=True)
+    try:
+        run_metrics = await consume_stream(result, default_model=MODEL_NAME)
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        # 執行被取消（例如 Ctrl+C）：停止 agent，並中止伺服器上仍在執行的查詢
+        result.cancel()
+        QUERY_GUARD.cancel_all()
+        raise
+
+    print("\n" + GOVERNOR.format_report())
+    print(run_metrics.format())
+    if session is not None:
+        print(session.format_stats())
+    CASSETTE.finish()
 
     # If you uncomment this, it will use OpenAI directly, not the custom provider
     # result = await Runner.run(
@@ -3,17 +3,12 @@ from __future__ import annotations
 import asyncio
 import os
 
-from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
-from openai.types.responses import ResponseTextDeltaEvent
-from agents import Agent, Runner
+from agents import Agent, Runner, handoff
 from datetime import datetime
 
 
-# 載入 .env 檔案
-load_dotenv()
-
 from agents import (
     Agent,
     Model,
@@ -25,10 +20,16 @@ from agents import (
     set_tracing_disabled,
 )
 
+from model_router import Endpoint, RoutingModelProvider
+from model_warmup import WarmupManager
+from handoff_filters import HANDOFF_TRIMMER
+from output_governor import GOVERNOR
+from stream_metrics import consume_stream
+from settings import API_KEY
+
 BASE_URL = "http://140.134.174.70:11434/v1"
 my_server_url="http://140.134.60.218:11425/v1"
 print(BASE_URL)
-API_KEY = os.getenv("EXAMPLE_API_KEY") or ""
 MODEL_NAME_1 = "qwen3:0.6b"
 MODEL_NAME_1 = "gpt-oss:20b"
 MODEL_NAME_2 = "gemma3_code_model"
@@ -49,17 +50,36 @@ Note that in this example, we disable tracing under the assumption that you don'
 from platform.openai.com. If you do have one, you can either set the `OPENAI_API_KEY` env var
 or call set_tracing_export_api_key() to set a tracing specific key.
 """
-client = AsyncOpenAI(base_url=BASE_URL, api_key=API_KEY)
-client2 = AsyncOpenAI(base_url=my_server_url, api_key=API_KEY)
+# 原本的對應：MODEL_NAME_1 在 my_server_url、MODEL_NAME_2 在 BASE_URL。
+# 兩台 GPU 主機都已部署兩個模型時設 ROUTER_SHARED_MODELS=1，才把每個模型註冊到兩台：
+# 依延遲/排隊狀況選擇，失敗時自動換另一台，串流 1.5 秒內沒有第一個 token 就同時向另一台送出（先回應者勝出）
+ROUTER_SHARED_MODELS = os.getenv("ROUTER_SHARED_MODELS", "0") == "1"
+ROUTER = RoutingModelProvider(
+    [
+        Endpoint("server2/" + MODEL_NAME_1, my_server_url, MODEL_NAME_1, API_KEY),
+        Endpoint("server1/" + MODEL_NAME_2, BASE_URL, MODEL_NAME_2, API_KEY),
+    ]
+    + (
+        [
+            Endpoint("server1/" + MODEL_NAME_1, BASE_URL, MODEL_NAME_1, API_KEY),
+            Endpoint("server2/" + MODEL_NAME_2, my_server_url, MODEL_NAME_2, API_KEY),
+        ]
+        if ROUTER_SHARED_MODELS
+        else []
+    ),
+    hedge_after_s=1.5,
+)
 set_tracing_disabled(disabled=True)
 
 
 @function_tool
+@GOVERNOR.wrap()
 def get_weather(city: str):
     print(f"[debug] getting weather tool for {city}")
     return f"The weather in {city} is sunny."
 
 @function_tool
+@GOVERNOR.wrap()
 def google_search(query: str):
     print(f"[debug] performing Google search for: {query}")
     from googlesearch import search #import library
@@ -77,19 +97,23 @@ def google_search(query: str):
 
 
 @function_tool
+@GOVERNOR.wrap()
 def calculate_sum(values: list[float]) -> float:
     print(f"[debug] calculating sum for: {values}")
     return sum(values)
 
 @function_tool
+@GOVERNOR.wrap()
 def get_current_time():
     print("[debug] getting current time")
     return f"The current time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
 
+fetch_tool_output = GOVERNOR.fetch_tool()
+
 
 async def main():
     alarm_agent = Agent(name="Assistant",
-                                model=OpenAIChatCompletionsModel(model=MODEL_NAME_2, openai_client=client)) 
+                                model=ROUTER.get_model(MODEL_NAME_2)) 
                  # tools=[get_weather, get_current_time, google_search, calculate_sum])
 
     entrance_agent = Agent(name="triage person",
@@ -99,18 +123,32 @@ async def main():
                         如果有提到類似ERROR_UNEXPECTED_MM_MAP_ERROR	557 (0x22D) 或 ERROR_INVALID_PRINTER_COMMAND	1803 (0x70B) 以上為舉例
                         則呼叫alarm_agent. 如果無關，就直接回覆使用者的問題。
                         """,
-                        model=OpenAIChatCompletionsModel(model=MODEL_NAME_1, openai_client=client2),
-                        tools=[get_weather, get_current_time, google_search, calculate_sum],
-                        handoffs=[alarm_agent]
+                        model=ROUTER.get_model(MODEL_NAME_1),
+                        tools=[get_weather, get_current_time, google_search, calculate_sum, fetch_tool_output],
+                        # alarm_agent 只需要使用者提供的錯誤碼，不需要 triage 的工具輸出
+                        handoffs=[handoff(alarm_agent, input_filter=HANDOFF_TRIMMER.filter("alarm_agent"))]
                         )
 
+    # 預先載入 triage 與 handoff 目標使用的模型，並在執行期間定期保活
+    # （alarm_agent 也直接傳入，SDK 的 Handoff 物件不一定能追蹤回目標 agent）
+    warmup = WarmupManager.for_agents(ROUTER, entrance_agent, alarm_agent)
+    print(warmup.format_report(await warmup.warm_up()))
+    warmup.start()
+
+    GOVERNOR.reset_run()
+    HANDOFF_TRIMMER.reset_run()
     result = Runner.run_streamed(entrance_agent, 
                                 input="brad pitt有什麼新電影，台中上映的場次?")#"ERROR_INVALID_PRINTER_COMMAND	1803 (0x70B)")
                                 #"brad pitt有什麼新電影，台中上映的場次?" ,#"台中天氣如何? 請幫我查詢電影時刻，我想看電影",)
     
-    async for event in result.stream_events():
-        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            print(event.data.delta, end="", flush=True)
+    run_metrics = await consume_stream(result)
+
+    print("\n" + GOVERNOR.format_report())
+    print(HANDOFF_TRIMMER.format_report())
+    print(run_metrics.format())
+    for stat in ROUTER.stats():
+        print(f"[router] {stat}")
+    await warmup.stop()
 
     # If you uncomment this, it will use OpenAI directly, not the custom provider
     # result = await Runner.run(
@@ -3,17 +3,12 @@ from __future__ import annotations
 import asyncio
 import os
 
-from dotenv import load_dotenv
 from openai import AsyncOpenAI
 
-from openai.types.responses import ResponseTextDeltaEvent
 from agents import Agent, Runner
 from datetime import datetime
 
 
-# 載入 .env 檔案
-load_dotenv()
-
 from agents import (
     Agent,
     Model,
@@ -25,15 +20,12 @@ from agents import (
     set_tracing_disabled,
 )
 
-BASE_URL = os.getenv("EXAMPLE_BASE_URL") or ""
-print(BASE_URL)
-API_KEY = os.getenv("EXAMPLE_API_KEY") or ""
-MODEL_NAME = os.getenv("EXAMPLE_MODEL_NAME") or ""
+from output_governor import GOVERNOR
+from stream_metrics import consume_stream
+from settings import API_KEY, BASE_URL, MODEL_NAME, require_model_settings
 
-if not BASE_URL or not API_KEY or not MODEL_NAME:
-    raise ValueError(
-        "Please set EXAMPLE_BASE_URL, EXAMPLE_API_KEY, EXAMPLE_MODEL_NAME via env var or code."
-    )
+print(BASE_URL)
+require_model_settings()
 
 
 """This example uses a custom provider for some calls to Runner.run(), and direct calls to OpenAI for
@@ -59,11 +51,13 @@ CUSTOM_MODEL_PROVIDER = CustomModelProvider()
 
 
 @function_tool
+@GOVERNOR.wrap()
 def get_weather(city: str):
     print(f"[debug] getting weather tool for {city}")
     return f"The weather in {city} is sunny."
 
 @function_tool
+@GOVERNOR.wrap()
 def google_search(query: str):
     print(f"[debug] performing Google search for: {query}")
     from googlesearch import search #import library
@@ -81,15 +75,19 @@ def google_search(query: str):
 
 
 @function_tool
+@GOVERNOR.wrap()
 def calculate_sum(values: list[float]) -> float:
     print(f"[debug] calculating sum for: {values}")
     return sum(values)
 
 @function_tool
+@GOVERNOR.wrap()
 def get_current_time():
     print("[debug] getting current time")
     return f"The current time is {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
 
+fetch_tool_output = GOVERNOR.fetch_tool()
+
 async def main():
     agent = Agent(
         name="Joker",
@@ -102,7 +100,7 @@ async def main():
     agent = Agent(name="Assistant", 
                   instructions="""You only respond in 繁體中文. 查詢前，請先確認目前時間。
                   Must call tools for calculations or to get real-time information.""", 
-                  tools=[get_weather, get_current_time, google_search, calculate_sum])
+                  tools=[get_weather, get_current_time, google_search, calculate_sum, fetch_tool_output])
 
     # This will use the custom model provider
     # result = await Runner.run(
@@ -111,13 +109,15 @@ async def main():
     #     run_config=RunConfig(model_provider=CUSTOM_MODEL_PROVIDER),
     # )
     # print(result.final_output)
+    GOVERNOR.reset_run()
     result = Runner.run_streamed(agent, 
                                 input="brad pitt有什麼新電影，台中上映的場次?" ,#"台中天氣如何? 請幫我查詢電影時刻，我想看電影",
                                 run_config=RunConfig(model_provider=CUSTOM_MODEL_PROVIDER))
     
-    async for event in result.stream_events():
-        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-            print(event.data.delta, end="", flush=True)
+    run_metrics = await consume_stream(result, default_model=MODEL_NAME)
+
+    print("\n" + GOVERNOR.format_report())
+    print(run_metrics.format())
 
     # If you uncomment this, it will use OpenAI directly, not the custom provider
     # result = await Runner.run(
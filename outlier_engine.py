@@ -0,0 +1,269 @@
+"""
+振動離群值引擎（numpy 向量化）。
+
+與「整天一組平均值 ± k·σ」不同，基準線依 (設備, 時間窗) 分組計算，並提供穩健方法：
+  - zscore : 各組平均值/標準差，以 GroupedWelford 一次走訪分批累積
+  - mad    : 中位數 / MAD（robust z = 0.6745·(x - median) / MAD）
+  - iqr    : Q1 - k·IQR 與 Q3 + k·IQR 之外，分數為超出圍籬的 IQR 倍數
+  - rolling: 各設備依時間排序，與前 N 筆的滾動平均/標準差比較
+
+所有方法都回傳依分數排序的前 top_k 筆異常。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+METHODS = ("zscore", "mad", "iqr", "rolling")
+DEFAULT_THRESHOLDS = {"zscore": 3.0, "mad": 3.5, "iqr": 1.5, "rolling": 3.0}
+
+# 常態分佈下 MAD 與標準差的換算常數
+_MAD_SCALE = 0.6745
+
+
+class GroupedWelford:
+    """依組別累積 count / mean / M2，每批資料以 bincount 向量化後再用 Chan 公式合併。"""
+
+    def __init__(self, n_groups: int = 0):
+        self.count = np.zeros(n_groups)
+        self.mean = np.zeros(n_groups)
+        self.m2 = np.zeros(n_groups)
+
+    def _grow(self, n_groups: int):
+        extra = n_groups - len(self.count)
+        if extra > 0:
+            self.count = np.concatenate([self.count, np.zeros(extra)])
+            self.mean = np.concatenate([self.mean, np.zeros(extra)])
+            self.m2 = np.concatenate([self.m2, np.zeros(extra)])
+
+    def update(self, values: np.ndarray, groups: np.ndarray | None = None):
+        values = np.asarray(values, dtype=float)
+        if groups is None:
+            groups = np.zeros(len(values), dtype=np.int64)
+        n_groups = int(groups.max()) + 1 if len(groups) else 0
+        self._grow(n_groups)
+        size = len(self.count)
+
+        b_count = np.bincount(groups, minlength=size).astype(float)
+        b_sum = np.bincount(groups, weights=values, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            b_mean = np.where(b_count > 0, b_sum / b_count, 0.0)
+        b_m2 = np.bincount(groups, weights=(values - b_mean[groups]) ** 2, minlength=size)
+
+        total = self.count + b_count
+        delta = b_mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = np.where(total > 0, self.mean + delta * b_count / total, 0.0)
+            self.m2 = np.where(
+                total > 0, self.m2 + b_m2 + delta ** 2 * self.count * b_count / total, 0.0
+            )
+        self.count = total
+
+    @property
+    def std(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(np.where(self.count > 0, self.m2 / self.count, 0.0))
+
+
+@dataclass
+class Anomaly:
+    index: int
+    value: float
+    score: float
+    group: str | None
+    window_start: np.datetime64 | None
+    center: float
+    scale: float
+
+    def as_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "value": self.value,
+            "score": round(self.score, 3),
+            "equipment": self.group,
+            "window_start": None if self.window_start is None else str(self.window_start),
+            "baseline_center": self.center,
+            "baseline_scale": self.scale,
+        }
+
+
+@dataclass
+class OutlierResult:
+    method: str
+    threshold: float
+    total_rows: int
+    total_outliers: int
+    anomalies: list[Anomaly] = field(default_factory=list)
+
+
+def _group_codes(n, groups, times, window):
+    """將 (設備, 時間窗) 組合轉為連續的整數代碼。"""
+    keys = []
+    if groups is not None:
+        group_codes = np.unique(np.asarray(groups), return_inverse=True)[1]
+        keys.append(group_codes.astype(np.int64))
+    if times is not None and window is not None:
+        buckets = _window_start(times, window).astype(np.int64)
+        keys.append(np.unique(buckets, return_inverse=True)[1].astype(np.int64))
+    if not keys:
+        return np.zeros(n, dtype=np.int64)
+    if len(keys) == 1:
+        return keys[0]
+    combined = keys[0] * (int(keys[1].max()) + 1) + keys[1]
+    return np.unique(combined, return_inverse=True)[1].astype(np.int64)
+
+
+def _window_start(times: np.ndarray, window) -> np.ndarray:
+    window = np.timedelta64(window).astype("timedelta64[ns]")
+    ns = times.astype("datetime64[ns]").astype(np.int64)
+    step = window.astype(np.int64)
+    return ((ns // step) * step).astype("datetime64[ns]")
+
+
+def _sorted_by_group(values: np.ndarray, codes: np.ndarray):
+    order = np.lexsort((values, codes))
+    sorted_codes = codes[order]
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    starts = np.searchsorted(sorted_codes, np.arange(n_groups), side="left")
+    counts = np.bincount(codes, minlength=n_groups)
+    return values[order], starts, counts
+
+
+def grouped_quantile(values: np.ndarray, codes: np.ndarray, q: float) -> np.ndarray:
+    """各組的分位數（線性內插），一次排序完成。"""
+    sorted_values, starts, counts = _sorted_by_group(values, codes)
+    pos = starts + (counts - 1) * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, starts + counts - 1)
+    frac = pos - lo
+    return sorted_values[lo] * (1 - frac) + sorted_values[hi] * frac
+
+
+def _scores(method, values, codes, times, rolling):
+    """回傳 (分數, 中心值, 尺度)，分數 > threshold 即為離群值。"""
+    if method == "zscore":
+        stats = GroupedWelford()
+        stats.update(values, codes)
+        center, scale = stats.mean[codes], stats.std[codes]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = np.where(scale > 0, np.abs(values - center) / scale, 0.0)
+        return score, center, scale
+
+    if method == "mad":
+        median = grouped_quantile(values, codes, 0.5)
+        deviation = np.abs(values - median[codes])
+        mad = grouped_quantile(deviation, codes, 0.5)
+        center, scale = median[codes], mad[codes]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            score = np.where(scale > 0, _MAD_SCALE * deviation / scale, 0.0)
+        return score, center, scale / _MAD_SCALE
+
+    if method == "iqr":
+        q1 = grouped_quantile(values, codes, 0.25)[codes]
+        q3 = grouped_quantile(values, codes, 0.75)[codes]
+        iqr = q3 - q1
+        beyond = np.maximum(q1 - values, values - q3)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # 分數 = 超出 Q1/Q3 的距離是 IQR 的幾倍，與 threshold（通常 1.5）直接比較
+            score = np.where(iqr > 0, np.maximum(beyond, 0.0) / iqr, 0.0)
+        return score, (q1 + q3) / 2, iqr
+
+    if method == "rolling":
+        return _rolling_scores(values, codes, times, rolling)
+
+    raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+
+
+def _rolling_scores(values, codes, times, window: int, min_periods: int = 5):
+    """各組依時間排序後，與前 window 筆（不含自己）的平均/標準差比較。"""
+    position = np.arange(len(values)) if times is None else times.astype(np.int64)
+    order = np.lexsort((position, codes))
+    x = values[order]
+    g = codes[order]
+    n = len(x)
+    idx = np.arange(n)
+    group_start = np.searchsorted(g, g, side="left")
+    lo = np.maximum(group_start, idx - window)
+    cnt = idx - lo
+
+    # 先減去整體平均值，降低累積和相減時的數值誤差
+    offset = x.mean() if n else 0.0
+    xc = x - offset
+    cs = np.concatenate([[0.0], np.cumsum(xc)])
+    cs2 = np.concatenate([[0.0], np.cumsum(xc * xc)])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_c = (cs[idx] - cs[lo]) / cnt
+        var = (cs2[idx] - cs2[lo]) / cnt - mean_c ** 2
+        std = np.sqrt(np.maximum(var, 0.0))
+        score = np.where((cnt >= min_periods) & (std > 0), np.abs(xc - mean_c) / std, 0.0)
+    mean = mean_c + offset
+
+    out_score = np.empty(n)
+    out_center = np.empty(n)
+    out_scale = np.empty(n)
+    out_score[order] = score
+    out_center[order] = np.nan_to_num(mean)
+    out_scale[order] = np.nan_to_num(std)
+    return out_score, out_center, out_scale
+
+
+def detect_outliers(
+    values,
+    times=None,
+    groups=None,
+    method: str = "mad",
+    threshold: float | None = None,
+    window=np.timedelta64(1, "h"),
+    rolling: int = 60,
+    top_k: int = 20,
+) -> OutlierResult:
+    """
+    values: 振動值；times: datetime64 陣列；groups: 設備識別（可為 None）。
+    window: 基準線的時間窗（None 表示整段資料一組）；rolling: 滾動法的前 N 筆。
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+    values = np.asarray(values, dtype=float)
+    times = None if times is None else np.asarray(times, dtype="datetime64[ns]")
+    result = OutlierResult(method=method, threshold=threshold, total_rows=len(values), total_outliers=0)
+    if not len(values):
+        return result
+
+    valid = np.isfinite(values)
+    index = np.flatnonzero(valid)
+    values = values[valid]
+    times = None if times is None else times[valid]
+    group_arr = None if groups is None else np.asarray(groups)[valid]
+
+    # 滾動法的基準線本身就是時間窗，只依設備分組
+    codes = _group_codes(len(values), group_arr, times, None if method == "rolling" else window)
+    score, center, scale = _scores(method, values, codes, times, rolling)
+
+    hits = np.flatnonzero(score > threshold)
+    result.total_outliers = int(len(hits))
+    if not len(hits):
+        return result
+    if len(hits) > top_k:
+        hits = hits[np.argpartition(-score[hits], top_k - 1)[:top_k]]
+    hits = hits[np.argsort(-score[hits], kind="stable")]
+
+    starts = None
+    if times is not None and window is not None and method != "rolling":
+        starts = _window_start(times[hits], window)
+    for pos, i in enumerate(hits):
+        result.anomalies.append(
+            Anomaly(
+                index=int(index[i]),
+                value=float(values[i]),
+                score=float(score[i]),
+                group=None if group_arr is None else str(group_arr[i]),
+                window_start=None if starts is None else starts[pos],
+                center=float(center[i]),
+                scale=float(scale[i]),
+            )
+        )
+    return result
@@ -0,0 +1,364 @@
+"""
+工具輸出治理（output governor）：限制每個工具與每次執行（run）送進模型 context 的 token 數。
+
+超出預算時可選擇的策略：
+  - truncate: 保留開頭與結尾幾行，中間截斷
+  - summary : 行數與數值統計摘要，加上前幾行預覽
+  - handle  : 完整內容留在本地，只回傳 handle，模型可用 fetch_tool_output 分頁讀取
+
+使用方式：
+    @function_tool
+    @GOVERNOR.wrap()
+    def get_vibration_all_on_date(date_str: str): ...
+
+    GOVERNOR.wrap_mcp_server(server)   # MCP 工具結果
+    print(GOVERNOR.format_report())    # 每個工具節省的 token 數
+
+環境變數：
+  - TOOL_OUTPUT_TOKEN_BUDGET (預設 1500)
+  - RUN_OUTPUT_TOKEN_BUDGET  (預設 6000)
+  - TOOL_OUTPUT_STRATEGY     (預設 summary)
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import math
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+STRATEGIES = ("truncate", "summary", "handle")
+
+# 中日韓文字大約一字一個 token，其他字元約四個一個 token
+_CJK_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估文字的 token 數（不依賴 tokenizer）。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+@dataclass
+class ToolUsage:
+    calls: int = 0
+    governed_calls: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+class OutputGovernor:
+    def __init__(
+        self,
+        tool_budget: int = 1500,
+        run_budget: int = 6000,
+        strategy: str = "summary",
+        min_budget: int = 200,
+        max_handles: int = 32,
+    ):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+        self.tool_budget = tool_budget
+        self.run_budget = run_budget
+        self.strategy = strategy
+        # 即使整個 run 的預算用完，仍保留最少的額度讓模型看得到摘要
+        self.min_budget = min_budget
+        self.max_handles = max_handles
+        self._tool_budgets: dict[str, int] = {}
+        self._tool_strategies: dict[str, str] = {}
+        self._handles: OrderedDict[str, str] = OrderedDict()
+        self._usage: dict[str, ToolUsage] = {}
+        self._run_used = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "OutputGovernor":
+        return cls(
+            tool_budget=int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "1500")),
+            run_budget=int(os.getenv("RUN_OUTPUT_TOKEN_BUDGET", "6000")),
+            strategy=os.getenv("TOOL_OUTPUT_STRATEGY", "summary"),
+        )
+
+    def configure_tool(self, tool_name: str, budget: int | None = None, strategy: str | None = None):
+        """設定單一工具的預算或策略。"""
+        if strategy is not None and strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+        with self._lock:
+            if budget is not None:
+                self._tool_budgets[tool_name] = budget
+            if strategy is not None:
+                self._tool_strategies[tool_name] = strategy
+
+    def budget_for(self, tool_name: str) -> int:
+        """此工具下一次輸出可用的 token 預算（工具預算與 run 剩餘預算取小）。
+
+        讓工具自行把結構化輸出（例如 JSON）縮到預算內，而不是交給 govern 截斷。
+        """
+        with self._lock:
+            run_left = max(self.run_budget - self._run_used, self.min_budget)
+            return min(self._tool_budgets.get(tool_name, self.tool_budget), run_left)
+
+    def reset_run(self):
+        """開始新的 run 時呼叫，重設 run 層級的預算（統計資料保留）。"""
+        with self._lock:
+            self._run_used = 0
+
+    # ------------------------------------------------------------------
+    # 核心：對單一工具輸出套用預算
+    # ------------------------------------------------------------------
+    def govern(self, tool_name: str, output: Any) -> Any:
+        if output is None:
+            return output
+        text = output if isinstance(output, str) else _to_text(output)
+        tokens = estimate_tokens(text)
+
+        with self._lock:
+            usage = self._usage.setdefault(tool_name, ToolUsage())
+            usage.calls += 1
+            usage.tokens_in += tokens
+            run_left = max(self.run_budget - self._run_used, self.min_budget)
+            budget = min(self._tool_budgets.get(tool_name, self.tool_budget), run_left)
+            strategy = self._tool_strategies.get(tool_name, self.strategy)
+
+        if tokens <= budget:
+            governed, out_tokens = output, tokens
+        else:
+            handle = self._store(text)
+            if strategy == "truncate" and not _is_json(text):
+                governed = _truncate(text, budget, handle)
+            elif strategy in ("truncate", "handle"):
+                # JSON 截斷後就無法解析，改為只回傳 handle 讓模型分頁讀取
+                governed = _handle_only(text, budget, handle)
+            else:
+                governed = _summarize(text, budget, handle)
+            out_tokens = estimate_tokens(governed)
+
+        with self._lock:
+            usage.tokens_out += out_tokens
+            self._run_used += out_tokens
+            if governed is not output:
+                usage.governed_calls += 1
+        return governed
+
+    def _store(self, text: str) -> str:
+        handle = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._handles[handle] = text
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+        return handle
+
+    def fetch(self, handle: str, offset: int = 0, limit: int = 50) -> str:
+        """依 handle 取回完整輸出的第 offset 行起 limit 行。"""
+        with self._lock:
+            text = self._handles.get(handle)
+        if text is None:
+            return f"找不到 handle {handle}（可能已過期）。"
+        lines = text.splitlines()
+        offset = max(offset, 0)
+        chunk = lines[offset:offset + max(limit, 1)]
+        end = offset + len(chunk)
+        header = f"[handle {handle}] 第 {offset + 1}-{end} 行，共 {len(lines)} 行"
+        if end < len(lines):
+            header += f"，下一頁 offset={end}"
+        return header + "\n" + "\n".join(chunk)
+
+    # ------------------------------------------------------------------
+    # 套用到 function tools 與 MCP servers
+    # ------------------------------------------------------------------
+    def wrap(self, name: str | None = None, budget: int | None = None, strategy: str | None = None):
+        """裝飾器：放在 @function_tool 之下，保留原函式簽章與 docstring。"""
+
+        def decorator(func: Callable) -> Callable:
+            tool_name = name or func.__name__
+            if budget is not None or strategy is not None:
+                self.configure_tool(tool_name, budget=budget, strategy=strategy)
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    return self.govern(tool_name, await func(*args, **kwargs))
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return self.govern(tool_name, func(*args, **kwargs))
+
+            return wrapper
+
+        return decorator
+
+    def wrap_mcp_server(self, server):
+        """替換 server.call_tool，讓 MCP 工具回傳的文字內容也受預算限制。"""
+        call_tool = server.call_tool
+
+        async def governed_call_tool(tool_name: str, arguments: dict[str, Any] | None, *args, **kwargs):
+            result = await call_tool(tool_name, arguments, *args, **kwargs)
+            content = getattr(result, "content", None)
+            if not content:
+                return result
+            governed_name = f"mcp:{server.name}:{tool_name}"
+            new_content = []
+            for item in content:
+                text = getattr(item, "text", None)
+                if isinstance(text, str):
+                    governed = self.govern(governed_name, text)
+                    if governed is not text:
+                        item = item.model_copy(update={"text": governed})
+                new_content.append(item)
+            return result.model_copy(update={"content": new_content})
+
+        server.call_tool = governed_call_tool
+        return server
+
+    def fetch_tool(self):
+        """回傳可讓模型依 handle 分頁讀取完整輸出的 function tool。"""
+        from agents import function_tool
+
+        @function_tool
+        def fetch_tool_output(handle: str, offset: int = 0, limit: int = 50) -> str:
+            """
+            依 handle 讀取先前被截斷或摘要的完整工具輸出。
+            offset: 起始行（從 0 開始），limit: 讀取行數
+            """
+            print(f"[debug] fetching tool output {handle} offset={offset} limit={limit}")
+            return self.fetch(handle, offset, limit)
+
+        return fetch_tool_output
+
+    # ------------------------------------------------------------------
+    # 報表
+    # ------------------------------------------------------------------
+    def report(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                name: {
+                    "calls": u.calls,
+                    "governed_calls": u.governed_calls,
+                    "tokens_in": u.tokens_in,
+                    "tokens_out": u.tokens_out,
+                    "tokens_saved": u.tokens_saved,
+                }
+                for name, u in self._usage.items()
+            }
+
+    def format_report(self) -> str:
+        report = self.report()
+        if not report:
+            return "[governor] 沒有工具輸出。"
+        lines = ["[governor] tool              calls  in_tok  out_tok  saved"]
+        for name, u in report.items():
+            lines.append(
+                f"[governor] {name:<18}{u['calls']:>5}{u['tokens_in']:>8}{u['tokens_out']:>9}{u['tokens_saved']:>7}"
+            )
+        total_saved = sum(u["tokens_saved"] for u in report.values())
+        lines.append(f"[governor] total tokens saved: {total_saved}")
+        return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# 策略實作
+# ----------------------------------------------------------------------
+def _to_text(output: Any) -> str:
+    if hasattr(output, "model_dump"):
+        output = output.model_dump()
+    try:
+        return json.dumps(output, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(output)
+
+
+def _take_lines(lines, budget: int) -> tuple[list[str], int]:
+    taken, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        taken.append(line)
+        used += cost
+    return taken, used
+
+
+def _is_json(text: str) -> bool:
+    stripped = text.lstrip()
+    if not stripped.startswith(("{", "[")):
+        return False
+    try:
+        json.loads(stripped)
+    except ValueError:
+        return False
+    return True
+
+
+def _truncate(text: str, budget: int, handle: str) -> str:
+    lines = text.splitlines()
+    note_budget = 40
+    body_budget = max(budget - note_budget, 0)
+    head, used = _take_lines(lines, body_budget * 2 // 3)
+    tail, _ = _take_lines(reversed(lines[len(head):]), body_budget - used)
+    tail.reverse()
+    omitted = len(lines) - len(head) - len(tail)
+    if len(lines) <= 1 and not head:
+        # 單一超長行：以字元截斷
+        keep = max(body_budget * 3, 0)
+        return f"{text[:keep]}\n...（輸出已截斷，完整內容 handle={handle}）"
+    note = f"...（省略 {omitted} 行，完整內容 handle={handle}）..."
+    return "\n".join(head + [note] + tail)
+
+
+def _summarize(text: str, budget: int, handle: str) -> str:
+    return summarize_text(text, budget, f"完整內容 handle={handle}")
+
+
+def summarize_text(text: str, budget: int, note: str = "") -> str:
+    """行數、每行末欄數值統計，加上預算內的前幾行預覽。"""
+    lines = text.splitlines()
+    values = []
+    for line in lines:
+        # 每行取最後一個數字（例如 "Time: ..., vibration: 0.12" 的振動值）
+        found = _NUMBER_RE.findall(line)
+        if found:
+            values.append(float(found[-1]))
+    summary = [f"[摘要] 共 {len(lines)} 行，約 {estimate_tokens(text)} tokens" + (f"，{note}" if note else "")]
+    if values:
+        n = len(values)
+        mean = sum(values) / n
+        std = (sum((v - mean) ** 2 for v in values) / n) ** 0.5
+        summary.append(
+            f"[摘要] 每行末欄數值：count={n}, min={min(values):.6g}, max={max(values):.6g}, "
+            f"mean={mean:.6g}, std={std:.6g}"
+        )
+    preview_budget = budget - estimate_tokens("\n".join(summary)) - 10
+    preview, _ = _take_lines(lines, max(preview_budget, 0))
+    if preview:
+        summary.append(f"[前 {len(preview)} 行]")
+        summary.extend(preview)
+    return "\n".join(summary)
+
+
+def _handle_only(text: str, budget: int, handle: str) -> str:
+    lines = text.splitlines()
+    header = (
+        f"[輸出過大] 共 {len(lines)} 行，約 {estimate_tokens(text)} tokens。"
+        f"請用 fetch_tool_output(handle=\"{handle}\") 分頁讀取。"
+    )
+    preview, _ = _take_lines(lines, min(max(budget - estimate_tokens(header), 0), 100))
+    return "\n".join([header] + preview)
+
+
+GOVERNOR = OutputGovernor.from_env()
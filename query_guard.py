@@ -0,0 +1,267 @@
+"""
+資料庫查詢的時間上限與取消：避免單一重量級查詢（例如忙碌日的整天 SELECT）卡住工具呼叫與連線。
+
+  - 每次工具呼叫有自己的期限（預設 DB_QUERY_TIMEOUT 秒，可依工具設定），
+    同一次呼叫開的所有連線共用這個期限
+  - 連線建立時把剩餘時間設成 session 的 MAX_EXECUTION_TIME（MariaDB 為 max_statement_time），
+    由伺服器中止逾時的 SELECT；driver 的 socket timeout 設為剩餘時間加上寬限
+  - 監看計時器：超過期限加寬限仍未結束時，另開連線送出 KILL QUERY（涵蓋不受 MAX_EXECUTION_TIME 限制的語句）
+  - agent 執行被取消時呼叫 cancel_all()，對所有進行中的查詢送出 KILL QUERY，
+    伺服器上的查詢會一起停止，不會在背景繼續佔用連線
+  - 被中止的查詢以 describe() 轉成模型看得懂的 [timeout] / [cancelled] 說明，而不是 driver 的錯誤碼
+
+使用方式：
+    @QUERY_GUARD.limit()                      # 以函式名稱套用該工具的時間上限
+    def get_vibration_max_on_date(date_str): ...
+
+    conn = QUERY_GUARD.attach(raw_conn, kill=kill_query)   # vibration_db.connect() 內使用
+    message = QUERY_GUARD.describe(e)         # 逾時或取消時回傳說明，其他錯誤回傳 None
+    QUERY_GUARD.cancel_all()                  # agent 執行被取消時
+
+環境變數：
+  - DB_QUERY_TIMEOUT   每次工具呼叫的預設秒數（預設 30）
+  - DB_QUERY_TIMEOUTS  個別工具的秒數，例如 "analyze_vibration_fleet=120,get_vibration_all_on_date=20"
+  - DB_QUERY_GRACE     伺服器端逾時之後，再等幾秒才由監看計時器 KILL QUERY（預設 2）
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+# MySQL：3024 超過 MAX_EXECUTION_TIME、1317 查詢被中斷（KILL QUERY）、2013 查詢中連線中斷（socket timeout）
+# MariaDB：1969 超過 max_statement_time
+TIMEOUT_ERRNOS = (3024, 1969)
+INTERRUPTED_ERRNOS = (1317, 2013)
+
+
+class QueryTimeout(Exception):
+    """工具呼叫的查詢期限已過，不再開新的連線。"""
+
+
+@dataclass
+class QueryScope:
+    """一次工具呼叫的期限；reason 在查詢被中止時設為 "timeout" 或 "cancelled"。"""
+
+    name: str
+    timeout_s: float
+    deadline: float
+    reason: str | None = None
+    killed: int = 0
+
+    @property
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
+
+
+@dataclass
+class _Active:
+    scope: QueryScope
+    connection_id: int | None
+    kill: Callable[[int], None] | None
+    timer: threading.Timer | None = None
+    started: float = field(default_factory=time.monotonic)
+
+
+class _GuardedConnection:
+    """代理 driver 的連線：關閉時取消監看計時器並從進行中清單移除，其餘屬性直接轉送。"""
+
+    def __init__(self, guard: "QueryGuard", conn, active: _Active):
+        self._guard = guard
+        self._conn = conn
+        self._active = active
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        self._guard._release(self._active)
+        try:
+            self._conn.close()
+        except Exception as e:
+            # 被中止的查詢可能留下斷線的連線，關閉失敗不影響工具回傳的說明
+            if self._active.scope.reason is None:
+                raise
+            print(f"[debug] closing interrupted connection: {e}")
+
+
+class QueryGuard:
+    def __init__(self, timeout_s: float = 30.0, tool_timeouts: dict[str, float] | None = None, grace_s: float = 2.0):
+        self.timeout_s = timeout_s
+        self.grace_s = grace_s
+        self._tool_timeouts: dict[str, float] = dict(tool_timeouts or {})
+        self._scope: contextvars.ContextVar[QueryScope | None] = contextvars.ContextVar("query_scope", default=None)
+        self._active: dict[int, _Active] = {}
+        self._session_variable: str | None = "MAX_EXECUTION_TIME"
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "QueryGuard":
+        tool_timeouts = {}
+        for item in os.getenv("DB_QUERY_TIMEOUTS", "").split(","):
+            name, _, seconds = item.partition("=")
+            if name.strip() and seconds.strip():
+                tool_timeouts[name.strip()] = float(seconds)
+        return cls(
+            timeout_s=float(os.getenv("DB_QUERY_TIMEOUT", "30")),
+            tool_timeouts=tool_timeouts,
+            grace_s=float(os.getenv("DB_QUERY_GRACE", "2")),
+        )
+
+    def configure_tool(self, tool_name: str, timeout_s: float):
+        with self._lock:
+            self._tool_timeouts[tool_name] = timeout_s
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self._tool_timeouts.get(tool_name, self.timeout_s)
+
+    # ------------------------------------------------------------------
+    # 期限
+    # ------------------------------------------------------------------
+    def limit(self, name: str | None = None):
+        """裝飾查詢函式：呼叫期間的所有連線共用同一個期限（巢狀呼叫沿用外層期限）。"""
+
+        def decorator(func: Callable) -> Callable:
+            tool_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if self._scope.get() is not None:
+                    return func(*args, **kwargs)
+                with self.scoped(tool_name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextlib.contextmanager
+    def scoped(self, name: str, timeout_s: float | None = None):
+        """建立獨立的期限（例如 scatter-gather 時每個資料來源各自計時）。"""
+        timeout_s = self.timeout_for(name) if timeout_s is None else timeout_s
+        scope = QueryScope(name, timeout_s, time.monotonic() + timeout_s)
+        token = self._scope.set(scope)
+        try:
+            yield scope
+        finally:
+            self._scope.reset(token)
+
+    def current(self) -> QueryScope:
+        """目前工具呼叫的期限；不在 limit() 範圍內（背景監控、命令列）時使用預設秒數。"""
+        scope = self._scope.get()
+        if scope is None:
+            scope = QueryScope("-", self.timeout_s, time.monotonic() + self.timeout_s)
+        return scope
+
+    # ------------------------------------------------------------------
+    # 連線
+    # ------------------------------------------------------------------
+    def attach(self, conn, kill: Callable[[int], None] | None = None, scope: QueryScope | None = None):
+        """
+        設定 session 的執行時間上限並開始監看；回傳的連線在 close() 時結束監看。
+        kill(connection_id) 由呼叫端提供（需要另開一條連線送出 KILL QUERY）。
+        """
+        scope = scope or self.current()
+        remaining = scope.remaining
+        if remaining <= 0:
+            conn.close()
+            scope.reason = scope.reason or "timeout"
+            raise QueryTimeout(f"{scope.name} exceeded {scope.timeout_s:g}s before connecting")
+        self._set_session_limit(conn, remaining)
+
+        active = _Active(scope, getattr(conn, "connection_id", None), kill)
+        if active.connection_id is not None and kill is not None:
+            active.timer = threading.Timer(remaining + self.grace_s, self._interrupt, (active, "timeout"))
+            active.timer.daemon = True
+        with self._lock:
+            self._active[id(active)] = active
+        if active.timer is not None:
+            active.timer.start()
+        return _GuardedConnection(self, conn, active)
+
+    def _set_session_limit(self, conn, remaining: float):
+        # MySQL 5.7.8+ 用 MAX_EXECUTION_TIME（毫秒），MariaDB 用 max_statement_time（秒）；都不支援時只靠監看計時器
+        variable = self._session_variable
+        while variable is not None:
+            value = max(int(remaining * 1000), 1) if variable == "MAX_EXECUTION_TIME" else max(remaining, 0.001)
+            cursor = None
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"SET SESSION {variable} = {value}")
+                return
+            except Exception as e:
+                variable = "max_statement_time" if variable == "MAX_EXECUTION_TIME" else None
+                print(f"[debug] session time limit not supported ({e}), trying {variable or 'watchdog only'}")
+                self._session_variable = variable
+            finally:
+                if cursor is not None:
+                    cursor.close()
+
+    def _release(self, active: _Active):
+        with self._lock:
+            self._active.pop(id(active), None)
+        if active.timer is not None:
+            active.timer.cancel()
+
+    def _interrupt(self, active: _Active, reason: str) -> bool:
+        with self._lock:
+            if self._active.pop(id(active), None) is None:
+                return False
+        active.scope.reason = active.scope.reason or reason
+        active.scope.killed += 1
+        if active.timer is not None:
+            active.timer.cancel()
+        if active.connection_id is None or active.kill is None:
+            return False
+        elapsed = time.monotonic() - active.started
+        print(f"[debug] KILL QUERY {active.connection_id} ({active.scope.name}, {reason} after {elapsed:.1f}s)")
+        try:
+            active.kill(active.connection_id)
+            return True
+        except Exception as e:
+            print(f"[debug] KILL QUERY {active.connection_id} failed: {e}")
+            return False
+
+    def cancel_all(self, reason: str = "cancelled") -> int:
+        """中止所有進行中的查詢（agent 執行被取消時呼叫），回傳送出 KILL QUERY 的數量。"""
+        with self._lock:
+            active = list(self._active.values())
+        return sum(self._interrupt(item, reason) for item in active)
+
+    @property
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    # ------------------------------------------------------------------
+    # 錯誤說明
+    # ------------------------------------------------------------------
+    def describe(self, error: Exception, partial: str = "") -> str | None:
+        """逾時或取消時回傳給模型的說明；其他錯誤回傳 None（由呼叫端照原本方式處理）。"""
+        scope = self._scope.get()
+        reason = scope.reason if scope is not None else None
+        errno = getattr(error, "errno", None)
+        if reason is None:
+            if isinstance(error, QueryTimeout) or errno in TIMEOUT_ERRNOS:
+                reason = "timeout"
+            elif errno in INTERRUPTED_ERRNOS:
+                reason = "cancelled"
+            else:
+                return None
+        if reason == "cancelled":
+            return f"[cancelled] 執行已取消，資料庫查詢已中止。{partial}"
+        timeout_s = scope.timeout_s if scope is not None else self.timeout_s
+        name = scope.name if scope is not None else "-"
+        return (
+            f"[timeout] 查詢超過 {timeout_s:g} 秒已中止（{name} 的時間上限）。{partial}"
+            "請縮小日期範圍、指定設備，或改用彙總工具（analyze_vibration_on_date、get_vibration_stats_by_equipment）。"
+        )
+
+
+QUERY_GUARD = QueryGuard.from_env()
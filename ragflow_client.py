@@ -0,0 +1,213 @@
+"""
+RAGFlow 對話客戶端：重複使用 chat 與 session，並以真正的增量（delta）串流回答。
+
+原本的 ragflow_api.py 每次執行都 list_chats + create_session，而 RAGFlow 原生的
+/chats/{chat_id}/completions 串流每個事件都帶著「到目前為止的完整回答」，
+客戶端每個 chunk 都要解析整段文字，回答越長越慢（總成本與長度平方成正比）。
+
+兩種傳輸方式：
+  - "openai"（預設）：RAGFlow 的 OpenAI 相容端點 /api/v1/chats_openai/{chat_id}，
+    每個 chunk 只帶新增的文字；對話歷史由本地 session 保存，每次請求附上最近幾輪
+  - "sdk"：ragflow_sdk 的 session.ask，伺服器端保存歷史；仍是累積內容，
+    但以 DeltaTracker 只取新增部分，不在客戶端重複處理整段回答
+
+session 從大小為 pool_size 的池中取得，同時只有一個問題使用同一個 session；
+回答超過 max_turns 輪的 session 會被換成新的，避免歷史無限增長。
+
+使用方式：
+    client = RAGFlowClient.from_settings()
+    async for delta in client.ask("請介紹公司產品"):
+        print(delta, end="", flush=True)
+    text = await client.answer("保固期多久？")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from openai import AsyncOpenAI
+
+from settings import RAGFLOW_ADDRESS, RAGFLOW_API_KEY, RAGFLOW_CHAT_ID
+
+TRANSPORTS = ("openai", "sdk")
+_END = object()
+
+
+class DeltaTracker:
+    """把累積內容轉成增量：只切出新增的部分，不保留或比對整段文字。"""
+
+    def __init__(self):
+        self.length = 0
+
+    def feed(self, content: str) -> str:
+        if len(content) < self.length:
+            # 伺服器重寫了回答（例如最後補上引用），整段重新輸出
+            self.length = len(content)
+            return content
+        delta = content[self.length:]
+        self.length = len(content)
+        return delta
+
+
+@dataclass
+class RAGFlowSession:
+    key: int
+    # sdk 傳輸的遠端 session；openai 傳輸為 None
+    remote: Any = None
+    history: list[dict[str, str]] = field(default_factory=list)
+    turns: int = 0
+
+
+class RAGFlowClient:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        chat_id: str,
+        transport: str = "openai",
+        pool_size: int = 4,
+        max_turns: int = 20,
+        history_turns: int = 5,
+        model: str = "model",
+    ):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport!r}, expected one of {TRANSPORTS}")
+        if not api_key or not base_url or not chat_id:
+            raise ValueError("Please set ragflow_api_key, ragflow_address, chat_id via env var or code.")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.chat_id = chat_id
+        self.transport = transport
+        self.pool_size = pool_size
+        self.max_turns = max_turns
+        self.history_turns = history_turns
+        # RAGFlow 的 OpenAI 相容端點不看 model 名稱，但欄位必填
+        self.model = model
+        self._openai: AsyncOpenAI | None = None
+        self._chat = None
+        self._idle: asyncio.Queue[RAGFlowSession] | None = None
+        self._created = 0
+        self._keys = itertools.count(1)
+
+    @classmethod
+    def from_settings(cls, **kwargs) -> "RAGFlowClient":
+        return cls(RAGFLOW_API_KEY, RAGFLOW_ADDRESS, RAGFLOW_CHAT_ID, **kwargs)
+
+    # ------------------------------------------------------------------
+    # chat / session 池
+    # ------------------------------------------------------------------
+    def _openai_client(self) -> AsyncOpenAI:
+        if self._openai is None:
+            self._openai = AsyncOpenAI(
+                api_key=self.api_key, base_url=f"{self.base_url}/api/v1/chats_openai/{self.chat_id}"
+            )
+        return self._openai
+
+    async def _get_chat(self):
+        """list_chats 只在第一次需要時呼叫一次。"""
+        if self._chat is None:
+            from ragflow_sdk import RAGFlow
+
+            rag = RAGFlow(api_key=self.api_key, base_url=self.base_url)
+            chats = await asyncio.to_thread(rag.list_chats, id=self.chat_id)
+            if not chats:
+                raise ValueError(f"RAGFlow chat {self.chat_id} not found.")
+            self._chat = chats[0]
+        return self._chat
+
+    async def _new_session(self) -> RAGFlowSession:
+        session = RAGFlowSession(key=next(self._keys))
+        if self.transport == "sdk":
+            chat = await self._get_chat()
+            session.remote = await asyncio.to_thread(chat.create_session, name=f"agent_session_{session.key}")
+        return session
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        """從池中取得 session；池滿時等待其他問題用完。"""
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if not self._idle.empty():
+            session = self._idle.get_nowait()
+        elif self._created < self.pool_size:
+            self._created += 1
+            try:
+                session = await self._new_session()
+            except BaseException:
+                self._created -= 1
+                raise
+        else:
+            session = await self._idle.get()
+
+        try:
+            yield session
+        finally:
+            if session.turns >= self.max_turns:
+                self._created -= 1
+            else:
+                self._idle.put_nowait(session)
+
+    # ------------------------------------------------------------------
+    # 串流
+    # ------------------------------------------------------------------
+    async def ask(self, question: str) -> AsyncIterator[str]:
+        """以非同步迭代器逐段回傳回答的新增文字。"""
+        async with self.session() as session:
+            parts: list[str] = []
+            stream = self._stream_openai if self.transport == "openai" else self._stream_sdk
+            async for delta in stream(session, question):
+                parts.append(delta)
+                yield delta
+            session.turns += 1
+            session.history += [
+                {"role": "user", "content": question},
+                {"role": "assistant", "content": "".join(parts)},
+            ]
+            del session.history[: -2 * self.history_turns]
+
+    async def answer(self, question: str) -> str:
+        return "".join([delta async for delta in self.ask(question)])
+
+    async def _stream_openai(self, session: RAGFlowSession, question: str) -> AsyncIterator[str]:
+        stream = await self._openai_client().chat.completions.create(
+            model=self.model,
+            messages=session.history + [{"role": "user", "content": question}],
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def _stream_sdk(self, session: RAGFlowSession, question: str) -> AsyncIterator[str]:
+        """ragflow_sdk 是同步的 requests 串流，在背景執行緒讀取，事件經 Queue 轉回 event loop。"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def produce():
+            try:
+                for message in session.remote.ask(question, stream=True):
+                    loop.call_soon_threadsafe(queue.put_nowait, message.content)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+        reader = loop.run_in_executor(None, produce)
+        tracker = DeltaTracker()
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            delta = tracker.feed(item)
+            if delta:
+                yield delta
+        await reader
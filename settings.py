@@ -0,0 +1,42 @@
+"""
+共用設定：.env 與環境變數只在第一次 import 時讀取一次，
+agent 腳本、vibration_db、upload_data 等模組都從這裡取得連線參數，
+不需要為了設定而 import upload_data（以及它的 pandas / sqlalchemy）。
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+# 載入 .env 檔案
+load_dotenv()
+
+# OpenAI 相容的模型服務
+BASE_URL = os.getenv("EXAMPLE_BASE_URL") or ""
+API_KEY = os.getenv("EXAMPLE_API_KEY") or ""
+MODEL_NAME = os.getenv("EXAMPLE_MODEL_NAME") or ""
+# 離線回放 cassette 時不會連線模型服務（見 cassette.py），只需要讓 client 能建立
+if os.getenv("CASSETTE_MODE") == "replay":
+    API_KEY = API_KEY or "replay"
+
+#SQL connectation inf
+MYSQL_HOST = os.getenv('MYSQL_HOST')
+MYSQL_PORT = int(os.getenv('MYSQL_PORT', '3306'))
+MYSQL_USER = os.getenv('MYSQL_USER')
+MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
+MYSQL_DB = os.getenv('MYSQL_DB')  # 若不存在會自動建立
+MYSQL_TABLE = os.getenv('MYSQL_TABLE')
+
+# RAGFlow 知識庫對話
+RAGFLOW_API_KEY = os.getenv("ragflow_api_key")
+RAGFLOW_ADDRESS = os.getenv("ragflow_address")
+RAGFLOW_CHAT_ID = os.getenv("chat_id")
+
+
+def require_model_settings():
+    if os.getenv("CASSETTE_MODE") == "replay":
+        return
+    if not BASE_URL or not API_KEY or not MODEL_NAME:
+        raise ValueError(
+            "Please set EXAMPLE_BASE_URL, EXAMPLE_API_KEY, EXAMPLE_MODEL_NAME via env var or code."
+        )
@@ -0,0 +1,368 @@
+"""
+串流輸出與效能指標：取代各入口腳本中只印出 ResponseTextDeltaEvent 的迴圈，
+同時記錄每次執行（run）的：
+  - 每個模型回合（turn）的首個 token 延遲（ttft）、首個事件延遲、生成速率（tokens/s）、回合耗時
+  - 回合數、使用者看到第一個字的時間
+  - 工具呼叫耗時（tool_called → tool_output）與 handoff 耗時（handoff_requested → 新 agent 的第一個事件）
+指標依 (指標, agent, 模型/工具) 彙整成直方圖，可存檔並比較兩次的結果。
+
+使用方式：
+    result = Runner.run_streamed(agent, input=...)
+    run = await consume_stream(result)
+    print(run.format())
+
+命令列：
+    python stream_metrics.py show metrics.json
+    python stream_metrics.py compare baseline.json metrics.json
+
+環境變數：
+  - STREAM_METRICS_FILE  設定時每次 run 結束後把直方圖合併寫入該檔案
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+
+from output_governor import estimate_tokens
+
+# 1-2-5 對數刻度的直方圖邊界（秒或 tokens/s 都適用）
+BUCKETS = tuple(m * 10.0**e for e in range(-3, 5) for m in (1, 2, 5))
+MAX_SAMPLES = 2000
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        # 保留最近的樣本以計算百分位數
+        self.samples: list[float] = []
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        index = next((i for i, bound in enumerate(BUCKETS) if value <= bound), len(BUCKETS))
+        self.buckets[index] += 1
+        self.samples.append(value)
+        if len(self.samples) > MAX_SAMPLES:
+            del self.samples[: len(self.samples) - MAX_SAMPLES]
+
+    def merge(self, other: "Histogram"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.samples = (self.samples + other.samples)[-MAX_SAMPLES:]
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return math.nan
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "buckets": self.buckets,
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Histogram":
+        hist = cls()
+        hist.count = data["count"]
+        hist.total = data["total"]
+        hist.min = math.inf if data["min"] is None else data["min"]
+        hist.max = -math.inf if data["max"] is None else data["max"]
+        hist.buckets = list(data["buckets"])
+        hist.samples = list(data["samples"])
+        return hist
+
+
+class MetricsStore:
+    """以 "指標|agent|模型" 為 key 的直方圖集合。"""
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.histograms: dict[str, Histogram] = {}
+
+    @classmethod
+    def from_env(cls) -> "MetricsStore":
+        return cls(os.getenv("STREAM_METRICS_FILE") or None)
+
+    def add(self, metric: str, agent: str, model: str, value: float | None):
+        if value is None:
+            return
+        key = f"{metric}|{agent}|{model}"
+        self.histograms.setdefault(key, Histogram()).add(value)
+
+    def merge(self, other: "MetricsStore"):
+        for key, hist in other.histograms.items():
+            self.histograms.setdefault(key, Histogram()).merge(hist)
+
+    def dump(self, path: str | None = None):
+        """合併寫入檔案（檔案已存在時累加上去）。"""
+        path = path or self.path
+        if not path:
+            return
+        merged = MetricsStore.load(path) if os.path.exists(path) else MetricsStore()
+        merged.merge(self)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({key: hist.as_dict() for key, hist in merged.histograms.items()}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "MetricsStore":
+        store = cls(path)
+        with open(path, encoding="utf-8") as f:
+            store.histograms = {key: Histogram.from_dict(data) for key, data in json.load(f).items()}
+        return store
+
+    def format(self) -> str:
+        lines = [f"{'metric|agent|model':<60} {'n':>5} {'p50':>9} {'p95':>9} {'max':>9}"]
+        for key in sorted(self.histograms):
+            h = self.histograms[key]
+            lines.append(
+                f"{key:<60} {h.count:>5} {h.percentile(0.5):>9.3f} {h.percentile(0.95):>9.3f} {h.max:>9.3f}"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def compare(baseline: "MetricsStore", current: "MetricsStore") -> str:
+        lines = [f"{'metric|agent|model':<60} {'base p50':>9} {'new p50':>9} {'Δ%':>7} {'base p95':>9} {'new p95':>9} {'Δ%':>7}"]
+
+        def pct(old: float, new: float) -> str:
+            return f"{(new - old) / old * 100:+.0f}" if old else "-"
+
+        for key in sorted(set(baseline.histograms) | set(current.histograms)):
+            old, new = baseline.histograms.get(key), current.histograms.get(key)
+            if old is None or new is None:
+                lines.append(f"{key:<60} {'only in ' + ('new' if old is None else 'baseline'):>29}")
+                continue
+            o50, n50, o95, n95 = old.percentile(0.5), new.percentile(0.5), old.percentile(0.95), new.percentile(0.95)
+            lines.append(
+                f"{key:<60} {o50:>9.3f} {n50:>9.3f} {pct(o50, n50):>7} {o95:>9.3f} {n95:>9.3f} {pct(o95, n95):>7}"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class TurnMetrics:
+    agent: str
+    started: float
+    first_event: float
+    model: str = "default"
+    first_delta: float | None = None
+    ended: float | None = None
+    text: list[str] = field(default_factory=list)
+    output_tokens: int | None = None
+
+    @property
+    def ttft_s(self) -> float | None:
+        return None if self.first_delta is None else self.first_delta - self.started
+
+    @property
+    def duration_s(self) -> float:
+        return (self.ended or self.first_event) - self.started
+
+    @property
+    def tokens(self) -> int:
+        # 伺服器沒有回傳 usage 時用文字長度估計
+        return self.output_tokens or estimate_tokens("".join(self.text))
+
+    @property
+    def tokens_per_s(self) -> float | None:
+        if self.first_delta is None or self.ended is None or self.ended <= self.first_delta:
+            return None
+        return self.tokens / (self.ended - self.first_delta)
+
+
+@dataclass
+class RunMetrics:
+    started: float
+    ended: float | None = None
+    first_delta: float | None = None
+    turns: list[TurnMetrics] = field(default_factory=list)
+    # (agent, 工具名稱, 秒數)
+    tools: list[tuple[str, str, float]] = field(default_factory=list)
+    # (從 agent, 到 agent, 秒數)
+    handoffs: list[tuple[str, str, float]] = field(default_factory=list)
+
+    @property
+    def duration_s(self) -> float:
+        return (self.ended or time.perf_counter()) - self.started
+
+    def record(self, store: MetricsStore):
+        for turn in self.turns:
+            store.add("ttft_s", turn.agent, turn.model, turn.ttft_s)
+            store.add("first_event_s", turn.agent, turn.model, turn.first_event - turn.started)
+            store.add("turn_s", turn.agent, turn.model, turn.duration_s)
+            store.add("tokens_per_s", turn.agent, turn.model, turn.tokens_per_s)
+        for agent, tool, seconds in self.tools:
+            store.add("tool_s", agent, tool, seconds)
+        for source, target, seconds in self.handoffs:
+            store.add("handoff_s", source, target, seconds)
+        first = self.turns[0] if self.turns else None
+        agent, model = (first.agent, first.model) if first else ("-", "-")
+        store.add("run_s", agent, model, self.duration_s)
+        store.add("turns", agent, model, len(self.turns))
+        if self.first_delta is not None:
+            store.add("run_ttft_s", agent, model, self.first_delta - self.started)
+
+    def format(self) -> str:
+        first = "-" if self.first_delta is None else f"{self.first_delta - self.started:.2f}s"
+        lines = [f"[stream] run {self.duration_s:.2f}s, turns={len(self.turns)}, first delta {first}"]
+        for i, turn in enumerate(self.turns, 1):
+            ttft = "-" if turn.ttft_s is None else f"{turn.ttft_s:.2f}s"
+            rate = "-" if turn.tokens_per_s is None else f"{turn.tokens_per_s:.1f} tok/s"
+            lines.append(
+                f"  turn {i} {turn.agent}/{turn.model}: ttft {ttft}, {rate}, {turn.duration_s:.2f}s"
+            )
+        for agent, tool, seconds in self.tools:
+            lines.append(f"  tool {tool} ({agent}): {seconds:.2f}s")
+        for source, target, seconds in self.handoffs:
+            lines.append(f"  handoff {source} -> {target}: {seconds:.2f}s")
+        return "\n".join(lines)
+
+
+def _agent_name(agent) -> str:
+    return getattr(agent, "name", None) or "-"
+
+
+def _model_label(agent, default_model: str) -> str:
+    model = getattr(agent, "model", None)
+    if isinstance(model, str):
+        return model
+    # RoutedModel 記錄實際使用的端點；OpenAIChatCompletionsModel 有 model 屬性
+    return getattr(model, "last_endpoint", None) or getattr(model, "model", None) or default_model
+
+
+class StreamConsumer:
+    """逐一處理 stream_events() 的事件並累積 RunMetrics。"""
+
+    def __init__(self, agent, default_model: str = "default", render: bool = True):
+        self.agent = agent
+        self.default_model = default_model
+        self.render = render
+        self.run = RunMetrics(started=time.perf_counter())
+        # 下一個模型請求大約在這個時間送出（run 開始、工具完成或 agent 切換之後）
+        self._request_at = self.run.started
+        self._turn: TurnMetrics | None = None
+        self._tool_calls: dict[str, tuple[str, float]] = {}
+        self._handoff: tuple[str, float] | None = None
+
+    def _close_turn(self, now: float):
+        turn = self._turn
+        if turn is None:
+            return
+        turn.ended = now
+        turn.model = _model_label(self.agent, self.default_model)
+        self.run.turns.append(turn)
+        self._turn = None
+        self._request_at = now
+
+    def handle(self, event):
+        now = time.perf_counter()
+        if event.type == "raw_response_event":
+            if self._turn is None:
+                self._turn = TurnMetrics(_agent_name(self.agent), self._request_at, now)
+                if self._handoff is not None:
+                    source, requested_at = self._handoff
+                    self.run.handoffs.append((source, _agent_name(self.agent), now - requested_at))
+                    self._handoff = None
+            data = event.data
+            if isinstance(data, ResponseTextDeltaEvent):
+                if self._turn.first_delta is None:
+                    self._turn.first_delta = now
+                if self.run.first_delta is None:
+                    self.run.first_delta = now
+                self._turn.text.append(data.delta)
+                if self.render:
+                    print(data.delta, end="", flush=True)
+            elif isinstance(data, ResponseCompletedEvent):
+                usage = getattr(data.response, "usage", None)
+                if usage is not None and usage.output_tokens:
+                    self._turn.output_tokens = usage.output_tokens
+                self._close_turn(now)
+            return
+
+        # 其他事件代表模型回合已結束（有些模型不送 completed 事件）
+        self._close_turn(now)
+        if event.type == "agent_updated_stream_event":
+            self.agent = event.new_agent
+            self._request_at = now
+        elif event.type == "run_item_stream_event":
+            raw = getattr(event.item, "raw_item", None)
+            if event.name == "tool_called":
+                call_id = getattr(raw, "call_id", None) or id(raw)
+                self._tool_calls[call_id] = (getattr(raw, "name", "tool"), now)
+            elif event.name == "tool_output":
+                call_id = raw.get("call_id") if isinstance(raw, dict) else getattr(raw, "call_id", None)
+                name, called_at = self._tool_calls.pop(call_id, ("tool", self._request_at))
+                self.run.tools.append((_agent_name(self.agent), name, now - called_at))
+                self._request_at = now
+            elif event.name == "handoff_requested":
+                self._handoff = (_agent_name(self.agent), now)
+
+    def finish(self) -> RunMetrics:
+        now = time.perf_counter()
+        self._close_turn(now)
+        self.run.ended = now
+        return self.run
+
+
+STREAM_METRICS = MetricsStore.from_env()
+
+
+async def consume_stream(
+    result,
+    store: MetricsStore | None = STREAM_METRICS,
+    default_model: str = "default",
+    render: bool = True,
+) -> RunMetrics:
+    """印出文字 delta 並回傳本次 run 的指標；store 不為 None 時加入直方圖（有設定檔案時寫檔）。"""
+    consumer = StreamConsumer(result.current_agent, default_model=default_model, render=render)
+    async for event in result.stream_events():
+        consumer.handle(event)
+    run = consumer.finish()
+    if store is not None:
+        current = MetricsStore()
+        run.record(current)
+        store.merge(current)
+        if store.path:
+            current.dump(store.path)
+    return run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or compare streaming metrics dumps")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show")
+    show.add_argument("path")
+    compare = sub.add_parser("compare")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    args = parser.parse_args()
+    if args.command == "show":
+        print(MetricsStore.load(args.path).format())
+    else:
+        print(MetricsStore.compare(MetricsStore.load(args.baseline), MetricsStore.load(args.current)))
@@ -0,0 +1,301 @@
+"""
+資料表概況（profile）：列數、大小、欄位、索引與時間欄位範圍，一次查出並快取。
+
+check_db_preview.py 原本逐一執行存在檢查、預覽、欄位清單與每個時間欄位的 MIN/MAX 全表查詢，
+大表時要好幾分鐘。這裡改成：
+  - 列數、資料 / 索引大小、更新時間取自 information_schema.tables（InnoDB 的列數為估計值）
+  - 欄位與索引取自 information_schema.columns / statistics，不掃描資料表
+  - 時間欄位是某個索引的第一個欄位時，MIN/MAX 只讀索引的兩端（EXPLAIN 為 "Select tables optimized away"）；
+    沒有索引的欄位預設不掃描（標示為 skipped），指定 full_scan=True 才做全表 MIN/MAX
+  - 彼此獨立的查詢各用一條連線同時送出（thread pool），每條連線受 query_guard 的期限限制
+  - 結果連同查詢時間（checked_at）寫入 TABLE_PROFILE_CACHE；第一個時間欄位的範圍同時寫入
+    date_parser 的時間範圍快取，日期檢查不需要再查 MySQL
+
+使用方式：
+    profile = get_table_profile()                  # 記憶體 → 快取檔案（未過期）→ MySQL
+    profile = profile_table(full_scan=True)        # 強制重新查詢
+    print(profile.format())
+
+環境變數：
+  - TABLE_PROFILE_CACHE    快取檔案（預設 .table_profile.json）
+  - TABLE_PROFILE_TTL      快取有效秒數（預設 3600）
+  - TABLE_PROFILE_WORKERS  同時查詢的連線數（預設 4）
+  - TABLE_PROFILE_TIMEOUT  每個查詢的期限秒數（預設 60）
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+
+from date_parser import save_table_extents
+from query_guard import QUERY_GUARD
+from settings import MYSQL_DB, MYSQL_TABLE
+
+TABLE_PROFILE_CACHE = os.getenv("TABLE_PROFILE_CACHE", ".table_profile.json")
+TABLE_PROFILE_TTL = float(os.getenv("TABLE_PROFILE_TTL", "3600"))
+TABLE_PROFILE_WORKERS = int(os.getenv("TABLE_PROFILE_WORKERS", "4"))
+TABLE_PROFILE_TIMEOUT = float(os.getenv("TABLE_PROFILE_TIMEOUT", "60"))
+
+
+@dataclass
+class TimeExtent:
+    column: str
+    min_time: str | None
+    max_time: str | None
+    method: str  # "index"：只讀索引兩端、"scan"：全表掃描、"skipped"：沒有索引且未要求掃描、"error"
+    elapsed_s: float = 0.0
+
+
+@dataclass
+class TableProfile:
+    database: str | None
+    table: str | None
+    exists: bool
+    checked_at: float
+    estimated_rows: int | None = None
+    data_bytes: int | None = None
+    index_bytes: int | None = None
+    update_time: str | None = None
+    columns: list[list[str]] = field(default_factory=list)  # [名稱, 型別, COLUMN_KEY]
+    indexes: dict[str, list[str]] = field(default_factory=dict)  # 索引名稱 → 依序的欄位
+    time_extents: list[TimeExtent] = field(default_factory=list)
+    preview_columns: list[str] = field(default_factory=list)
+    preview: list[list] = field(default_factory=list)
+    elapsed_s: float = 0.0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def age_s(self) -> float:
+        return time.time() - self.checked_at
+
+    @property
+    def column_names(self) -> list[str]:
+        return [col[0] for col in self.columns]
+
+    @property
+    def time_columns(self) -> list[str]:
+        return [col for col in self.column_names if 'time' in col.lower() or 'date' in col.lower()]
+
+    def indexed(self, column: str) -> bool:
+        """column 是否為某個索引的第一個欄位（MIN/MAX 與範圍條件可以走索引）。"""
+        return any(cols and cols[0] == column for cols in self.indexes.values())
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TableProfile":
+        data = dict(data)
+        data["time_extents"] = [TimeExtent(**item) for item in data.get("time_extents", [])]
+        return cls(**data)
+
+    def format(self, preview: bool = True) -> str:
+        checked = datetime.fromtimestamp(self.checked_at).isoformat(timespec="seconds")
+        lines = [f"資料表 `{self.database}`.`{self.table}`（查詢於 {checked}，{self.age_s:.0f} 秒前，耗時 {self.elapsed_s:.2f}s）"]
+        if not self.exists:
+            lines.append("資料表不存在。")
+            return "\n".join(lines + self.errors)
+        lines.append(
+            f"估計列數：{self.estimated_rows}，資料 {_mb(self.data_bytes)}，索引 {_mb(self.index_bytes)}，"
+            f"最後更新：{self.update_time or '-'}"
+        )
+        lines.append("欄位：" + ", ".join(f"{name} {kind}{' (' + key + ')' if key else ''}" for name, kind, key in self.columns))
+        lines.append("索引：" + ("; ".join(f"{name}({', '.join(cols)})" for name, cols in self.indexes.items()) or "無"))
+        for extent in self.time_extents:
+            if extent.method == "skipped":
+                lines.append(f"時間欄位 `{extent.column}`：沒有索引，未掃描（--full-scan 才查詢 MIN/MAX）")
+            else:
+                lines.append(
+                    f"時間欄位 `{extent.column}`：min = {extent.min_time}, max = {extent.max_time}"
+                    f"（{extent.method}, {extent.elapsed_s:.2f}s）"
+                )
+        if preview and self.preview:
+            lines.append("前 5 筆：")
+            lines.append(" | ".join(self.preview_columns))
+            lines.extend(" | ".join(str(v) for v in row) for row in self.preview)
+        lines.extend(f"[error] {e}" for e in self.errors)
+        return "\n".join(lines)
+
+
+def _mb(value: int | None) -> str:
+    return "-" if value is None else f"{value / 1024 / 1024:.1f} MB"
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+# ----------------------------------------------------------------------
+# 查詢
+# ----------------------------------------------------------------------
+def _run(sql: str, params: tuple = (), name: str = "table_profile"):
+    """在獨立的連線上執行一個查詢並取回全部結果（在 thread pool 內呼叫）。"""
+    import vibration_db
+
+    started = time.perf_counter()
+    with QUERY_GUARD.scoped(name, TABLE_PROFILE_TIMEOUT):
+        conn = cursor = None
+        try:
+            conn = vibration_db.connect()
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            return list(cursor.column_names), rows, time.perf_counter() - started
+        finally:
+            if cursor is not None:
+                cursor.close()
+            if conn is not None:
+                conn.close()
+
+
+def profile_table(
+    table: str | None = MYSQL_TABLE,
+    database: str | None = MYSQL_DB,
+    full_scan: bool = False,
+    workers: int = TABLE_PROFILE_WORKERS,
+    path: str = TABLE_PROFILE_CACHE,
+) -> TableProfile:
+    """查詢資料表概況並寫入快取；個別查詢失敗時記錄在 errors，其餘欄位照常填入。"""
+    global _profile
+    started = time.perf_counter()
+    profile = TableProfile(database, table, False, time.time())
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="table-profile") as pool:
+        # 第一輪：只讀 information_schema 與 LIMIT 5，彼此獨立
+        meta = pool.submit(
+            _run,
+            "SELECT TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH, UPDATE_TIME FROM information_schema.tables "
+            "WHERE table_schema = %s AND table_name = %s",
+            (database, table),
+        )
+        columns = pool.submit(
+            _run,
+            "SELECT COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY FROM information_schema.columns "
+            "WHERE table_schema = %s AND table_name = %s ORDER BY ORDINAL_POSITION",
+            (database, table),
+        )
+        indexes = pool.submit(
+            _run,
+            "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.statistics "
+            "WHERE table_schema = %s AND table_name = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (database, table),
+        )
+        preview = pool.submit(_run, f"SELECT * FROM `{table}` LIMIT 5")
+
+        try:
+            _, rows, _ = meta.result()
+        except Exception as e:
+            profile.errors.append(f"information_schema.tables: {e}")
+            rows = []
+        if not rows:
+            # 資料表不存在時預覽查詢也會失敗，不列為錯誤
+            for future in (columns, indexes, preview):
+                future.exception()
+            profile.elapsed_s = time.perf_counter() - started
+            return profile
+        profile.exists = True
+        estimated_rows, data_bytes, index_bytes, update_time = rows[0]
+        profile.estimated_rows = None if estimated_rows is None else int(estimated_rows)
+        profile.data_bytes = None if data_bytes is None else int(data_bytes)
+        profile.index_bytes = None if index_bytes is None else int(index_bytes)
+        profile.update_time = _jsonable(update_time)
+
+        for label, future in (("columns", columns), ("statistics", indexes), ("preview", preview)):
+            try:
+                names, rows, _ = future.result()
+            except Exception as e:
+                profile.errors.append(f"{label}: {e}")
+                continue
+            if label == "columns":
+                profile.columns = [[str(name), str(kind), str(key or "")] for name, kind, key in rows]
+            elif label == "statistics":
+                for index_name, column in rows:
+                    profile.indexes.setdefault(str(index_name), []).append(str(column))
+            else:
+                profile.preview_columns = names
+                profile.preview = [[_jsonable(v) for v in row] for row in rows]
+
+        # 第二輪：各時間欄位的 MIN/MAX 同時查詢；有索引時只讀索引兩端
+        pending = []
+        for col in profile.time_columns:
+            method = "index" if profile.indexed(col) else ("scan" if full_scan else "skipped")
+            if method == "skipped":
+                profile.time_extents.append(TimeExtent(col, None, None, method))
+                continue
+            sql = f"SELECT MIN(`{col}`), MAX(`{col}`) FROM `{table}`"
+            pending.append((col, method, pool.submit(_run, sql, (), f"table_profile {col}")))
+        for col, method, future in pending:
+            try:
+                _, rows, elapsed = future.result()
+                low, high = rows[0]
+                profile.time_extents.append(TimeExtent(col, _jsonable(low), _jsonable(high), method, elapsed))
+            except Exception as e:
+                profile.errors.append(f"MIN/MAX `{col}`: {QUERY_GUARD.describe(e) or e}")
+                profile.time_extents.append(TimeExtent(col, None, None, "error"))
+        order = {col: i for i, col in enumerate(profile.time_columns)}
+        profile.time_extents.sort(key=lambda extent: order[extent.column])
+
+    profile.elapsed_s = time.perf_counter() - started
+    # 第一個時間欄位（查詢工具用來篩選日期的欄位）的範圍供 date_parser 檢查日期
+    first = profile.time_extents[0] if profile.time_extents else None
+    if first is not None and first.min_time is not None and table == MYSQL_TABLE:
+        save_table_extents(first.min_time, first.max_time)
+    save_profile(profile, path)
+    _profile = profile
+    return profile
+
+
+# ----------------------------------------------------------------------
+# 快取
+# ----------------------------------------------------------------------
+_profile: TableProfile | None = None
+
+
+def save_profile(profile: TableProfile, path: str = TABLE_PROFILE_CACHE):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(profile), f, ensure_ascii=False, default=str)
+    except OSError:
+        pass
+
+
+def load_profile(path: str = TABLE_PROFILE_CACHE) -> TableProfile | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return TableProfile.from_dict(json.load(f))
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+
+
+def get_table_profile(
+    max_age_s: float = TABLE_PROFILE_TTL,
+    refresh: bool = False,
+    table: str | None = MYSQL_TABLE,
+    database: str | None = MYSQL_DB,
+) -> TableProfile:
+    """記憶體 → 快取檔案 → MySQL；快取是同一個資料表且未超過 max_age_s 時直接使用。"""
+    global _profile
+    if not refresh:
+        for candidate in (_profile, load_profile()):
+            if (
+                candidate is not None
+                and (candidate.database, candidate.table) == (database, table)
+                and candidate.age_s <= max_age_s
+            ):
+                _profile = candidate
+                return candidate
+    return profile_table(table, database)
+
+
+def describe_table(refresh: bool = False) -> str:
+    """給 agent 使用：資料表的欄位、索引、估計列數與時間範圍（預設讀快取）。"""
+    try:
+        return get_table_profile(refresh=refresh).format(preview=False)
+    except Exception as e:
+        return f"Error profiling table: {e}"
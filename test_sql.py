@@ -1,36 +1,46 @@
-import pandas as pd
-from sqlalchemy import text
-from sqlalchemy.exc import SQLAlchemyError, OperationalError
+"""
+MySQL 查詢測試與基準工具。
 
-# 重用既有的連線參數與方法
-from upload_data import get_engine, MYSQL_DB, MYSQL_TABLE
-import sys, os
+    python test_sql.py <YYYY-MM-DD>                       # 印出當天所有振動資料（原本的用法）
+    python test_sql.py bench --dates 2025-07-25 2025/7/28~7/30 --repeat 5 --save baseline.json
+    python test_sql.py show baseline.json
+    python test_sql.py compare baseline.json current.json  # 有退步時 exit code 1
 
-from dotenv import load_dotenv
+bench 依序執行各工具使用的查詢形狀（all / max / outliers / outliers_scan / range），每個日期重複 --repeat 次，記錄：
+  - 延遲（執行 + 讀完所有列）的 p50 / p95 / max
+  - 回傳列數，以及 rows examined（查詢前後 SHOW SESSION STATUS 的 Handler_read_* 差值）
+  - EXPLAIN（存取方式、使用的索引、估計列數）與 EXPLAIN ANALYZE 的實際執行計畫
+結果存成 JSON，compare 以數字判斷索引或查詢的修改是否真的變快。
+"""
 
-# 載入 .env 檔案
-load_dotenv()
-#SQL connectation inf
-MYSQL_HOST = os.getenv('MYSQL_HOST', '140.134.60.218')
-MYSQL_PORT = int(os.getenv('MYSQL_PORT', '8306'))
-MYSQL_USER = os.getenv('MYSQL_USER', 'user_class')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'password1234')
-MYSQL_DB = os.getenv('MYSQL_DB', 'phm')
-MYSQL_TABLE = os.getenv('MYSQL_TABLE', 'equipment_data')
+import argparse
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from settings import MYSQL_DB, MYSQL_HOST, MYSQL_PASSWORD, MYSQL_PORT, MYSQL_TABLE, MYSQL_USER
+
+SHAPES = ("all", "max", "outliers", "outliers_scan", "range")
+
+
+def connect():
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=MYSQL_HOST,
+        port=MYSQL_PORT,
+        user=MYSQL_USER,
+        password=MYSQL_PASSWORD,
+        database=MYSQL_DB
+    )
 
 
 def get_vibration_all_on_date(date_str: str):
     print(f"[debug] getting all vibration data for date: {date_str}")
-    import mysql.connector
 
     try:
-        conn = mysql.connector.connect(
-            host=MYSQL_HOST,
-            port=MYSQL_PORT,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DB
-        )
+        conn = connect()
         print("[debug] MySQL connection established:", conn.is_connected())
         cursor = conn.cursor()
         # Get column names
@@ -46,10 +56,11 @@ def get_vibration_all_on_date(date_str: str):
         query = (
             f"SELECT `{time_col}`, `{vibration_col}` "
             f"FROM `{MYSQL_TABLE}` "
-            f"WHERE DATE(`{time_col}`) = %s "
+            f"WHERE `{time_col}` >= %s AND `{time_col}` < %s "
             f"ORDER BY `{time_col}` ASC"
         )
-        cursor.execute(query, (date_str,))
+        next_day = (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+        cursor.execute(query, (date_str, next_day))
         rows = cursor.fetchall()
         if rows:
             result = [f"{time_col}: {row[0]}, {vibration_col}: {row[1]}" for row in rows]
@@ -64,10 +75,291 @@ def get_vibration_all_on_date(date_str: str):
         if 'conn' in locals():
             conn.close()
 
+
+# ----------------------------------------------------------------------
+# 查詢形狀：與 vibration_db 中對應工具送出的 SQL 相同
+# ----------------------------------------------------------------------
+def query_shapes(time_col: str, vibration_col: str, threshold: float = 3.0, top_k: int = 20) -> dict:
+    """每個形狀是一串步驟，step(date_str, 前一步的第一列) -> (sql, params)。"""
+    t, v, table = f"`{time_col}`", f"`{vibration_col}`", f"`{MYSQL_TABLE}`"
+    # 與 vibration_db._day_filter 相同：當天寫成範圍條件，可走索引與 partition pruning
+    day = f"{t} >= %s AND {t} < %s"
+
+    def next_day(date_str: str) -> str:
+        return (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+
+    def stats(d, prev):
+        return f"SELECT COUNT(*), COUNT({v}), AVG({v}), STDDEV_POP({v}) FROM {table} WHERE {day}", (d, next_day(d))
+
+    def outlier_top_k(date_str, prev):
+        # vibration_db._outliers_top_k：偏離最大的 top_k 筆，總數由 COUNT(*) OVER () 一併算出
+        avg, std = float(prev[2] or 0), float(prev[3] or 0)
+        deviation = f"ABS({v} - %s)"
+        return (
+            f"SELECT {t}, {v}, {deviation} AS deviation, COUNT(*) OVER () AS n_outliers FROM {table} "
+            f"WHERE {day} AND {deviation} > %s ORDER BY deviation DESC LIMIT {top_k}",
+            (avg, date_str, next_day(date_str), avg, threshold * std),
+        )
+
+    def outlier_scan(date_str, prev):
+        avg, std = float(prev[2] or 0), float(prev[3] or 0)
+        return f"SELECT * FROM {table} WHERE {day} AND ABS({v} - %s) > %s", (date_str, next_day(date_str), avg, threshold * std)
+
+    return {
+        # get_vibration_all_on_date
+        "all": [lambda d, prev: (f"SELECT {t}, {v} FROM {table} WHERE {day} ORDER BY {t} ASC", (d, next_day(d)))],
+        # get_vibration_max_on_date
+        "max": [lambda d, prev: (f"SELECT {t}, {v} FROM {table} WHERE {day} ORDER BY {v} DESC LIMIT 1", (d, next_day(d)))],
+        # find_vibration_outliers_on_date(top_k / output="json")，agent 工具送出的形狀：先聚合再取 top_k
+        "outliers": [stats, outlier_top_k],
+        # find_vibration_outliers_on_date(output="text")：串流所有離群列
+        "outliers_scan": [stats, outlier_scan],
+        # analyze_vibration_fleet / estimate_vibration_stats 的範圍條件（一天）
+        "range": [lambda d, prev: (f"SELECT {t}, {v} FROM {table} WHERE {t} >= %s AND {t} < %s", (d, next_day(d)))],
+    }
+
+
+def detect_columns(cursor):
+    cursor.execute(f"SHOW COLUMNS FROM `{MYSQL_TABLE}`")
+    columns = [row[0] for row in cursor.fetchall()]
+    vibration_col = next((col for col in columns if 'vibration' in col.lower()), None)
+    time_columns = [col for col in columns if 'time' in col.lower() or 'date' in col.lower()]
+    if not vibration_col or not time_columns:
+        raise SystemExit("No vibration or time/date column found.")
+    return time_columns[0], vibration_col
+
+
+def handler_reads(conn) -> dict[str, int]:
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+        return {name: int(value) for name, value in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def run_statement(conn, sql: str, params: tuple, overhead: int = 0) -> dict:
+    """執行並讀完所有列；rows_examined 為 Handler_read_* 的增量（扣掉 SHOW STATUS 本身的部分）。"""
+    before = handler_reads(conn)
+    cursor = conn.cursor(buffered=False)
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+        rows, first = 0, None
+        while True:
+            batch = cursor.fetchmany(5000)
+            if not batch:
+                break
+            if first is None:
+                first = batch[0]
+            rows += len(batch)
+        elapsed = time.perf_counter() - started
+    finally:
+        cursor.close()
+    after = handler_reads(conn)
+    examined = sum(after.get(k, 0) - before.get(k, 0) for k in after) - overhead
+    return {"elapsed_s": elapsed, "rows": rows, "rows_examined": max(examined, 0), "first": first}
+
+
+def explain(conn, sql: str, params: tuple) -> dict:
+    """EXPLAIN 的存取方式與索引，以及 EXPLAIN ANALYZE（MySQL 8.0.18+）的實際計畫；不支援時只留 EXPLAIN。"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("EXPLAIN " + sql, params)
+        names = cursor.column_names
+        plan = [
+            {key: row[i] for i, key in enumerate(names) if key in ("table", "partitions", "type", "key", "rows", "filtered", "Extra")}
+            for row in cursor.fetchall()
+        ]
+        try:
+            cursor.execute("EXPLAIN ANALYZE " + sql, params)
+            analyze = "\n".join(str(row[0]) for row in cursor.fetchall())
+        except Exception as e:
+            analyze = f"(EXPLAIN ANALYZE not supported: {e})"
+        return {"plan": plan, "analyze": analyze}
+    finally:
+        cursor.close()
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def expand_dates(items: list[str]) -> list[str]:
+    """每個參數可以是單日或範圍（2025/7/28~7/30），展開成 YYYY-MM-DD 列表。"""
+    from date_parser import parse_date_range
+
+    dates = []
+    for item in items:
+        requested = parse_date_range(item)
+        dates.extend((requested.start + timedelta(days=i)).isoformat() for i in range(requested.days))
+    return list(dict.fromkeys(dates))
+
+
+def bench(dates: list[str], shapes: list[str], repeat: int, warmup: int, capture_plans: bool) -> dict:
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        time_col, vibration_col = detect_columns(cursor)
+        cursor.close()
+        # 兩次連續 SHOW STATUS 之間的增量就是量測本身的成本
+        first, second = handler_reads(conn), handler_reads(conn)
+        overhead = sum(second[k] - first.get(k, 0) for k in second)
+        steps_by_shape = query_shapes(time_col, vibration_col)
+
+        result = {
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "target": f"{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}.{MYSQL_TABLE}",
+            "dates": dates,
+            "repeat": repeat,
+            "shapes": {},
+        }
+        for shape in shapes:
+            samples, examined, returned, plans = [], [], [], {}
+            for date_str in dates:
+                for i in range(warmup + repeat):
+                    prev, elapsed, rows, rows_examined = None, 0.0, 0, 0
+                    for step in steps_by_shape[shape]:
+                        sql, params = step(date_str, prev)
+                        stats = run_statement(conn, sql, params, overhead)
+                        prev = stats["first"]
+                        elapsed += stats["elapsed_s"]
+                        rows += stats["rows"]
+                        rows_examined += stats["rows_examined"]
+                    if i >= warmup:
+                        samples.append(elapsed * 1000)
+                        examined.append(rows_examined)
+                        returned.append(rows)
+                if capture_plans:
+                    prev, date_plans = None, []
+                    steps = steps_by_shape[shape]
+                    for i, step in enumerate(steps):
+                        sql, params = step(date_str, prev)
+                        date_plans.append(explain(conn, sql, params))
+                        if i < len(steps) - 1:
+                            prev = run_statement(conn, sql, params, overhead)["first"]
+                    plans[date_str] = date_plans
+            result["shapes"][shape] = {
+                "p50_ms": percentile(samples, 0.5),
+                "p95_ms": percentile(samples, 0.95),
+                "max_ms": max(samples),
+                "mean_ms": sum(samples) / len(samples),
+                "rows_returned": int(percentile(returned, 0.5)),
+                "rows_examined": int(percentile(examined, 0.5)),
+                "samples_ms": samples,
+                "plans": plans,
+            }
+            s = result["shapes"][shape]
+            print(
+                f"[bench] {shape:<13} p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms "
+                f"rows={s['rows_returned']} examined={s['rows_examined']}",
+                flush=True,
+            )
+        return result
+    finally:
+        conn.close()
+
+
+def _access(shape: dict) -> str:
+    """第一個日期各步驟的存取方式，例如 ALL/- 或 range/idx_time；分割資料表另附讀到的 partition 數。"""
+    plans = next(iter(shape.get("plans", {}).values()), [])
+
+    def one(p: dict) -> str:
+        parts = p.get("partitions")
+        suffix = f"@{len(str(parts).split(','))}p" if parts else ""
+        return f"{p.get('type')}/{p.get('key') or '-'}{suffix}"
+
+    return "; ".join(",".join(one(p) for p in step["plan"]) for step in plans) or "-"
+
+
+def format_result(result: dict, show_plans: bool = False) -> str:
+    lines = [
+        f"[bench] {result['target']} @ {result['recorded_at']}，{len(result['dates'])} 個日期 × {result['repeat']} 次",
+        f"{'shape':<13} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'rows':>9} {'examined':>10}  access",
+    ]
+    for name, s in result["shapes"].items():
+        lines.append(
+            f"{name:<13} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['max_ms']:>9.1f} "
+            f"{s['rows_returned']:>9} {s['rows_examined']:>10}  {_access(s)}"
+        )
+        if show_plans:
+            for date_str, steps in s["plans"].items():
+                for i, step in enumerate(steps, 1):
+                    lines.append(f"  {date_str} step {i}:")
+                    lines.extend(f"    {line}" for line in step["analyze"].splitlines())
+    return "\n".join(lines)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.2) -> tuple[str, bool]:
+    """回傳 (比較表, 是否有退步)；延遲或 rows examined 增加超過 tolerance 即視為退步。"""
+
+    def pct(old, new) -> str:
+        return f"{(new - old) / old * 100:+.0f}" if old else "-"
+
+    regressed = False
+    lines = [f"{'metric':<28} {'baseline':>10} {'current':>10} {'Δ%':>6}"]
+    for name in sorted(set(baseline["shapes"]) | set(current["shapes"])):
+        old, new = baseline["shapes"].get(name), current["shapes"].get(name)
+        if old is None or new is None:
+            lines.append(f"{name:<28} {'-' if old is None else 'present':>10} {'-' if new is None else 'present':>10}")
+            continue
+        for key in ("p50_ms", "p95_ms", "rows_examined", "rows_returned"):
+            flag = ""
+            if key in ("p50_ms", "rows_examined") and old[key] and new[key] > old[key] * (1 + tolerance):
+                flag, regressed = "  <-- regression", True
+            lines.append(f"{name + '.' + key:<28} {old[key]:>10.6g} {new[key]:>10.6g} {pct(old[key], new[key]):>6}{flag}")
+        if _access(old) != _access(new):
+            lines.append(f"{name + '.access':<28} {_access(old)} -> {_access(new)}")
+    return "\n".join(lines), regressed
+
+
+def load_result(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python test_sql.py <YYYY-MM-DD>")
-        sys.exit(1)
-    date_str = sys.argv[1]
-    result = get_vibration_all_on_date(date_str)
-    print(result)
\ No newline at end of file
+    if len(sys.argv) == 2 and sys.argv[1] not in ("bench", "show", "compare", "-h", "--help"):
+        date_str = sys.argv[1]
+        result = get_vibration_all_on_date(date_str)
+        print(result)
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Query tests and benchmarks for the vibration table")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench")
+    bench_parser.add_argument("--dates", nargs="+", required=True, help="YYYY-MM-DD 或範圍，例如 2025/7/28~7/30")
+    bench_parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=list(SHAPES))
+    bench_parser.add_argument("--repeat", type=int, default=5)
+    bench_parser.add_argument("--warmup", type=int, default=1)
+    bench_parser.add_argument("--no-explain", action="store_true", help="不擷取 EXPLAIN / EXPLAIN ANALYZE")
+    bench_parser.add_argument("--save", help="結果存成 JSON（之後可用 compare 比較）")
+    bench_parser.add_argument("--baseline", help="完成後與這份結果比較")
+    bench_parser.add_argument("--tolerance", type=float, default=0.2)
+    show = sub.add_parser("show")
+    show.add_argument("path")
+    show.add_argument("--plans", action="store_true", help="印出 EXPLAIN ANALYZE")
+    cmp_parser = sub.add_parser("compare")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print(format_result(load_result(args.path), args.plans))
+    elif args.command == "compare":
+        text, regressed = compare(load_result(args.baseline), load_result(args.current), args.tolerance)
+        print(text)
+        sys.exit(1 if regressed else 0)
+    else:
+        result = bench(expand_dates(args.dates), args.shapes, args.repeat, args.warmup, not args.no_explain)
+        print(format_result(result))
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2, default=str)
+            print(f"Saved benchmark to {args.save}")
+        if args.baseline:
+            text, regressed = compare(load_result(args.baseline), result, args.tolerance)
+            print(text)
+            sys.exit(1 if regressed else 0)
@@ -1,38 +1,91 @@
+"""
+上傳 DataFrame 到 MySQL（可重複執行、不產生重複資料），並維護資料表依日期的 RANGE 分割（partition）。
+
+去重（UPLOAD_MODE，預設 ignore）：
+  - 自然鍵為時間欄位 + 設備欄位（或 UPLOAD_KEY），第一次上傳時建立 UNIQUE KEY
+  - ignore：INSERT IGNORE 分批寫入，已存在的列略過；upsert：ON DUPLICATE KEY UPDATE 以新值覆寫；
+    replace-range：同一個交易內刪除這批資料的時間範圍（只限檔案內的設備）後重新寫入；append：舊行為
+  - 上傳結束時回報檔案內重複、資料表已存在而略過 / 覆寫、刪除的列數
+  - 已經有重複資料的資料表先執行 dedupe（複製到有唯一鍵的新表再交換表名）
+
+上傳後會重算這批資料涵蓋日期的振動特徵（見 feature_store.py，FEATURE_ON_UPLOAD=0 可關閉）。
+
+分割（設定 PARTITION_UNIT 時啟用）：
+  - 依時間欄位（名稱含 time / date 的第一個欄位）以 RANGE 分割，每天或每月一個 partition，
+    最後一個 pmax（VALUES LESS THAN MAXVALUE）接住超出範圍的資料
+  - 上傳前後都會補齊到「資料最新日期 + PARTITION_AHEAD 個單位」為止的 partition，
+    新資料直接寫進對應的 partition，不會堆在 pmax
+  - 第一次分割從這批資料的最早日期開始；之後上傳比第一個 partition 更舊的資料時，
+    先把第一個 partition 往前拆出對應日期的 partition，舊資料同樣可以依日期裁剪與過期
+  - 超過 PARTITION_RETENTION_DAYS 的 partition 以 DROP PARTITION 移除（只改中繼資料，不逐列刪除）；
+    PARTITION_ARCHIVE=1 時先 EXCHANGE PARTITION 到 `<table>_<partition>` 封存表再移除
+  - 查詢工具以時間欄位的範圍條件查詢（見 vibration_db._day_filter），MySQL 只讀涉及的 partition，
+    每次查詢的成本不隨歷史資料增加
+
+指令：
+    python upload_data.py                                   # 確認資料庫存在
+    python upload_data.py partitions --unit day --ahead 7   # 建立 / 補齊 partition
+    python upload_data.py partitions --retention-days 365 --archive --dry-run
+    python upload_data.py status                            # 列出 partition 與估計列數
+    python upload_data.py upload data.csv --mode ignore     # 上傳 CSV（重複執行不會增加列數）
+    python upload_data.py dedupe --dry-run                  # 移除既有重複並建立唯一鍵
+
+環境變數：
+  - UPLOAD_MODE               append / ignore / upsert / replace-range（預設 ignore）
+  - UPLOAD_KEY                逗號分隔的唯一鍵欄位；空白時為時間欄位 + 設備欄位
+  - UPLOAD_CHUNKSIZE          每批寫入的列數（預設 5000）
+  - PARTITION_UNIT            day 或 month；空白表示不分割（預設）
+  - PARTITION_AHEAD           預先建立幾個單位的 partition（預設 7）
+  - PARTITION_RETENTION_DAYS  保留天數，0 表示不移除（預設 0）
+  - PARTITION_ARCHIVE         1 表示移除前先封存（預設 0）
+"""
+
+from __future__ import annotations
+
+import argparse
 import os
-# 匯入必要套件
-import pandas as pd  # 資料處理
-import numpy as np   # 數值運算
-from datetime import datetime, timedelta  # 處理時間
-import random
-import matplotlib.pyplot as plt
-
-from dotenv import load_dotenv
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+# pandas / sqlalchemy 只在實際上傳或建立連線時才載入，
+# 讓只需要連線參數的模組（agent、check_db_preview）可以快速啟動
+from settings import MYSQL_DB, MYSQL_HOST, MYSQL_PASSWORD, MYSQL_PORT, MYSQL_TABLE, MYSQL_USER
+
+PARTITION_UNIT = os.getenv('PARTITION_UNIT', '').strip().lower()
+PARTITION_AHEAD = int(os.getenv('PARTITION_AHEAD', '7'))
+PARTITION_RETENTION_DAYS = int(os.getenv('PARTITION_RETENTION_DAYS', '0'))
+PARTITION_ARCHIVE = os.getenv('PARTITION_ARCHIVE', '0') == '1'
+PARTITION_UNITS = ('day', 'month')
+MAX_PARTITIONS = 8192  # MySQL 單一資料表的 partition 上限
+
+UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'ignore').strip().lower()
+UPLOAD_MODES = ('append', 'ignore', 'upsert', 'replace-range')
+UPLOAD_CHUNKSIZE = int(os.getenv('UPLOAD_CHUNKSIZE', '5000'))
+UPLOAD_KEY = os.getenv('UPLOAD_KEY', '').strip()
+UNIQUE_KEY_NAME = 'uq_natural_key'
+KEY_VARCHAR_LENGTH = 64
+
+_PARTITION_NAME_RE = re.compile(r'^p(\d{4})(\d{2})(\d{2})?$')
+
 # 資料檔案路徑
 # CSV_PATH = 'data/equipment_data_with_11days.csv'
 
-# MySQL 連線參數（可改從環境變數讀取）# 載入 .env 檔案
-load_dotenv()
-MYSQL_HOST = os.getenv('MYSQL_HOST')
-MYSQL_PORT = int(os.getenv('MYSQL_PORT'))
-MYSQL_USER = os.getenv('MYSQL_USER')
-MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD')
-MYSQL_DB = os.getenv('MYSQL_DB')  # 若不存在會自動建立
-MYSQL_TABLE = os.getenv('MYSQL_TABLE')
-
 # 讀取完整數據
+# import pandas as pd
 # df_loaded = pd.read_csv(CSV_PATH, parse_dates=['Time'])
 
 # # 顯示數據的前幾行
 # print('Data preview:')
 # print(df_loaded.head())
 
-# 上傳至 MySQL
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
-
 
 def get_engine(database: str | None = None):
 	"""建立 SQLAlchemy engine，若 database 為 None，連線到不含 DB 的伺服器。"""
+	from sqlalchemy import create_engine
+	from sqlalchemy.engine import URL
+
 	if database:
 		url = URL.create(
 			drivername='mysql+pymysql',
@@ -54,13 +107,35 @@ def get_engine(database: str | None = None):
 
 
 def ensure_database_exists(db_name: str):
+	from sqlalchemy import text
+
 	engine = get_engine(None)
 	with engine.connect() as conn:
 		conn.execute(text(f"CREATE DATABASE IF NOT EXISTS `{db_name}` DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"))
 		conn.commit()
 
 
-def upload_dataframe(df: pd.DataFrame, db_name: str, table_name: str):
+def upload_dataframe(
+	df: pd.DataFrame,
+	db_name: str,
+	table_name: str,
+	mode: str | None = None,
+	chunksize: int = UPLOAD_CHUNKSIZE,
+) -> UploadReport:
+	"""
+	mode（預設 UPLOAD_MODE）：
+	  - append         直接附加（舊行為，不檢查重複）
+	  - ignore         以自然鍵（時間 + 設備）的 UNIQUE KEY 搭配 INSERT IGNORE，已存在的列略過
+	  - upsert         INSERT ... ON DUPLICATE KEY UPDATE，已存在的列以新值覆寫
+	  - replace-range  同一個交易內先刪除這批資料的時間範圍（只限檔案內的設備），再寫入
+	重複執行同一批資料時 ignore / upsert / replace-range 都不會增加列數。
+	"""
+	import pandas as pd
+
+	mode = (mode or UPLOAD_MODE).strip().lower()
+	if mode not in UPLOAD_MODES:
+		raise ValueError(f"mode 必須是 {', '.join(UPLOAD_MODES)} 之一，收到 {mode!r}")
+	started = time.perf_counter()
 	ensure_database_exists(db_name)
 	engine = get_engine(db_name)
 
@@ -71,18 +146,617 @@ def upload_dataframe(df: pd.DataFrame, db_name: str, table_name: str):
 	# 將 numpy 型別轉為 Python 原生型別以避免 to_sql 警告
 	df = df.where(pd.notnull(df), None)
 
-	# 寫入資料（若表存在則附加）
-	print(f'Uploading {len(df)} rows to {db_name}.{table_name} ...')
+	report = UploadReport(mode, len(df))
+	time_col = equipment_col = None
+	if mode != 'append':
+		report.key = natural_key(list(df.columns))
+		if mode in ('upsert', 'replace-range'):
+			# 在寫入任何資料之前檢查，UPLOAD_KEY 的順序不影響時間 / 設備欄位的判斷
+			time_col, equipment_col = _key_columns(report.key, mode)
+		# 同一個檔案內的重複列只保留最後一筆
+		df = df.drop_duplicates(subset=report.key, keep='last')
+		report.in_file_duplicates = report.rows - len(df)
+
+	# 第一次上傳時先建立空的資料表，唯一鍵與 partition 都在寫入資料之前建立（空表上幾乎不花時間）
+	with engine.begin() as conn:
+		if not _table_exists(conn, db_name, table_name):
+			df.head(0).to_sql(table_name, con=conn, index=False, dtype=_key_dtypes(df, report.key))
+	if report.key:
+		with engine.connect() as conn:
+			ensure_unique_key(conn, db_name, table_name, report.key)
+
+	# 先補齊這批資料會用到的 partition，新資料不會落在 pmax
+	if PARTITION_UNIT:
+		span = _date_span(df)
+		maintain_partitions(
+			engine, db_name, table_name, since=span[0] if span else None, through=span[1] if span else None
+		)
+
+	print(f'Uploading {len(df)} rows to {db_name}.{table_name} ({mode}) ...')
 	with engine.begin() as conn:
-		df.to_sql(table_name, con=conn, if_exists='append', index=False)
-	print('Upload done.')
+		if mode == 'replace-range':
+			report.deleted = _delete_range(conn, table_name, df, time_col, equipment_col)
+		if mode in ('append', 'replace-range'):
+			df.to_sql(table_name, con=conn, if_exists='append', index=False, chunksize=chunksize)
+			report.inserted = len(df)
+		elif mode == 'ignore':
+			inserted = df.to_sql(
+				table_name, con=conn, if_exists='append', index=False, chunksize=chunksize,
+				method=_insert_method(mode, report.key),
+			)
+			report.inserted = int(inserted or 0)
+		else:
+			# ON DUPLICATE KEY UPDATE 的 affected rows 無法分出新增與更新，改以範圍內的列數差計算
+			before = _count_range(conn, table_name, df, time_col)
+			df.to_sql(
+				table_name, con=conn, if_exists='append', index=False, chunksize=chunksize,
+				method=_insert_method(mode, report.key),
+			)
+			report.inserted = _count_range(conn, table_name, df, time_col) - before
+		if mode in ('ignore', 'upsert'):
+			report.skipped_duplicates = len(df) - report.inserted
+	report.elapsed_s = time.perf_counter() - started
+	print(report.format())
+
+	# 重算這批資料涵蓋日期的特徵（見 feature_store）；特徵由 vibration_db 的連線讀取，只處理預設資料表
+	span = _date_span(df)
+	if span is not None and table_name == MYSQL_TABLE and db_name == MYSQL_DB:
+		import feature_store
+
+		if feature_store.FEATURE_ON_UPLOAD:
+			print(feature_store.backfill(*span))
+	return report
+
+
+def _date_span(df) -> tuple[date, date] | None:
+	"""時間欄位（名稱含 time / date 的第一個欄位）的最早與最晚日期。"""
+	import pandas as pd
+
+	for col in df.columns:
+		if 'time' in col.lower() or 'date' in col.lower():
+			times = pd.to_datetime(df[col], errors='coerce')
+			first, last = times.min(), times.max()
+			return None if pd.isna(first) else (first.date(), last.date())
+	return None
+
+
+# ----------------------------------------------------------------------
+# 去重（自然鍵）
+# ----------------------------------------------------------------------
+@dataclass
+class UploadReport:
+	mode: str
+	rows: int  # DataFrame 的列數
+	in_file_duplicates: int = 0  # 檔案內重複（只保留最後一筆）
+	inserted: int = 0
+	skipped_duplicates: int = 0  # 資料表已有相同的鍵（ignore 略過、upsert 覆寫）
+	deleted: int = 0  # replace-range 刪除的舊資料
+	key: list[str] = field(default_factory=list)
+	elapsed_s: float = 0.0
+
+	def format(self) -> str:
+		text = f"Upload done ({self.mode}, {self.elapsed_s:.1f}s): {self.rows} rows, inserted {self.inserted}"
+		if self.key:
+			text += f", key ({', '.join(self.key)})"
+		if self.in_file_duplicates:
+			text += f", in-file duplicates dropped {self.in_file_duplicates}"
+		if self.mode == 'ignore':
+			text += f", duplicates skipped {self.skipped_duplicates}"
+		elif self.mode == 'upsert':
+			text += f", existing rows updated {self.skipped_duplicates}"
+		elif self.mode == 'replace-range':
+			text += f", replaced rows deleted {self.deleted}"
+		return text
+
+
+def natural_key(columns: list[str]) -> list[str]:
+	"""UPLOAD_KEY，或時間欄位 + 設備欄位（與 vibration_db 的欄位偵測相同）。"""
+	if UPLOAD_KEY:
+		return [col.strip() for col in UPLOAD_KEY.split(',') if col.strip()]
+	from vibration_db import detect_equipment_column
+
+	time_col = next((col for col in columns if 'time' in col.lower() or 'date' in col.lower()), None)
+	if time_col is None:
+		raise ValueError("找不到時間欄位，請以 UPLOAD_KEY 指定唯一鍵欄位")
+	equipment_col = detect_equipment_column(columns)
+	return [time_col] + ([equipment_col] if equipment_col else [])
+
+
+def _key_columns(key: list[str], mode: str) -> tuple[str, str | None]:
+	"""
+	以欄位名稱找出鍵中的時間與設備欄位（偵測方式同 natural_key），回傳 (時間欄位, 設備欄位或 None)。
+	upsert 依時間範圍計算新增列數、replace-range 依時間範圍刪除，鍵中沒有時間欄位時直接報錯。
+	"""
+	from vibration_db import detect_equipment_column
+
+	time_col = next((col for col in key if 'time' in col.lower() or 'date' in col.lower()), None)
+	if time_col is None:
+		raise ValueError(f"{mode} 需要唯一鍵包含時間欄位（名稱含 time / date），目前的鍵為 ({', '.join(key)})")
+	equipment_col = detect_equipment_column([col for col in key if col != time_col])
+	extra = [col for col in key if col not in (time_col, equipment_col)]
+	if mode == 'replace-range' and extra:
+		# 只依時間與設備刪除會連帶刪掉檔案中沒有的其他鍵值（例如同設備的其他感測器）
+		raise ValueError(
+			f"replace-range 只支援時間欄位 + 設備欄位的唯一鍵，({', '.join(extra)}) 無法判斷刪除範圍；請改用 upsert 或 ignore"
+		)
+	return time_col, equipment_col
+
+
+def _key_dtypes(df, key: list[str]) -> dict:
+	"""文字型別的鍵欄位建立成 VARCHAR（TEXT 欄位不能直接放進 UNIQUE KEY）。"""
+	import pandas as pd
+	from sqlalchemy.types import String
+
+	return {
+		col: String(KEY_VARCHAR_LENGTH)
+		for col in key
+		if not pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_datetime64_any_dtype(df[col])
+	}
+
+
+def _column_types(conn, db_name: str, table_name: str) -> dict[str, str]:
+	from sqlalchemy import text
+
+	rows = conn.execute(text(
+		"""
+		SELECT COLUMN_NAME, DATA_TYPE
+		FROM information_schema.columns
+		WHERE table_schema = :db AND table_name = :table
+		ORDER BY ORDINAL_POSITION
+		"""
+	), {"db": db_name, "table": table_name}).fetchall()
+	return {name: str(data_type).lower() for name, data_type in rows}
+
+
+def _unique_key_sql(conn, db_name: str, table_name: str, key: list[str], target: str | None = None) -> str:
+	types = _column_types(conn, db_name, table_name)
+	missing = [col for col in key if col not in types]
+	if missing:
+		raise ValueError(f"`{table_name}` 沒有唯一鍵欄位 {', '.join(missing)}")
+	# 既有資料表的 TEXT 欄位以前綴長度建立索引
+	parts = [
+		f"`{col}`({KEY_VARCHAR_LENGTH})" if types[col] in ('text', 'mediumtext', 'longtext', 'blob') else f"`{col}`"
+		for col in key
+	]
+	return f"ALTER TABLE `{target or table_name}` ADD UNIQUE KEY `{UNIQUE_KEY_NAME}` ({', '.join(parts)})"
+
+
+def has_unique_key(conn, db_name: str, table_name: str, key: list[str]) -> bool:
+	from sqlalchemy import text
+
+	rows = conn.execute(text(
+		"""
+		SELECT INDEX_NAME, GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX)
+		FROM information_schema.statistics
+		WHERE table_schema = :db AND table_name = :table AND NON_UNIQUE = 0
+		GROUP BY INDEX_NAME
+		"""
+	), {"db": db_name, "table": table_name}).fetchall()
+	return any(str(cols).split(',') == key for _, cols in rows)
+
+
+def count_duplicates(conn, table_name: str, key: list[str]) -> int:
+	"""資料表內多出來的重複列數（同一個鍵有 n 筆時算 n - 1）。"""
+	from sqlalchemy import text
+
+	cols = ", ".join(f"`{col}`" for col in key)
+	return int(conn.execute(text(
+		f"SELECT COALESCE(SUM(n - 1), 0) FROM ("
+		f"SELECT COUNT(*) AS n FROM `{table_name}` GROUP BY {cols} HAVING COUNT(*) > 1) d"
+	)).scalar() or 0)
+
+
+def ensure_unique_key(conn, db_name: str, table_name: str, key: list[str]) -> bool:
+	"""建立自然鍵的 UNIQUE KEY（已存在時不做任何事）；資料表已有重複時請先執行 dedupe。"""
+	from sqlalchemy import text
+
+	if has_unique_key(conn, db_name, table_name, key):
+		return False
+	duplicates = count_duplicates(conn, table_name, key)
+	if duplicates:
+		raise ValueError(
+			f"`{table_name}` 已有 {duplicates} 筆重複資料（鍵 {', '.join(key)}），"
+			"請先執行 python upload_data.py dedupe"
+		)
+	sql = _unique_key_sql(conn, db_name, table_name, key)
+	print(f"[dedupe] {sql}")
+	conn.execute(text(sql))
+	conn.commit()
+	return True
+
+
+def _insert_method(mode: str, key: list[str]):
+	"""to_sql 的 method：INSERT IGNORE 或 INSERT ... ON DUPLICATE KEY UPDATE，回傳 affected rows。"""
+	from sqlalchemy.dialects.mysql import insert
+
+	def method(table, conn, keys, data_iter):
+		stmt = insert(table.table)
+		updates = [col for col in keys if col not in key]
+		if mode == 'upsert' and updates:
+			stmt = stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in updates})
+		else:
+			stmt = stmt.prefix_with('IGNORE')
+		result = conn.execute(stmt, [dict(zip(keys, row)) for row in data_iter])
+		return result.rowcount
+
+	return method
+
+
+def _time_bounds(df, time_col: str):
+	import pandas as pd
+
+	times = pd.to_datetime(df[time_col], errors='coerce')
+	return times.min().to_pydatetime(), times.max().to_pydatetime()
+
+
+def _count_range(conn, table_name: str, df, time_col: str) -> int:
+	"""這批資料時間範圍內的列數（時間欄位有索引 / 分割時只讀這個範圍）。"""
+	from sqlalchemy import text
+
+	low, high = _time_bounds(df, time_col)
+	return int(conn.execute(text(
+		f"SELECT COUNT(*) FROM `{table_name}` WHERE `{time_col}` >= :low AND `{time_col}` <= :high"
+	), {"low": low, "high": high}).scalar() or 0)
+
+
+def _delete_range(conn, table_name: str, df, time_col: str, equipment_col: str | None) -> int:
+	"""刪除這批資料時間範圍內、同樣設備的舊資料（沒有設備欄位時刪除整個時間範圍）。"""
+	from sqlalchemy import bindparam, text
+
+	low, high = _time_bounds(df, time_col)
+	sql = f"DELETE FROM `{table_name}` WHERE `{time_col}` >= :low AND `{time_col}` <= :high"
+	params = {"low": low, "high": high}
+	if equipment_col is not None:
+		sql += f" AND `{equipment_col}` IN :equipment"
+		params["equipment"] = [v for v in df[equipment_col].unique().tolist() if v is not None]
+		stmt = text(sql).bindparams(bindparam("equipment", expanding=True))
+	else:
+		stmt = text(sql)
+	return conn.execute(stmt, params).rowcount
+
+
+def dedupe_table(engine, db_name: str = MYSQL_DB, table_name: str = MYSQL_TABLE, dry_run: bool = False) -> int:
+	"""
+	移除既有的重複列並建立唯一鍵：複製到有 UNIQUE KEY 的新表（INSERT IGNORE ... SELECT），再交換表名。
+	新表以 CREATE TABLE LIKE 建立，索引與 partition 設定都會保留。回傳移除的列數。
+	"""
+	statements: list[str] = []
+	with engine.connect() as conn:
+		key = natural_key(list(_column_types(conn, db_name, table_name)))
+		duplicates = count_duplicates(conn, table_name, key)
+		print(f"[dedupe] `{table_name}` 重複 {duplicates} 筆（鍵 {', '.join(key)}）")
+		if not duplicates:
+			if not dry_run:
+				ensure_unique_key(conn, db_name, table_name, key)
+			return 0
+		staging, old = f"{table_name}__dedup", f"{table_name}__old"
+		_run_ddl(conn, statements, f"CREATE TABLE `{staging}` LIKE `{table_name}`", dry_run)
+		_run_ddl(conn, statements, _unique_key_sql(conn, db_name, table_name, key, target=staging), dry_run)
+		_run_ddl(conn, statements, f"INSERT IGNORE INTO `{staging}` SELECT * FROM `{table_name}`", dry_run)
+		_run_ddl(conn, statements, f"RENAME TABLE `{table_name}` TO `{old}`, `{staging}` TO `{table_name}`", dry_run)
+		_run_ddl(conn, statements, f"DROP TABLE `{old}`", dry_run)
+	return duplicates
+
+
+def upload_csv(path: str, mode: str | None = None) -> UploadReport:
+	import pandas as pd
+
+	df = pd.read_csv(path)
+	for col in df.columns:
+		if 'time' in col.lower() or 'date' in col.lower():
+			df[col] = pd.to_datetime(df[col], errors='coerce')
+	return upload_dataframe(df, MYSQL_DB, MYSQL_TABLE, mode=mode)
+
+
+# ----------------------------------------------------------------------
+# 分割（partition）
+# ----------------------------------------------------------------------
+def unit_start(day: date, unit: str) -> date:
+	return day if unit == 'day' else day.replace(day=1)
+
+
+def next_start(start: date, unit: str) -> date:
+	if unit == 'day':
+		return start + timedelta(days=1)
+	return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def partition_name(start: date, unit: str) -> str:
+	"""day → p20250720，month → p202507。"""
+	return f"p{start:%Y%m%d}" if unit == 'day' else f"p{start:%Y%m}"
+
+
+def _partition_start(name: str) -> date | None:
+	match = _PARTITION_NAME_RE.match(name)
+	if not match:
+		return None
+	year, month, day = match.groups()
+	return date(int(year), int(month), int(day or 1))
+
+
+def _time_column(conn, db_name: str, table_name: str) -> tuple[str, str] | None:
+	"""(時間欄位, DATA_TYPE)；與 vibration_db.detect_columns 相同，取名稱含 time / date 的第一個欄位。"""
+	from sqlalchemy import text
+
+	rows = conn.execute(text(
+		"""
+		SELECT COLUMN_NAME, DATA_TYPE
+		FROM information_schema.columns
+		WHERE table_schema = :db AND table_name = :table
+		ORDER BY ORDINAL_POSITION
+		"""
+	), {"db": db_name, "table": table_name}).fetchall()
+	for name, data_type in rows:
+		if 'time' in name.lower() or 'date' in name.lower():
+			return name, str(data_type).lower()
+	return None
+
+
+def _partition_bound(data_type: str):
+	"""分割運算式與 VALUES LESS THAN 的寫法；TIMESTAMP 欄位只能用 UNIX_TIMESTAMP。"""
+	if data_type in ('date', 'datetime'):
+		return "TO_DAYS(`{col}`)", lambda day: f"TO_DAYS('{day.isoformat()}')"
+	if data_type == 'timestamp':
+		return "UNIX_TIMESTAMP(`{col}`)", lambda day: f"UNIX_TIMESTAMP('{day.isoformat()}')"
+	raise ValueError(f"時間欄位型別為 {data_type}，需要 DATE / DATETIME / TIMESTAMP 才能依日期分割")
+
+
+def list_partitions(conn, db_name: str, table_name: str) -> list[tuple[str, int]]:
+	"""(partition 名稱, 估計列數)，依順序；未分割的資料表回傳空清單。"""
+	from sqlalchemy import text
+
+	rows = conn.execute(text(
+		"""
+		SELECT PARTITION_NAME, TABLE_ROWS
+		FROM information_schema.partitions
+		WHERE table_schema = :db AND table_name = :table AND PARTITION_NAME IS NOT NULL
+		ORDER BY PARTITION_ORDINAL_POSITION
+		"""
+	), {"db": db_name, "table": table_name}).fetchall()
+	return [(name, int(rows_ or 0)) for name, rows_ in rows]
+
+
+def _table_exists(conn, db_name: str, table_name: str) -> bool:
+	from sqlalchemy import text
+
+	return conn.execute(text(
+		"SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = :db AND table_name = :table"
+	), {"db": db_name, "table": table_name}).scalar() > 0
+
+
+def _check_unique_keys(conn, db_name: str, table_name: str, time_col: str):
+	"""MySQL 要求每個 PRIMARY / UNIQUE KEY 都包含分割欄位，否則 ALTER 會失敗。"""
+	from sqlalchemy import text
+
+	rows = conn.execute(text(
+		"""
+		SELECT INDEX_NAME, GROUP_CONCAT(COLUMN_NAME)
+		FROM information_schema.statistics
+		WHERE table_schema = :db AND table_name = :table AND NON_UNIQUE = 0
+		GROUP BY INDEX_NAME
+		"""
+	), {"db": db_name, "table": table_name}).fetchall()
+	missing = [name for name, cols in rows if time_col not in str(cols).split(',')]
+	if missing:
+		raise ValueError(f"唯一索引 {', '.join(missing)} 不含時間欄位 `{time_col}`，無法依日期分割")
+
+
+def _partition_defs(starts: list[date], unit: str, bound) -> list[str]:
+	defs = [f"PARTITION {partition_name(s, unit)} VALUES LESS THAN ({bound(next_start(s, unit))})" for s in starts]
+	return defs + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+
+
+def _run_ddl(conn, statements: list[str], sql: str, dry_run: bool):
+	from sqlalchemy import text
+
+	statements.append(sql)
+	print(f"[partition] {'(dry-run) ' if dry_run else ''}{sql}")
+	if not dry_run:
+		conn.execute(text(sql))
+		conn.commit()
+
+
+def maintain_partitions(
+	engine,
+	db_name: str = MYSQL_DB,
+	table_name: str = MYSQL_TABLE,
+	unit: str | None = None,
+	ahead: int | None = None,
+	retention_days: int | None = None,
+	archive: bool | None = None,
+	since: date | None = None,
+	through: date | None = None,
+	today: date | None = None,
+	dry_run: bool = False,
+) -> list[str]:
+	"""
+	確保資料表依日期分割且 partition 涵蓋到 max(through, today) 再往後 ahead 個單位，並移除 / 封存過期的 partition。
+	since 為即將寫入的資料最早日期：第一次分割（空表）時 partition 從這天開始，而不是從今天；
+	已分割時若早於第一個 partition，會把第一個 partition 拆出更早的 partition，舊資料不會全擠在同一個 partition。
+	回傳執行（dry_run 時為預計執行）的 DDL；資料表不存在時不做任何事。
+	"""
+	unit = unit or PARTITION_UNIT or 'month'
+	if unit not in PARTITION_UNITS:
+		raise ValueError(f"PARTITION_UNIT 必須是 {' 或 '.join(PARTITION_UNITS)}，收到 {unit!r}")
+	ahead = PARTITION_AHEAD if ahead is None else ahead
+	retention_days = PARTITION_RETENTION_DAYS if retention_days is None else retention_days
+	archive = PARTITION_ARCHIVE if archive is None else archive
+	today = today or date.today()
+
+	# 最後一個 partition 的起點：資料或今天（較晚者）再往後 ahead 個單位
+	last = unit_start(max(through or today, today), unit)
+	for _ in range(ahead):
+		last = next_start(last, unit)
+
+	statements: list[str] = []
+	with engine.connect() as conn:
+		if not _table_exists(conn, db_name, table_name):
+			return statements
+		found = _time_column(conn, db_name, table_name)
+		if found is None:
+			raise ValueError(f"`{table_name}` 沒有時間欄位，無法依日期分割")
+		time_col, data_type = found
+		expr, bound = _partition_bound(data_type)
+		existing = list_partitions(conn, db_name, table_name)
+
+		if not existing:
+			statements += _create_partitions(conn, db_name, table_name, time_col, expr, bound, unit, last, since, dry_run)
+		else:
+			if since is not None:
+				statements += _prepend_partitions(conn, table_name, existing, bound, unit, since, dry_run)
+			statements += _add_partitions(conn, table_name, existing, bound, unit, last, dry_run)
+			if retention_days > 0:
+				cutoff = today - timedelta(days=retention_days)
+				statements += _expire_partitions(conn, table_name, existing, unit, cutoff, archive, dry_run)
+	return statements
+
+
+def _create_partitions(conn, db_name, table_name, time_col, expr, bound, unit, last, since, dry_run) -> list[str]:
+	"""把未分割的資料表轉成 RANGE 分割（一次性，會重建資料表）；從既有資料與 since 中較早的日期開始。"""
+	from sqlalchemy import text
+
+	_check_unique_keys(conn, db_name, table_name, time_col)
+	first = conn.execute(text(f"SELECT MIN(`{time_col}`) FROM `{table_name}`")).scalar()
+	if isinstance(first, datetime):
+		first = first.date()
+	candidates = [day for day in (first, since) if day is not None]
+	start = unit_start(min(candidates) if candidates else date.today(), unit)
+	starts = [start]
+	while starts[-1] < last:
+		starts.append(next_start(starts[-1], unit))
+	if len(starts) + 1 > MAX_PARTITIONS:
+		raise ValueError(f"需要 {len(starts) + 1} 個 partition，超過 MySQL 上限 {MAX_PARTITIONS}，請改用 month")
+	statements: list[str] = []
+	sql = (
+		f"ALTER TABLE `{table_name}` PARTITION BY RANGE ({expr.format(col=time_col)}) "
+		f"({', '.join(_partition_defs(starts, unit, bound))})"
+	)
+	_run_ddl(conn, statements, sql, dry_run)
+	return statements
+
+
+def _prepend_partitions(conn, table_name, existing, bound, unit, since, dry_run) -> list[str]:
+	"""
+	since 早於第一個 partition 時，以 REORGANIZE 把第一個 partition 拆成更早的幾個 partition
+	（第一個 partition 沒有下界，舊資料原本會全部落在裡面，無法依日期裁剪也不會過期）。
+	只會重寫第一個 partition 內的資料。
+	"""
+	first_name = existing[0][0]
+	first = _partition_start(first_name)
+	if first is None:
+		print(f"[partition] `{table_name}` 的 partition 不是由這裡建立的，略過往前新增")
+		return []
+	new = []
+	cursor = unit_start(since, unit)
+	while cursor < first:
+		new.append(cursor)
+		cursor = next_start(cursor, unit)
+	statements: list[str] = []
+	if not new:
+		return statements
+	if len(existing) + len(new) > MAX_PARTITIONS:
+		raise ValueError(
+			f"資料最早為 {since}，往前補 partition 需要 {len(existing) + len(new)} 個，"
+			f"超過 MySQL 上限 {MAX_PARTITIONS}；請改用 month 或先清理舊 partition"
+		)
+	defs = _partition_defs(new + [first], unit, bound)[:-1]
+	sql = f"ALTER TABLE `{table_name}` REORGANIZE PARTITION {first_name} INTO ({', '.join(defs)})"
+	_run_ddl(conn, statements, sql, dry_run)
+	return statements
+
+
+def _add_partitions(conn, table_name, existing, bound, unit, last, dry_run) -> list[str]:
+	"""把 pmax 拆成新的 partition（pmax 通常是空的，只改中繼資料）。"""
+	starts = [s for s in (_partition_start(name) for name, _ in existing) if s is not None]
+	if not starts or 'pmax' not in {name for name, _ in existing}:
+		print(f"[partition] `{table_name}` 的 partition 不是由這裡建立的，略過新增")
+		return []
+	new = []
+	cursor = next_start(max(starts), unit)
+	while cursor <= last:
+		new.append(cursor)
+		cursor = next_start(cursor, unit)
+	statements: list[str] = []
+	if new:
+		sql = (
+			f"ALTER TABLE `{table_name}` REORGANIZE PARTITION pmax INTO "
+			f"({', '.join(_partition_defs(new, unit, bound))})"
+		)
+		_run_ddl(conn, statements, sql, dry_run)
+	return statements
+
+
+def _expire_partitions(conn, table_name, existing, unit, cutoff, archive, dry_run) -> list[str]:
+	"""整個 partition 都早於 cutoff 時移除；archive 時先交換到 `<table>_<partition>` 封存表。"""
+	expired = []
+	for name, _ in existing:
+		start = _partition_start(name)
+		if start is not None and next_start(start, unit) <= cutoff:
+			expired.append(name)
+	# 至少留下一個有下界的 partition，避免 REORGANIZE 時找不到起點
+	dated = [name for name, _ in existing if _partition_start(name) is not None]
+	expired = expired[: max(len(dated) - 1, 0)]
+	statements: list[str] = []
+	if not expired:
+		return statements
+	if archive:
+		for name in expired:
+			archive_table = f"{table_name}_{name}"
+			_run_ddl(conn, statements, f"CREATE TABLE `{archive_table}` LIKE `{table_name}`", dry_run)
+			_run_ddl(conn, statements, f"ALTER TABLE `{archive_table}` REMOVE PARTITIONING", dry_run)
+			_run_ddl(conn, statements, f"ALTER TABLE `{table_name}` EXCHANGE PARTITION {name} WITH TABLE `{archive_table}`", dry_run)
+	_run_ddl(conn, statements, f"ALTER TABLE `{table_name}` DROP PARTITION {', '.join(expired)}", dry_run)
+	return statements
+
+
+def print_partitions(db_name: str = MYSQL_DB, table_name: str = MYSQL_TABLE):
+	engine = get_engine(db_name)
+	with engine.connect() as conn:
+		partitions = list_partitions(conn, db_name, table_name)
+	if not partitions:
+		print(f"`{db_name}`.`{table_name}` 沒有分割（或資料表不存在）。")
+		return
+	print(f"`{db_name}`.`{table_name}` 共 {len(partitions)} 個 partition：")
+	for name, rows in partitions:
+		print(f"  {name:<10} {rows:>12} rows（估計）")
 
 
 if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="上傳資料與維護日期分割")
+	sub = parser.add_subparsers(dest="command")
+	part = sub.add_parser("partitions", help="建立 / 補齊 partition，移除或封存過期的 partition")
+	part.add_argument("--unit", choices=PARTITION_UNITS, default=PARTITION_UNIT or 'month')
+	part.add_argument("--ahead", type=int, default=PARTITION_AHEAD, help="預先建立幾個單位")
+	part.add_argument("--retention-days", type=int, default=PARTITION_RETENTION_DAYS, help="保留天數，0 表示不移除")
+	part.add_argument("--archive", action="store_true", default=PARTITION_ARCHIVE, help="移除前先封存到 <table>_<partition>")
+	part.add_argument("--dry-run", action="store_true", help="只印出 DDL，不執行")
+	sub.add_parser("status", help="列出 partition 與估計列數")
+	upload = sub.add_parser("upload", help="上傳 CSV")
+	upload.add_argument("csv_path")
+	upload.add_argument("--mode", choices=UPLOAD_MODES, default=UPLOAD_MODE)
+	dedupe = sub.add_parser("dedupe", help="移除既有的重複列並建立唯一鍵（會複製整個資料表）")
+	dedupe.add_argument("--dry-run", action="store_true", help="只計算重複數並印出 DDL，不執行")
+	args = parser.parse_args()
+
 	try:
 		ensure_database_exists(MYSQL_DB)
+		if args.command == "partitions":
+			maintain_partitions(
+				get_engine(MYSQL_DB),
+				unit=args.unit,
+				ahead=args.ahead,
+				retention_days=args.retention_days,
+				archive=args.archive,
+				dry_run=args.dry_run,
+			)
+			print_partitions()
+		elif args.command == "status":
+			print_partitions()
+		elif args.command == "upload":
+			upload_csv(args.csv_path, args.mode)
+		elif args.command == "dedupe":
+			dedupe_table(get_engine(MYSQL_DB), dry_run=args.dry_run)
 		#upload_dataframe(df_loaded, MYSQL_DB, MYSQL_TABLE)
 	except Exception as e:
 		print('Upload failed:', e)
 		raise
-
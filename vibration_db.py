@@ -0,0 +1,1000 @@
+"""
+振動資料表（equipment_data）的共用查詢。
+
+所有查詢都使用 unbuffered cursor 並以 fetchmany 分批處理（見 db_stream），
+統計量一次走訪計算、輸出逐行格式化且有上限，記憶體不隨當天資料量成長。
+"""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from db_stream import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_LINES,
+    BoundedTextWriter,
+    RunningStats,
+    as_float,
+    iter_batches,
+    iter_rows,
+)
+from date_parser import with_valid_date
+from query_guard import QUERY_GUARD
+from settings import MYSQL_DB, MYSQL_HOST, MYSQL_PASSWORD, MYSQL_PORT, MYSQL_TABLE, MYSQL_USER
+
+def _open_connection(timeout_s: float, source=None):
+    import mysql.connector
+
+    return mysql.connector.connect(
+        host=MYSQL_HOST if source is None else source.host,
+        port=MYSQL_PORT if source is None else source.port,
+        user=MYSQL_USER if source is None else source.user,
+        password=MYSQL_PASSWORD if source is None else source.password,
+        database=MYSQL_DB if source is None else source.database,
+        # 提前結束串流時，關閉 cursor 會自動讀掉剩餘結果
+        consume_results=True,
+        # driver 端的最後防線：伺服器沒有回應時不會無限等待
+        connection_timeout=max(int(timeout_s + 0.999), 1),
+    )
+
+
+def _kill_query(connection_id: int, source=None):
+    """另開一條連線中止指定連線正在執行的查詢（連線本身保留，由原本的工具關閉）。"""
+    conn = _open_connection(QUERY_GUARD.grace_s + 5, source)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def connect(source=None):
+    """
+    開啟連線並套用目前工具呼叫的查詢期限（見 query_guard）。
+    source 為 multi_source.DBSource 時連到該廠區的資料庫，None 表示 settings 的 MYSQL_*。
+    """
+    scope = QUERY_GUARD.current()
+    # socket timeout 比監看計時器多一段寬限，逾時時優先由 KILL QUERY 乾淨地中止
+    conn = _open_connection(max(scope.remaining, 0) + 2 * QUERY_GUARD.grace_s, source)
+    kill = _kill_query if source is None else (lambda connection_id: _kill_query(connection_id, source))
+    return QUERY_GUARD.attach(conn, kill=kill, scope=scope)
+
+
+def _query_error(prefix: str, e: Exception) -> str:
+    return QUERY_GUARD.describe(e) or f"{prefix}: {e}"
+
+
+def detect_columns(cursor, table: str = MYSQL_TABLE):
+    """回傳 (所有欄位, vibration 欄位, 時間欄位列表)。"""
+    cursor.execute(f"SHOW COLUMNS FROM `{table}`")
+    columns = [row[0] for row in cursor.fetchall()]
+    vibration_col = next((col for col in columns if 'vibration' in col.lower()), None)
+    time_columns = [col for col in columns if 'time' in col.lower() or 'date' in col.lower()]
+    return columns, vibration_col, time_columns
+
+
+def day_range(date_str: str) -> tuple[str, str]:
+    """YYYY-MM-DD → (當天, 隔天)，搭配 _day_filter 的半開區間使用。"""
+    start = date.fromisoformat(date_str)
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+
+def _day_filter(time_col: str, alias: str = "") -> str:
+    """
+    當天的條件寫成時間欄位的範圍（>= 當天 AND < 隔天），不用 DATE(col) = %s：
+    欄位沒有包在函式裡，才能走時間索引，資料表依日期分割時也只會讀當天的 partition（見 upload_data.py）。
+    參數用 day_range(date_str)。
+    """
+    return f"{alias}`{time_col}` >= %s AND {alias}`{time_col}` < %s"
+
+
+EQUIPMENT_KEYWORDS = ("equipment", "equip", "machine", "device", "asset", "sensor", "設備", "機台")
+
+
+def detect_equipment_column(columns: list[str]) -> str | None:
+    """找出設備識別欄位（名稱包含 equipment / machine / device ... 等關鍵字）。"""
+    for keyword in EQUIPMENT_KEYWORDS:
+        for col in columns:
+            lowered = col.lower()
+            if keyword in lowered and 'vibration' not in lowered and 'time' not in lowered and 'date' not in lowered:
+                return col
+    return None
+
+
+def _format_stats(stats: RunningStats) -> str:
+    return (
+        f"count={stats.count}, min={stats.min}, max={stats.max}, "
+        f"mean={stats.mean:.6g}, std={stats.std:.6g}"
+    )
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def get_vibration_all_on_date(
+    date_str: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_lines: int = DEFAULT_MAX_LINES,
+) -> str:
+    """串流讀取當天所有振動資料；超過 max_lines 的部分只納入統計。"""
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        columns, vibration_col, time_columns = detect_columns(cursor)
+        if not vibration_col:
+            return "No vibration column found."
+        if not time_columns:
+            return "No time/date columns found for filtering."
+        time_col = time_columns[0]
+        query = (
+            f"SELECT `{time_col}`, `{vibration_col}` "
+            f"FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)} "
+            f"ORDER BY `{time_col}` ASC"
+        )
+        cursor.close()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, day_range(date_str))
+
+        writer = BoundedTextWriter(max_lines=max_lines)
+        stats = RunningStats()
+        interrupted = None
+        try:
+            for row in iter_rows(cursor, batch_size):
+                value = as_float(row[1])
+                if value is not None:
+                    stats.add(value)
+                if writer.full:
+                    writer.skip()
+                else:
+                    writer.write_line(f"{time_col}: {row[0]}, {vibration_col}: {row[1]}")
+        except Exception as e:
+            # 逾時 / 取消時保留已讀到的部分，並標示為部分結果
+            interrupted = QUERY_GUARD.describe(e, partial=f"以下只包含中止前讀到的 {stats.count} 筆。")
+            if interrupted is None or not writer.lines:
+                raise
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            cursor = None
+
+        if interrupted:
+            return f"{interrupted}\n{writer.getvalue()}\n[部分統計] {_format_stats(stats)}"
+        if not writer.lines:
+            return f"{date_str} 沒有資料。"
+        if writer.omitted:
+            return (
+                f"{writer.getvalue()}\n"
+                f"...（另有 {writer.omitted} 筆未列出）\n"
+                f"[統計] {_format_stats(stats)}"
+            )
+        return writer.getvalue()
+    except Exception as e:
+        return _query_error("Error retrieving vibration data", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def get_vibration_max_on_date(date_str: str) -> str:
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        columns, vibration_col, time_columns = detect_columns(cursor)
+        if not vibration_col:
+            return "No vibration column found."
+        if not time_columns:
+            return "No time/date columns found for filtering."
+        time_col = time_columns[0]
+        query = (
+            f"SELECT `{time_col}`, `{vibration_col}` "
+            f"FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)} "
+            f"ORDER BY `{vibration_col}` DESC "
+            f"LIMIT 1"
+        )
+        cursor.execute(query, day_range(date_str))
+        row = cursor.fetchone()
+        if row:
+            return f"在 {date_str}，最大 {vibration_col} 為 {row[1]}，發生於 {time_col}: {row[0]}"
+        else:
+            return f"{date_str} 沒有資料。"
+    except Exception as e:
+        return _query_error("Error retrieving vibration data", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+OUTLIER_OUTPUTS = ("text", "json")
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def find_vibration_outliers_on_date(
+    date_str: str,
+    threshold: float = 3.0,
+    columns: list[str] | None = None,
+    top_k: int | None = None,
+    output: str = "text",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_lines: int = DEFAULT_MAX_LINES,
+    max_tokens: int | None = None,
+) -> str:
+    """
+    平均值與標準差由 MySQL 聚合計算，離群列由伺服器端篩選後再串流格式化，
+    Python 端不需要保存當天的所有列。
+
+    columns 只回傳指定欄位（預設全部欄位；結構化輸出時預設時間、振動值與設備欄位）。
+    top_k 或 output="json" 時改為結構化結果：伺服器以 ORDER BY 偏離量 DESC LIMIT k 只回傳 k 筆，
+    總數由 COUNT(*) OVER () 一併算出，工具與模型 context 的成本都只與 k 有關。
+    max_tokens 限制 json 輸出的大小：超過時從偏離最小的一端捨棄列，並以 "truncated" 記錄捨棄筆數，
+    輸出永遠是完整可解析的 JSON。
+    """
+    if output not in OUTLIER_OUTPUTS:
+        return f"Unknown output {output}, expected one of {', '.join(OUTLIER_OUTPUTS)}."
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        all_columns, vibration_col, time_columns = detect_columns(cursor)
+        if not vibration_col:
+            return "No vibration column found."
+        if not time_columns:
+            return "No time/date columns found for filtering."
+        time_col = time_columns[0]
+        unknown = [col for col in columns or [] if col not in all_columns]
+        if unknown:
+            return f"Unknown columns {', '.join(unknown)}, available: {', '.join(all_columns)}."
+
+        cursor.execute(
+            f"SELECT COUNT(*), COUNT(`{vibration_col}`), AVG(`{vibration_col}`), STDDEV_POP(`{vibration_col}`) "
+            f"FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)}",
+            day_range(date_str),
+        )
+        total, valid, avg, std = cursor.fetchone()
+        if not total:
+            return f"{date_str} 沒有資料。"
+        if not valid:
+            return "No valid vibration data found."
+        avg, std = float(avg), float(std or 0.0)
+        if std <= 0:
+            return f"{date_str} 沒有發現離群值。"
+
+        cursor.close()
+        cursor = conn.cursor(buffered=False)
+        if top_k is not None or output == "json":
+            if not columns:
+                equipment_col = detect_equipment_column(all_columns)
+                columns = [time_col, vibration_col] + ([equipment_col] if equipment_col else [])
+            return _outliers_top_k(
+                cursor, date_str, time_col, vibration_col, columns, avg, std, threshold, int(top_k or 20), total, output,
+                max_tokens,
+            )
+
+        projection = ", ".join(f"`{col}`" for col in columns) if columns else "*"
+        cursor.execute(
+            f"SELECT {projection} FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)} AND ABS(`{vibration_col}` - %s) > %s",
+            day_range(date_str) + (avg, threshold * std),
+        )
+        names = cursor.column_names
+        writer = BoundedTextWriter(max_lines=max_lines)
+        for idx, row in enumerate(iter_rows(cursor, batch_size), 1):
+            if writer.full:
+                writer.skip()
+                continue
+            info = ", ".join(f"{k}: {v}" for k, v in zip(names, row))
+            writer.write_line(f"{idx}. {info}")
+
+        if not writer.lines:
+            return f"{date_str} 沒有發現離群值。"
+        result = "離群值資料如下：\n" + writer.getvalue()
+        if writer.omitted:
+            result += f"\n...（另有 {writer.omitted} 筆離群值未列出）"
+        return result
+    except Exception as e:
+        return _query_error("Error finding vibration outliers", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+def _outliers_top_k(
+    cursor,
+    date_str: str,
+    time_col: str,
+    vibration_col: str,
+    columns: list[str],
+    avg: float,
+    std: float,
+    threshold: float,
+    top_k: int,
+    total_rows: int,
+    output: str,
+    max_tokens: int | None = None,
+) -> str:
+    """偏離量最大的 top_k 筆與離群總數（單一查詢）；json 時欄位名稱只出現一次，每筆為一個陣列。"""
+    import json
+
+    from output_governor import estimate_tokens
+
+    deviation = f"ABS(`{vibration_col}` - %s)"
+    projection = ", ".join(f"`{col}`" for col in columns)
+    cursor.execute(
+        f"SELECT {projection}, {deviation} AS deviation, COUNT(*) OVER () AS n_outliers "
+        f"FROM `{MYSQL_TABLE}` "
+        f"WHERE {_day_filter(time_col)} AND {deviation} > %s "
+        f"ORDER BY deviation DESC LIMIT {max(int(top_k), 1)}",
+        (avg,) + day_range(date_str) + (avg, threshold * std),
+    )
+    rows = cursor.fetchall()
+    n_outliers = int(rows[0][-1]) if rows else 0
+    scored = [list(row[:-2]) + [round(float(row[-2]) / std, 3)] for row in rows]
+
+    if output == "json":
+        payload = {
+            "date": date_str,
+            "mean": avg,
+            "std": std,
+            "threshold": threshold,
+            "total_rows": int(total_rows),
+            "total_outliers": n_outliers,
+            "returned": len(scored),
+            "columns": columns + ["score"],
+            "rows": scored,
+        }
+
+        def dump(n: int) -> str:
+            payload["rows"] = scored[:n]
+            payload["returned"] = n
+            if n < len(scored):
+                payload["truncated"] = len(scored) - n
+            else:
+                payload.pop("truncated", None)
+            return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+
+        text = dump(len(scored))
+        if max_tokens is None or estimate_tokens(text) <= max_tokens:
+            return text
+        # 列依偏離量排序，二分搜尋能放進預算的最多前 n 筆
+        lo, hi = 0, len(scored) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if estimate_tokens(dump(mid)) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return dump(lo)
+    if not scored:
+        return f"{date_str} 沒有發現離群值。"
+    lines = [
+        f"{date_str} 共 {total_rows} 筆，離群值 {n_outliers} 筆（平均值={avg:.6g}, 標準差={std:.6g}, "
+        f"threshold={threshold}），偏離最大的 {len(scored)} 筆："
+    ]
+    for idx, row in enumerate(scored, 1):
+        info = ", ".join(f"{k}: {v}" for k, v in zip(columns + ["score"], row))
+        lines.append(f"{idx}. {info}")
+    return "\n".join(lines)
+
+
+def _fetch_arrays(
+    conn,
+    date_str: str,
+    batch_size: int,
+    end_date_str: str | None = None,
+    blocks: list[tuple] | None = None,
+    equipment_ids: list[str] | None = None,
+):
+    """
+    以無緩衝 cursor 分批讀取當天（或 date_str ~ end_date_str）的 (時間, 振動值[, 設備])，轉成 numpy 陣列。
+    blocks 指定時只讀取這些 [start, end) 時間區塊（近似統計的抽樣，見 approx_stats）。
+    回傳 (time_col, vibration_col, equipment_col, times, values, groups) 或錯誤訊息字串；
+    呼叫端負責關閉 conn。
+    """
+    import numpy as np
+
+    cursor = conn.cursor()
+    try:
+        columns, vibration_col, time_columns = detect_columns(cursor)
+    finally:
+        cursor.close()
+    if not vibration_col:
+        return "No vibration column found."
+    if not time_columns:
+        return "No time/date columns found for filtering."
+    time_col = time_columns[0]
+    equipment_col = detect_equipment_column(columns)
+    select = f"`{time_col}`, `{vibration_col}`" + (f", `{equipment_col}`" if equipment_col else "")
+    if equipment_ids and not equipment_col:
+        return "No equipment column found."
+    equipment_where, equipment_params = _equipment_filter(equipment_col, equipment_ids)
+    cursor = conn.cursor(buffered=False)
+    try:
+        if blocks:
+            ranges = " OR ".join([f"(`{time_col}` >= %s AND `{time_col}` < %s)"] * len(blocks))
+            cursor.execute(
+                f"SELECT {select} FROM `{MYSQL_TABLE}` WHERE ({ranges}){equipment_where}",
+                tuple(str(t) for block in blocks for t in block) + equipment_params,
+            )
+        elif end_date_str is None:
+            cursor.execute(
+                f"SELECT {select} FROM `{MYSQL_TABLE}` WHERE {_day_filter(time_col)}{equipment_where}",
+                day_range(date_str) + equipment_params,
+            )
+        else:
+            end = date.fromisoformat(end_date_str) + timedelta(days=1)
+            cursor.execute(
+                f"SELECT {select} FROM `{MYSQL_TABLE}` WHERE `{time_col}` >= %s AND `{time_col}` < %s{equipment_where}",
+                (date_str, end.isoformat()) + equipment_params,
+            )
+        times, values, groups = [], [], []
+        for batch in iter_batches(cursor, batch_size):
+            times.append(np.array([row[0] for row in batch], dtype="datetime64[us]"))
+            values.append(np.array([row[1] for row in batch], dtype=float))
+            if equipment_col:
+                groups.append(np.array([str(row[2]) for row in batch]))
+    finally:
+        cursor.close()
+    if not values:
+        return f"{date_str if end_date_str is None else f'{date_str} ~ {end_date_str}'} 沒有資料。"
+    return (
+        time_col,
+        vibration_col,
+        equipment_col,
+        np.concatenate(times),
+        np.concatenate(values),
+        np.concatenate(groups) if equipment_col else None,
+    )
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def rank_vibration_anomalies_on_date(
+    date_str: str,
+    method: str = "mad",
+    threshold: float | None = None,
+    window_minutes: int = 60,
+    top_k: int = 20,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> str:
+    """
+    以 outlier_engine 計算每台設備、每個時間窗的基準線，回傳分數最高的 top_k 筆異常。
+    資料分批讀入 numpy 陣列，不建立每列的 Python 物件。
+    """
+    import numpy as np
+
+    from outlier_engine import METHODS, detect_outliers
+
+    if method not in METHODS:
+        return f"Unknown method {method}, expected one of {', '.join(METHODS)}."
+    conn = None
+    try:
+        conn = connect()
+        fetched = _fetch_arrays(conn, date_str, batch_size)
+        if isinstance(fetched, str):
+            return fetched
+        time_col, vibration_col, equipment_col, times, values, groups = fetched
+
+        window = np.timedelta64(window_minutes, "m") if window_minutes else None
+        result = detect_outliers(
+            values, times, groups, method=method, threshold=threshold, window=window, top_k=top_k
+        )
+        baseline = ("每台設備" if equipment_col else "全部資料") + (
+            f" × 每 {window_minutes} 分鐘" if window_minutes and method != "rolling" else ""
+        )
+        header = (
+            f"[{method}, threshold={result.threshold}, 基準線={baseline}] "
+            f"{date_str} 共 {result.total_rows} 筆資料，{result.total_outliers} 筆離群值"
+        )
+        if not result.anomalies:
+            return header + "。"
+        lines = [header + f"，分數最高的 {len(result.anomalies)} 筆："]
+        for rank, a in enumerate(result.anomalies, 1):
+            equipment = f"{equipment_col}: {a.group}, " if equipment_col else ""
+            lines.append(
+                f"{rank}. {equipment}{time_col}: {times[a.index].astype('datetime64[s]')}, "
+                f"{vibration_col}: {a.value:.6g}, score={a.score:.2f}, "
+                f"baseline={a.center:.6g}±{a.scale:.3g}"
+            )
+        return "\n".join(lines)
+    except Exception as e:
+        return _query_error("Error ranking vibration anomalies", e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def analyze_vibration_on_date(
+    date_str: str,
+    method: str = "zscore",
+    threshold: float | None = None,
+    window_minutes: int = 0,
+    top_k: int = 10,
+    equipment_top: int = 10,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> str:
+    """
+    一次完成 [取得資料]->[分析資料]->[解析資料]：資料只讀取一次，統計量、每小時趨勢、
+    各設備摘要與離群值都在本地以 numpy 計算，只回傳精簡的報告，不把原始資料送回模型。
+    """
+    from outlier_engine import METHODS
+
+    if method not in METHODS:
+        return f"Unknown method {method}, expected one of {', '.join(METHODS)}."
+    conn = None
+    try:
+        conn = connect()
+        fetched = _fetch_arrays(conn, date_str, batch_size)
+        if isinstance(fetched, str):
+            return fetched
+        return analysis_report(
+            date_str, *fetched, method=method, threshold=threshold,
+            window_minutes=window_minutes, top_k=top_k, equipment_top=equipment_top,
+        )
+    except Exception as e:
+        return _query_error("Error analyzing vibration data", e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def analysis_report(
+    date_str: str,
+    time_col: str,
+    vibration_col: str,
+    equipment_col: str | None,
+    times,
+    values,
+    groups,
+    method: str = "zscore",
+    threshold: float | None = None,
+    window_minutes: int = 0,
+    top_k: int = 10,
+    equipment_top: int = 10,
+) -> str:
+    """analyze_vibration_on_date 的計算部分（輸入為 numpy 陣列）。"""
+    import numpy as np
+
+    from outlier_engine import detect_outliers
+
+    # NULL 讀值在 _fetch_arrays 中成為 NaN，會讓所有統計變成 nan、離群值偵測也判斷不到，先排除
+    finite = np.isfinite(values)
+    dropped = int(len(values) - finite.sum())
+    if dropped:
+        values, times = values[finite], times[finite]
+        if groups is not None:
+            groups = groups[finite]
+    n = len(values)
+    if n == 0:
+        return f"{date_str} 共 {dropped} 筆資料，但 {vibration_col} 全部為 NULL，無法分析。"
+    magnitude = np.abs(values)
+    peak = int(np.argmax(magnitude))
+    p50, p95, p99 = np.percentile(magnitude, [50, 95, 99])
+    lines = [
+        f"[{date_str} 振動分析] 共 {n} 筆"
+        + (f"，{len(np.unique(groups))} 台設備" if groups is not None else "")
+        + (f"（已排除 {dropped} 筆 {vibration_col} 為 NULL 的資料）" if dropped else ""),
+        f"統計：平均值={values.mean():.6g}, 變異數={values.var():.6g}, 標準差={values.std():.6g}, "
+        f"最大值={values.max():.6g}, 最小值={values.min():.6g}",
+        f"絕對值：最大={magnitude[peak]:.6g} ({times[peak].astype('datetime64[s]')}"
+        + (f", {equipment_col}: {groups[peak]}" if groups is not None else "")
+        + f"), P50={p50:.6g}, P95={p95:.6g}, P99={p99:.6g}",
+    ]
+
+    # 每小時平均絕對值，讓模型能描述一天中的趨勢
+    hours = times.astype("datetime64[h]").astype(np.int64) % 24
+    counts = np.bincount(hours, minlength=24)
+    sums = np.bincount(hours, weights=magnitude, minlength=24)
+    trend = [f"{h:02d}時={sums[h] / counts[h]:.4g}" for h in range(24) if counts[h]]
+    lines.append("每小時平均絕對值：" + ", ".join(trend))
+
+    if groups is not None:
+        names, codes = np.unique(groups, return_inverse=True)
+        g_counts = np.bincount(codes)
+        g_means = np.bincount(codes, weights=magnitude) / g_counts
+        g_max = np.zeros(len(names))
+        np.maximum.at(g_max, codes, magnitude)
+        order = np.argsort(-g_max)[:equipment_top]
+        lines.append(f"各設備（依最大絕對值排序，前 {len(order)} 台）：")
+        lines.extend(
+            f"- {names[i]}: 筆數={g_counts[i]}, 平均絕對值={g_means[i]:.4g}, 最大絕對值={g_max[i]:.4g}"
+            for i in order
+        )
+
+    window = np.timedelta64(window_minutes, "m") if window_minutes else None
+    result = detect_outliers(
+        values, times, groups, method=method, threshold=threshold, window=window, top_k=top_k
+    )
+    lines.append(
+        f"離群值（{method}, threshold={result.threshold}）：{result.total_outliers} 筆"
+        f"（{result.total_outliers / n:.2%}）"
+        + (f"，分數最高的 {len(result.anomalies)} 筆：" if result.anomalies else "")
+    )
+    for rank, a in enumerate(result.anomalies, 1):
+        equipment = f"{equipment_col}: {a.group}, " if groups is not None else ""
+        lines.append(
+            f"{rank}. {equipment}{time_col}: {times[a.index].astype('datetime64[s]')}, "
+            f"{vibration_col}: {a.value:.6g}, score={a.score:.2f}"
+        )
+    if result.anomalies and groups is not None:
+        flagged, flagged_counts = np.unique([a.group for a in result.anomalies], return_counts=True)
+        worst = flagged[np.argmax(flagged_counts)]
+        lines.append(f"重點：前 {len(result.anomalies)} 筆離群值中 {worst} 佔 {flagged_counts.max()} 筆，建議優先檢查。")
+    elif not result.anomalies:
+        lines.append("重點：未發現離群值，振動在正常範圍內。")
+    return "\n".join(lines)
+
+
+@QUERY_GUARD.limit()
+def analyze_vibration_fleet(
+    date_range: str,
+    chunk_by: str = "equipment",
+    method: str = "zscore",
+    threshold: float | None = None,
+    window_minutes: int = 0,
+    top_k: int = 10,
+    equipment_top: int = 10,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> str:
+    """
+    全廠（所有設備 × 多天）的振動統計與離群值。資料讀入後由 analytics_pool 的行程池分塊計算
+    （chunk_by：equipment 每台設備一塊、day 每天一塊），不佔用 agent 的 event loop。
+    date_range 可用 "2025/7/20~7/30"、"最近7天" 等寫法，會先依資料表的時間範圍檢查與裁切。
+    """
+    from analytics_pool import ANALYTICS, CHUNK_BY
+    from date_parser import validate_date_range
+    from outlier_engine import METHODS
+
+    if method not in METHODS:
+        return f"Unknown method {method}, expected one of {', '.join(METHODS)}."
+    if chunk_by not in CHUNK_BY:
+        return f"Unknown chunk_by {chunk_by}, expected one of {', '.join(CHUNK_BY)}."
+    requested, message = validate_date_range(date_range)
+    if requested is None:
+        return message
+    conn = None
+    try:
+        conn = connect()
+        fetched = _fetch_arrays(conn, requested.start.isoformat(), batch_size, requested.end.isoformat())
+        if isinstance(fetched, str):
+            return fetched
+        conn.close()
+        conn = None
+        time_col, vibration_col, equipment_col, times, values, groups = fetched
+        result = ANALYTICS.analyze(
+            values, times, groups, chunk_by=chunk_by, method=method, threshold=threshold,
+            window_minutes=window_minutes, top_k=top_k,
+        )
+        report = fleet_report(str(requested), time_col, vibration_col, equipment_col, result, equipment_top)
+        return report if message is None else f"{message}\n{report}"
+    except Exception as e:
+        return _query_error("Error analyzing fleet vibration data", e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def fleet_report(label: str, time_col: str, vibration_col: str, equipment_col: str | None, result, equipment_top: int = 10) -> str:
+    """analyze_vibration_fleet 的報告格式（輸入為 analytics_pool.FleetResult）。"""
+    n = result.total_rows
+    stats = result.stats
+    lines = [
+        f"[{label} 全廠振動分析] 共 {n} 筆"
+        + (f"，{len(result.by_equipment)} 台設備" if equipment_col else "")
+        + f"（依 {result.chunk_by} 分 {result.units} 塊，{result.workers} 個行程，{result.elapsed_s:.2f}s）",
+        f"統計：平均值={stats.mean:.6g}, 標準差={stats.std:.6g}, 最大值={stats.max:.6g}, 最小值={stats.min:.6g}",
+    ]
+    if result.by_equipment:
+        ranked = sorted(
+            result.by_equipment.items(), key=lambda item: (-max(abs(item[1].min), abs(item[1].max)), item[0])
+        )[:equipment_top]
+        lines.append(f"各設備（依最大絕對值排序，前 {len(ranked)} 台）：")
+        lines.extend(
+            f"- {name}: 筆數={s.count}, 平均值={s.mean:.4g}, 標準差={s.std:.4g}, "
+            f"最大絕對值={max(abs(s.min), abs(s.max)):.4g}"
+            for name, s in ranked
+        )
+    lines.append(
+        f"離群值（{result.method}, threshold={result.threshold}）：{result.total_outliers} 筆"
+        f"（{result.total_outliers / n:.2%}）"
+        + (f"，分數最高的 {len(result.anomalies)} 筆：" if result.anomalies else "")
+    )
+    for rank, a in enumerate(result.anomalies, 1):
+        equipment = f"{equipment_col}: {a.equipment}, " if equipment_col else ""
+        lines.append(
+            f"{rank}. {equipment}{time_col}: {a.time.astype('datetime64[s]')}, "
+            f"{vibration_col}: {a.value:.6g}, score={a.score:.2f}"
+        )
+    return "\n".join(lines)
+
+
+def _estimate_rows(cursor, time_col: str, start, end) -> int:
+    """
+    以 EXPLAIN 估計 [start, end) 的列數（只讀索引統計，毫秒級）。
+    沒有用到索引時 EXPLAIN 回報的是整張表，再依資料表時間範圍的比例換算。
+    """
+    from date_parser import get_table_extents
+
+    cursor.execute(
+        f"EXPLAIN SELECT 1 FROM `{MYSQL_TABLE}` WHERE `{time_col}` >= %s AND `{time_col}` < %s",
+        (str(start), str(end)),
+    )
+    plan = dict(zip(cursor.column_names, cursor.fetchone()))
+    rows = int(plan.get("rows") or 0)
+    extents = get_table_extents()
+    if plan.get("key") is None and extents is not None:
+        total = (extents.max_time - extents.min_time).total_seconds()
+        overlap = (min(end, extents.max_time) - max(start, extents.min_time)).total_seconds()
+        if total > 0:
+            rows = int(rows * min(max(overlap / total, 0.0), 1.0))
+    return rows
+
+
+@QUERY_GUARD.limit()
+def estimate_vibration_stats(
+    date_range: str,
+    equipment_ids: list[str] | None = None,
+    target_ms: float | None = None,
+    confidence: float = 0.95,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> str:
+    """
+    長時間範圍的近似統計（見 approx_stats）：依延遲目標自動決定抽樣比例，只讀取抽到的時間區塊，
+    回傳平均值、標準差、|v| 百分位數、每日趨勢的估計值與信賴區間，以及使用的樣本數。
+    範圍內的資料量不超過目標時讀取全部資料，統計量為精確值。
+    """
+    import time
+    from datetime import datetime, timedelta
+
+    from approx_stats import SAMPLER, estimate
+    from date_parser import validate_date_range
+
+    requested, message = validate_date_range(date_range)
+    if requested is None:
+        return message
+    start = datetime.combine(requested.start, datetime.min.time())
+    end = datetime.combine(requested.end, datetime.min.time()) + timedelta(days=1)
+    conn = cursor = None
+    try:
+        started = time.perf_counter()
+        conn = connect()
+        cursor = conn.cursor()
+        _, vibration_col, time_columns = detect_columns(cursor)
+        if not vibration_col:
+            return "No vibration column found."
+        if not time_columns:
+            return "No time/date columns found for filtering."
+        estimated_rows = _estimate_rows(cursor, time_columns[0], start, end)
+        cursor.close()
+        cursor = None
+
+        plan = SAMPLER.plan(start, end, estimated_rows, target_ms)
+        fetch_started = time.perf_counter()
+        fetched = _fetch_arrays(
+            conn, requested.start.isoformat(), batch_size, requested.end.isoformat(),
+            blocks=plan.blocks or None, equipment_ids=equipment_ids,
+        )
+        if isinstance(fetched, str):
+            return fetched
+        conn.close()
+        conn = None
+        _, vibration_col, _, times, values, _ = fetched
+        SAMPLER.observe(len(values), time.perf_counter() - fetch_started)
+
+        result = estimate(values, times, plan, confidence=confidence)
+        report = approx_report(str(requested), vibration_col, equipment_ids, plan, result, time.perf_counter() - started)
+        return report if message is None else f"{message}\n{report}"
+    except Exception as e:
+        return _query_error("Error estimating vibration stats", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+def approx_report(label: str, vibration_col: str, equipment_ids, plan, result, elapsed_s: float) -> str:
+    from approx_stats import trend_verdict
+
+    scope = f"設備 {', '.join(equipment_ids)}" if equipment_ids else "全部設備"
+    if result.exact:
+        header = f"[{label} {vibration_col} 統計（精確）] {scope}，共 {result.rows} 筆（{elapsed_s * 1000:.0f} ms）"
+    else:
+        header = (
+            f"[{label} {vibration_col} 統計（近似）] {scope}，抽樣 {result.blocks} 個 {plan.block_seconds} 秒區塊、"
+            f"{result.rows} 筆（時間比例 {result.fraction:.2%}，估計全部約 {plan.estimated_rows} 筆，"
+            f"{elapsed_s * 1000:.0f} ms），區間為 {result.confidence:.0%} 信賴區間"
+        )
+    p = result.percentiles
+    lines = [
+        header,
+        f"平均值={result.mean.format()}, 標準差={result.std.format()}",
+        f"|v|：P50={p[50].format()}, P95={p[95].format()}, P99={p[99].format()}, "
+        + (f"最大={result.sample_max:.4g}" if result.exact else f"樣本最大={result.sample_max:.4g}（實際最大值不小於此值）"),
+    ]
+    if result.slope_per_day is not None:
+        lines.append(
+            f"趨勢：{trend_verdict(result.slope_per_day)}（平均值每日變化 {result.slope_per_day.format('.3g')}）"
+        )
+    lines.append(
+        f"每{result.bucket_unit}平均值：" + ", ".join(f"{day}={est.format('.4g')}" for day, est, _ in result.buckets)
+    )
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# 依設備分組的查詢：一次 GROUP BY / window function 回答所有機台
+# ----------------------------------------------------------------------
+def _equipment_context(cursor):
+    """回傳 (time_col, vibration_col, equipment_col) 或錯誤訊息字串。"""
+    columns, vibration_col, time_columns = detect_columns(cursor)
+    if not vibration_col:
+        return "No vibration column found."
+    if not time_columns:
+        return "No time/date columns found for filtering."
+    equipment_col = detect_equipment_column(columns)
+    if not equipment_col:
+        return "No equipment column found."
+    return time_columns[0], vibration_col, equipment_col
+
+
+def _equipment_filter(equipment_col: str, equipment_ids: list[str] | None, alias: str = ""):
+    if not equipment_ids:
+        return "", ()
+    placeholders = ", ".join(["%s"] * len(equipment_ids))
+    return f" AND {alias}`{equipment_col}` IN ({placeholders})", tuple(equipment_ids)
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def get_vibration_stats_by_equipment(date_str: str, equipment_ids: list[str] | None = None) -> str:
+    """每台設備當天的筆數、最小/最大/平均值與標準差（單一 GROUP BY 查詢）。"""
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        context = _equipment_context(cursor)
+        if isinstance(context, str):
+            return context
+        time_col, vibration_col, equipment_col = context
+        where, params = _equipment_filter(equipment_col, equipment_ids)
+        cursor.execute(
+            f"SELECT `{equipment_col}`, COUNT(`{vibration_col}`), MIN(`{vibration_col}`), MAX(`{vibration_col}`), "
+            f"AVG(`{vibration_col}`), STDDEV_POP(`{vibration_col}`) "
+            f"FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)}{where} "
+            f"GROUP BY `{equipment_col}` ORDER BY `{equipment_col}`",
+            day_range(date_str) + params,
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return f"{date_str} 沒有資料。"
+        lines = [f"{date_str} 各設備（{equipment_col}）{vibration_col} 統計，共 {len(rows)} 台："]
+        for equipment, count, min_val, max_val, avg, std in rows:
+            lines.append(
+                f"{equipment}: count={count}, min={min_val}, max={max_val}, "
+                f"mean={float(avg or 0):.6g}, std={float(std or 0):.6g}"
+            )
+        return "\n".join(lines)
+    except Exception as e:
+        return _query_error("Error retrieving vibration stats by equipment", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def get_vibration_max_by_equipment(date_str: str, equipment_ids: list[str] | None = None) -> str:
+    """每台設備當天的最大振動值及發生時間（ROW_NUMBER() window function，單一查詢）。"""
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        context = _equipment_context(cursor)
+        if isinstance(context, str):
+            return context
+        time_col, vibration_col, equipment_col = context
+        where, params = _equipment_filter(equipment_col, equipment_ids)
+        cursor.execute(
+            f"SELECT `{equipment_col}`, `{time_col}`, `{vibration_col}` FROM ("
+            f"SELECT `{equipment_col}`, `{time_col}`, `{vibration_col}`, "
+            f"ROW_NUMBER() OVER (PARTITION BY `{equipment_col}` ORDER BY `{vibration_col}` DESC) AS rn "
+            f"FROM `{MYSQL_TABLE}` "
+            f"WHERE {_day_filter(time_col)} AND `{vibration_col}` IS NOT NULL{where}"
+            f") ranked WHERE rn = 1 ORDER BY `{vibration_col}` DESC",
+            day_range(date_str) + params,
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return f"{date_str} 沒有資料。"
+        lines = [f"在 {date_str}，各設備（{equipment_col}）最大 {vibration_col}（由大到小）："]
+        for equipment, ts, value in rows:
+            lines.append(f"{equipment}: {value}，發生於 {time_col}: {ts}")
+        return "\n".join(lines)
+    except Exception as e:
+        return _query_error("Error retrieving vibration max by equipment", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
+
+@QUERY_GUARD.limit()
+@with_valid_date
+def find_vibration_outliers_by_equipment(
+    date_str: str,
+    threshold: float = 3.0,
+    equipment_ids: list[str] | None = None,
+    per_equipment_limit: int = 5,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> str:
+    """
+    以各設備自己的平均值/標準差判斷離群值，每台設備回傳偏離最大的 per_equipment_limit 筆與離群總數。
+    基準線、篩選與排名都在同一個查詢中由 MySQL 完成。
+    """
+    conn = cursor = None
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        context = _equipment_context(cursor)
+        if isinstance(context, str):
+            return context
+        time_col, vibration_col, equipment_col = context
+        where, params = _equipment_filter(equipment_col, equipment_ids, alias="d.")
+        base_where, base_params = _equipment_filter(equipment_col, equipment_ids)
+        cursor.close()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(
+            f"SELECT `{equipment_col}`, `{time_col}`, `{vibration_col}`, score, n_outliers, avg_v, std_v FROM ("
+            f"SELECT d.`{equipment_col}`, d.`{time_col}`, d.`{vibration_col}`, "
+            f"ABS(d.`{vibration_col}` - b.avg_v) / b.std_v AS score, b.avg_v, b.std_v, "
+            f"COUNT(*) OVER (PARTITION BY d.`{equipment_col}`) AS n_outliers, "
+            f"ROW_NUMBER() OVER (PARTITION BY d.`{equipment_col}` "
+            f"ORDER BY ABS(d.`{vibration_col}` - b.avg_v) DESC) AS rn "
+            f"FROM `{MYSQL_TABLE}` d JOIN ("
+            f"SELECT `{equipment_col}`, AVG(`{vibration_col}`) AS avg_v, STDDEV_POP(`{vibration_col}`) AS std_v "
+            f"FROM `{MYSQL_TABLE}` WHERE {_day_filter(time_col)}{base_where} GROUP BY `{equipment_col}`"
+            f") b ON d.`{equipment_col}` = b.`{equipment_col}` "
+            f"WHERE {_day_filter(time_col, 'd.')}{where} AND b.std_v > 0 "
+            f"AND ABS(d.`{vibration_col}` - b.avg_v) > %s * b.std_v"
+            f") ranked WHERE rn <= %s ORDER BY `{equipment_col}`, score DESC",
+            day_range(date_str) + base_params + day_range(date_str) + params + (threshold, per_equipment_limit),
+        )
+        lines = []
+        current = None
+        for equipment, ts, value, score, n_outliers, avg, std in iter_rows(cursor, batch_size):
+            if equipment != current:
+                current = equipment
+                lines.append(
+                    f"[{equipment}] 離群值 {n_outliers} 筆（mean={float(avg):.6g}, std={float(std):.6g}）："
+                )
+            lines.append(f"  {time_col}: {ts}, {vibration_col}: {value}, z={float(score):.2f}")
+        if not lines:
+            return f"{date_str} 沒有發現離群值。"
+        return f"{date_str} 各設備（{equipment_col}）離群值（門檻 {threshold}σ）：\n" + "\n".join(lines)
+    except Exception as e:
+        return _query_error("Error finding vibration outliers by equipment", e)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn is not None:
+            conn.close()
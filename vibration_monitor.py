@@ -0,0 +1,346 @@
+"""
+持續監控振動資料的背景程式。
+
+以時間戳記 watermark 追蹤 equipment_data，每次 tick 只讀取新的列，
+依設備更新指數加權（EWMA）平均值與變異數，超過門檻時將警報寫入本地 SQLite，
+agent 工具可直接讀取預先算好的警報狀態，不必每次重新掃描整天資料。
+
+用法：
+    python vibration_monitor.py --interval 10 --threshold 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+
+from db_stream import DEFAULT_BATCH_SIZE, as_float, iter_rows
+
+ALERT_DB_PATH = os.getenv("VIBRATION_ALERT_DB", "vibration_alerts.db")
+
+
+@dataclass
+class EquipmentBaseline:
+    """指數加權的平均值與變異數（West 1979 的增量公式）。"""
+
+    count: int = 0
+    mean: float = 0.0
+    var: float = 0.0
+
+    @property
+    def std(self) -> float:
+        return self.var ** 0.5
+
+    def update(self, x: float, alpha: float):
+        self.count += 1
+        if self.count == 1:
+            self.mean, self.var = x, 0.0
+            return
+        # 暖機期間用累積平均，之後改用固定 alpha
+        a = max(alpha, 1.0 / self.count)
+        delta = x - self.mean
+        self.mean += a * delta
+        self.var = (1 - a) * (self.var + a * delta * delta)
+
+
+class MySQLSource:
+    """從 equipment_data 讀取 watermark 之後的列。"""
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._columns = None
+
+    def _detect(self, cursor):
+        import vibration_db
+
+        if self._columns is None:
+            columns, vibration_col, time_columns = vibration_db.detect_columns(cursor)
+            if not vibration_col or not time_columns:
+                raise RuntimeError("No vibration or time column found.")
+            self._columns = (time_columns[0], vibration_col, vibration_db.detect_equipment_column(columns))
+        return self._columns
+
+    def _select(self, cursor, where: str, params):
+        import vibration_db
+
+        time_col, vibration_col, equipment_col = self._detect(cursor)
+        equipment = f"`{equipment_col}`" if equipment_col else "NULL"
+        cursor.execute(
+            f"SELECT `{time_col}`, `{vibration_col}`, {equipment} FROM `{vibration_db.MYSQL_TABLE}` "
+            f"WHERE {where.format(time_col=time_col)} ORDER BY `{time_col}`",
+            params,
+        )
+
+    def latest_time(self) -> str | None:
+        import vibration_db
+
+        conn = vibration_db.connect()
+        try:
+            cursor = conn.cursor()
+            time_col, _, _ = self._detect(cursor)
+            cursor.execute(f"SELECT MAX(`{time_col}`) FROM `{vibration_db.MYSQL_TABLE}`")
+            (latest,) = cursor.fetchone()
+            cursor.close()
+            return None if latest is None else str(latest)
+        finally:
+            conn.close()
+
+    def fetch_since(self, watermark: str):
+        import vibration_db
+
+        conn = vibration_db.connect()
+        try:
+            cursor = conn.cursor(buffered=False)
+            self._select(cursor, "`{time_col}` >= %s", (watermark,))
+            for row in iter_rows(cursor, self.batch_size):
+                yield row
+            cursor.close()
+        finally:
+            conn.close()
+
+
+class AlertStore:
+    """本地 SQLite：alerts 表存放警報，monitor_state 表存放 watermark 與各設備基準線。"""
+
+    def __init__(self, path: str = ALERT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                equipment TEXT,
+                time TEXT NOT NULL,
+                value REAL NOT NULL,
+                score REAL NOT NULL,
+                baseline_mean REAL,
+                baseline_std REAL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts(time);
+            CREATE TABLE IF NOT EXISTS monitor_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """
+        )
+
+    def add_alerts(self, alerts: list[tuple]):
+        if alerts:
+            self.commit(alerts, {})
+
+    def save_state(self, key: str, value):
+        self.commit([], {key: value})
+
+    def commit(self, alerts: list[tuple], state: dict):
+        """警報與狀態（watermark、基準線）在同一個交易中寫入，失敗時全部不生效。"""
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            if alerts:
+                self._conn.executemany(
+                    "INSERT INTO alerts (equipment, time, value, score, baseline_mean, baseline_std, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [alert + (now,) for alert in alerts],
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO monitor_state (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in state.items()],
+            )
+
+    def load_state(self, key: str, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM monitor_state WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def recent_alerts(self, equipment: str | None = None, since: str | None = None, limit: int = 20):
+        query = "SELECT equipment, time, value, score, baseline_mean, baseline_std FROM alerts WHERE 1=1"
+        params: list = []
+        if equipment:
+            query += " AND equipment = ?"
+            params.append(equipment)
+        if since:
+            query += " AND time >= ?"
+            params.append(since)
+        query += " ORDER BY time DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+class VibrationMonitor:
+    def __init__(
+        self,
+        source=None,
+        store: AlertStore | None = None,
+        threshold: float = 4.0,
+        alpha: float = 0.01,
+        warmup: int = 30,
+        alert_queue: queue.Queue | None = None,
+    ):
+        self.source = source or MySQLSource()
+        self.store = store or AlertStore()
+        self.threshold = threshold
+        self.alpha = alpha
+        self.warmup = warmup
+        self.alert_queue = alert_queue
+        self.watermark: str | None = self.store.load_state("watermark")
+        self._seen_at_watermark: set = set(map(tuple, self.store.load_state("seen_at_watermark", [])))
+        self.baselines: dict[str, EquipmentBaseline] = {
+            name: EquipmentBaseline(**state) for name, state in self.store.load_state("baselines", {}).items()
+        }
+        self.rows_processed = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def tick(self) -> int:
+        """
+        處理 watermark 之後的新列，回傳本次處理的列數。
+        基準線在副本上更新，與新的 watermark、警報一起寫入後才取代記憶體中的狀態；
+        讀取或寫入失敗時重試同一段資料，不會重複累加到基準線。
+        """
+        if self.watermark is None:
+            # 第一次啟動：從目前最新的資料開始監控
+            self.watermark = self.source.latest_time()
+            self._seen_at_watermark = set()
+            if self.watermark is None:
+                return 0
+
+        processed = 0
+        alerts = []
+        new_watermark = self.watermark
+        seen = set(self._seen_at_watermark)
+        updated: dict[str, EquipmentBaseline] = {}
+        for ts, raw_value, equipment in self.source.fetch_since(self.watermark):
+            ts = str(ts)
+            equipment = None if equipment is None else str(equipment)
+            value = as_float(raw_value)
+            key = (ts, equipment, value)
+            if ts == self.watermark and key in self._seen_at_watermark:
+                continue
+            if ts != new_watermark:
+                new_watermark, seen = ts, set()
+            seen.add(key)
+            processed += 1
+            if value is None:
+                continue
+            name = equipment or ""
+            baseline = updated.get(name)
+            if baseline is None:
+                baseline = updated[name] = replace(self.baselines.get(name) or EquipmentBaseline())
+            std = baseline.std
+            if baseline.count >= self.warmup and std > 0:
+                score = abs(value - baseline.mean) / std
+                if score > self.threshold:
+                    alerts.append((equipment, ts, value, score, baseline.mean, std))
+                    # 以截斷後的值更新，避免單一尖峰拉高基準線
+                    limit = self.threshold * std
+                    value = min(max(value, baseline.mean - limit), baseline.mean + limit)
+            baseline.update(value, self.alpha)
+
+        baselines = {**self.baselines, **updated}
+        self.store.commit(alerts, self._state(new_watermark, seen, baselines))
+        self.watermark, self._seen_at_watermark, self.baselines = new_watermark, seen, baselines
+        if self.alert_queue is not None:
+            for alert in alerts:
+                self.alert_queue.put(alert)
+        self.rows_processed += processed
+        return processed
+
+    @staticmethod
+    def _state(watermark: str | None, seen: set, baselines: dict[str, EquipmentBaseline]) -> dict:
+        return {
+            "watermark": watermark,
+            "seen_at_watermark": [list(key) for key in seen],
+            "baselines": {name: {"count": b.count, "mean": b.mean, "var": b.var} for name, b in baselines.items()},
+        }
+
+    def run_forever(self, interval_s: float = 10.0):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                processed = self.tick()
+                if processed:
+                    print(f"[monitor] processed {processed} rows, watermark={self.watermark}")
+            except Exception as e:
+                print(f"[monitor] tick failed: {e}")
+            self._stop.wait(max(interval_s - (time.perf_counter() - started), 0.0))
+
+    def start(self, interval_s: float = 10.0) -> threading.Thread:
+        """在背景執行緒中啟動監控。"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, args=(interval_s,), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def recent_alerts_text(
+    equipment: str | None = None,
+    since_minutes: int = 1440,
+    limit: int = 20,
+    store: AlertStore | None = None,
+) -> str:
+    """給 agent 工具使用：讀取最近的警報與各設備目前的基準線。"""
+    own_store = store is None
+    if own_store:
+        if not os.path.exists(ALERT_DB_PATH):
+            return "監控程式尚未啟動，沒有警報資料。"
+        store = AlertStore()
+    try:
+        watermark = store.load_state("watermark")
+        since = None
+        if since_minutes and watermark:
+            since = str(datetime.fromisoformat(watermark) - timedelta(minutes=since_minutes))
+        rows = store.recent_alerts(equipment, since, limit)
+        lines = [f"[monitor] 最新資料時間: {watermark}"]
+        if not rows:
+            lines.append("沒有警報。")
+        for idx, (equip, ts, value, score, mean, std) in enumerate(rows, 1):
+            lines.append(
+                f"{idx}. 設備: {equip}, 時間: {ts}, 振動: {value:.6g}, score={score:.2f}, "
+                f"baseline={mean:.6g}±{std:.3g}"
+            )
+        baselines = store.load_state("baselines", {})
+        if equipment:
+            baselines = {k: v for k, v in baselines.items() if k == equipment}
+        for name, b in list(baselines.items())[:limit]:
+            lines.append(f"[baseline] {name or '(all)'}: mean={b['mean']:.6g}, std={b['var'] ** 0.5:.3g}, n={b['count']}")
+        return "\n".join(lines)
+    finally:
+        if own_store:
+            store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Continuous vibration monitor")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between ticks")
+    parser.add_argument("--threshold", type=float, default=4.0, help="alert score threshold")
+    parser.add_argument("--alpha", type=float, default=0.01, help="EWMA smoothing factor")
+    parser.add_argument("--backfill-hours", type=float, default=0, help="start this many hours before the latest row")
+    args = parser.parse_args()
+
+    monitor = VibrationMonitor(threshold=args.threshold, alpha=args.alpha)
+    if monitor.watermark is None and args.backfill_hours:
+        latest = monitor.source.latest_time()
+        if latest:
+            monitor.watermark = str(datetime.fromisoformat(latest) - timedelta(hours=args.backfill_hours))
+    try:
+        monitor.run_forever(args.interval)
+    except KeyboardInterrupt:
+        print("[monitor] stopped.")